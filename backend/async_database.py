@@ -0,0 +1,180 @@
+"""
+Асинхронный доступ к базе данных для контроллеров
+"""
+
+import asyncio
+import functools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+import profiling
+from database import Database, db
+from indoor_routing import IndoorRoute
+from models import Building, RoomLocation, SearchResult
+from nearby_index import NearbyPlace
+from routing import Route
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# По умолчанию потоков столько же, сколько соединений для чтения в пуле
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", os.getenv("DB_POOL_SIZE", "8")))
+
+
+class AsyncDatabase:
+    """Выполнение синхронных запросов Database в ограниченном пуле потоков"""
+
+    def __init__(self, database: Database, max_workers: int = DB_EXECUTOR_WORKERS):
+        self.database = database
+        self.max_workers = max(1, max_workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Пул потоков создается при первом запросе и после остановки"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="db"
+            )
+        return self._executor
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Выполнение функции в пуле потоков без блокировки event loop"""
+        loop = asyncio.get_running_loop()
+        call = profiling.wrap(functools.partial(func, *args, **kwargs))
+        return await loop.run_in_executor(self._get_executor(), call)
+
+    async def get_all_buildings(self,
+                                query: Optional[str] = None,
+                                building_type: Optional[str] = None,
+                                page: int = 1,
+                                limit: int = 50) -> List[Building]:
+        """Асинхронная версия Database.get_all_buildings"""
+        return await self.run(
+            self.database.get_all_buildings,
+            query=query,
+            building_type=building_type,
+            page=page,
+            limit=limit
+        )
+
+    async def get_building_projection(self,
+                                      fields: List[str],
+                                      query: Optional[str] = None,
+                                      building_type: Optional[str] = None,
+                                      page: int = 1,
+                                      limit: int = 50,
+                                      building_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Асинхронная версия Database.get_building_projection"""
+        return await self.run(
+            self.database.get_building_projection,
+            fields,
+            query=query,
+            building_type=building_type,
+            page=page,
+            limit=limit,
+            building_id=building_id
+        )
+
+    async def get_buildings_within(self,
+                                   x1: float,
+                                   y1: float,
+                                   x2: float,
+                                   y2: float,
+                                   building_type: Optional[str] = None,
+                                   limit: Optional[int] = None,
+                                   with_rooms: bool = True) -> List[Building]:
+        """Асинхронная версия Database.get_buildings_within"""
+        return await self.run(self.database.get_buildings_within, x1, y1, x2, y2, building_type, limit, with_rooms)
+
+    async def find_nearest(self, x: float, y: float, category: str, k: int = 5) -> List[Tuple[float, NearbyPlace]]:
+        """Асинхронная версия Database.find_nearest"""
+        return await self.run(self.database.find_nearest, x, y, category, k)
+
+    async def find_route(self, from_id: str, to_id: str, accessible: bool = False) -> Optional[Route]:
+        """Асинхронная версия Database.find_route"""
+        return await self.run(self.database.find_route, from_id, to_id, accessible)
+
+    async def find_indoor_route(self, building_id: str, room_number: str, step_free: bool = False) -> Optional[IndoorRoute]:
+        """Асинхронная версия Database.find_indoor_route"""
+        return await self.run(self.database.find_indoor_route, building_id, room_number, step_free)
+
+    async def get_building_by_id(self, building_id: str, with_rooms: bool = True) -> Optional[Building]:
+        """Асинхронная версия Database.get_building_by_id"""
+        return await self.run(self.database.get_building_by_id, building_id, with_rooms)
+
+    async def get_buildings_by_ids(self, building_ids: List[str], with_rooms: bool = True) -> Tuple[List[Building], List[str]]:
+        """Асинхронная версия Database.get_buildings_by_ids"""
+        return await self.run(self.database.get_buildings_by_ids, building_ids, with_rooms)
+
+    async def get_building_types(self) -> List[Dict[str, Any]]:
+        """Асинхронная версия Database.get_building_types"""
+        return await self.run(self.database.get_building_types)
+
+    async def get_total_count(self,
+                              query: Optional[str] = None,
+                              building_type: Optional[str] = None) -> int:
+        """Асинхронная версия Database.get_total_count"""
+        return await self.run(self.database.get_total_count, query, building_type)
+
+    async def get_buildings_page(self,
+                                 query: Optional[str] = None,
+                                 building_type: Optional[str] = None,
+                                 page: int = 1,
+                                 limit: int = 50,
+                                 cursor: Optional[str] = None) -> Tuple[List[Building], int, Optional[str]]:
+        """Асинхронная версия Database.get_buildings_page"""
+        return await self.run(
+            self.database.get_buildings_page,
+            query=query,
+            building_type=building_type,
+            page=page,
+            limit=limit,
+            cursor=cursor
+        )
+
+    async def find_rooms(self,
+                         number: Optional[str] = None,
+                         building_id: Optional[str] = None,
+                         floor: Optional[int] = None,
+                         room_type: Optional[str] = None,
+                         limit: int = 100) -> List[RoomLocation]:
+        """Асинхронная версия Database.find_rooms"""
+        return await self.run(
+            self.database.find_rooms,
+            number=number,
+            building_id=building_id,
+            floor=floor,
+            room_type=room_type,
+            limit=limit
+        )
+
+    async def search(self, query: str, offset: int = 0, limit: int = 10) -> Tuple[List[SearchResult], int, Optional[str]]:
+        """Асинхронная версия Database.search (построение снимка и индекса тоже уходит в пул)"""
+        return await self.run(self.database.search, query, offset, limit)
+
+    async def suggest(self, prefix: str, limit: int = 10) -> List[str]:
+        """Подсказки автодополнения по словарю текущего снимка"""
+        return await self.run(lambda: self.database.get_snapshot().autocomplete.complete(prefix, limit))
+
+    async def searchable(self, phrases: List[str]) -> List[str]:
+        """Фразы, по которым поиск в текущем снимке что-то находит"""
+        def select() -> List[str]:
+            index = self.database.get_snapshot().search_index
+            return [phrase for phrase in phrases if index.search(phrase)]
+        return await self.run(select)
+
+    def shutdown(self) -> None:
+        """Остановка пула потоков"""
+        if self._executor is None:
+            return
+        self._executor.shutdown(wait=True)
+        self._executor = None
+        logger.info("Пул потоков доступа к базе данных остановлен")
+
+
+# Глобальный асинхронный доступ к базе данных
+adb = AsyncDatabase(db)
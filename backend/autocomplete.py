@@ -0,0 +1,85 @@
+"""
+Автодополнение поисковых запросов по префиксу
+"""
+
+import heapq
+import logging
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Tuple
+
+from fuzzy import fold
+from models import Building
+
+logger = logging.getLogger(__name__)
+
+# Вес подсказки в зависимости от источника
+NAME_WEIGHT = 5
+AMENITY_WEIGHT = 3
+DEPARTMENT_WEIGHT = 2
+ROOM_WEIGHT = 1
+
+# Сколько ключей с подходящим префиксом просматривается за один запрос
+MAX_SCAN = 2000
+
+
+class Autocomplete:
+    """Отсортированный массив ключей с бинарным поиском по префиксу
+
+    Каждая подсказка доступна по полному тексту и по началу каждого слова,
+    поэтому «корп» дополняется до «Главный корпус».
+    """
+
+    def __init__(self, phrases: Dict[str, int]):
+        self.phrases: List[str] = list(phrases)
+        self.weights: List[int] = [phrases[phrase] for phrase in self.phrases]
+
+        keyed: List[Tuple[str, int]] = []
+        for phrase_id, phrase in enumerate(self.phrases):
+            folded = fold(phrase)
+            starts = [0] + [i + 1 for i, char in enumerate(folded) if char == " "]
+            for start in dict.fromkeys(starts):
+                keyed.append((folded[start:], phrase_id))
+        keyed.sort()
+
+        self.keys: List[str] = [key for key, _ in keyed]
+        self.phrase_ids: List[int] = [phrase_id for _, phrase_id in keyed]
+
+    @classmethod
+    def build(cls, buildings: Iterable[Building], room_numbers: Iterable[Tuple[str, int]] = ()) -> "Autocomplete":
+        """Построение словаря подсказок по зданиям и номерам аудиторий с числом их повторов"""
+        phrases: Dict[str, int] = {}
+
+        def add(phrase: str, weight: int) -> None:
+            phrase = phrase.strip()
+            if phrase:
+                phrases[phrase] = phrases.get(phrase, 0) + weight
+
+        for building in buildings:
+            add(building.name, NAME_WEIGHT)
+            for amenity in building.amenities or []:
+                add(amenity, AMENITY_WEIGHT)
+            for department in building.departments or []:
+                add(department, DEPARTMENT_WEIGHT)
+        for number, count in room_numbers:
+            add(f"аудитория {number}", ROOM_WEIGHT * count)
+
+        autocomplete = cls(phrases)
+        logger.info("Словарь автодополнения построен: %d подсказок", len(autocomplete.phrases))
+        return autocomplete
+
+    def complete(self, prefix: str, limit: int = 10) -> List[str]:
+        """Подсказки для префикса: сначала более частые, затем более короткие"""
+        prefix = fold(prefix).strip()
+        if not prefix:
+            return []
+
+        best: Dict[int, Tuple[int, int, str]] = {}
+        position = bisect_left(self.keys, prefix)
+        end = min(len(self.keys), position + MAX_SCAN)
+        while position < end and self.keys[position].startswith(prefix):
+            phrase_id = self.phrase_ids[position]
+            phrase = self.phrases[phrase_id]
+            best[phrase_id] = (-self.weights[phrase_id], len(phrase), phrase)
+            position += 1
+
+        return [phrase for _, _, phrase in heapq.nsmallest(limit, best.values())]
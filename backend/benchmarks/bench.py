@@ -0,0 +1,344 @@
+"""
+Нагрузочные замеры горячих путей API
+
+Запуск из каталога backend:
+
+    python benchmarks/bench.py                      # в процессе, через ASGI транспорт
+    python benchmarks/bench.py --mode uvicorn       # через локальный uvicorn
+    python benchmarks/bench.py --save-baseline      # сохранить результаты как эталон
+
+Нужны зависимости для разработки: pip install -r requirements-dev.txt
+
+Сценарии выполняются --runs кругов по очереди, чтобы временное замедление
+машины задевало все сценарии, а не один. В таблицу и эталон идет лучший
+прогон каждого показателя (минимум задержек, максимум rps): он меньше всего
+зависит от фоновой нагрузки. Результаты сравниваются с эталоном для режима,
+и скрипт завершается с кодом 1, когда p95 вырос больше допустимого порога и
+больше чем на --noise-floor-ms, или пропускная способность упала больше порога.
+Эталон зависит от машины, поэтому не хранится в репозитории: без него скрипт
+тоже завершается с кодом 1, пока эталон не сохранен через --save-baseline.
+
+По умолчанию кэш ответов выключен (API_CACHE_MAX_ENTRIES=0), чтобы замерялись
+сами запросы, а не попадания в кэш; --cache включает его.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+class Scenario(NamedTuple):
+    """Набор URL, которые запрашиваются по кругу"""
+    name: str
+    urls: List[str]
+
+
+class Result(NamedTuple):
+    """Итог одного сценария"""
+    name: str
+    requests: int
+    errors: int
+    rps: float
+    p50: float
+    p95: float
+    p99: float
+
+    def as_dict(self) -> Dict[str, float]:
+        return {"rps": self.rps, "p50_ms": self.p50, "p95_ms": self.p95, "p99_ms": self.p99}
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Перцентиль по ближайшему рангу"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+async def page_cursors(client: httpx.AsyncClient, page_size: int, pages: List[int]) -> Dict[int, str]:
+    """Курсоры нужных страниц: выдача проходится по next_cursor от первой страницы"""
+    cursors: Dict[int, str] = {}
+    cursor: Optional[str] = None
+    for page in range(2, max(pages) + 1):
+        params: Dict[str, Any] = {"limit": page_size}
+        if cursor:
+            params["cursor"] = cursor
+        cursor = (await client.get("/api/buildings/paginated", params=params)).json().get("next_cursor")
+        if not cursor:
+            break
+        if page in pages:
+            cursors[page] = cursor
+    return cursors
+
+
+async def build_scenarios(client: httpx.AsyncClient, page_size: int) -> List[Scenario]:
+    """Сценарии строятся по текущим данным: ID, типы и номер последней страницы"""
+    summary = (await client.get("/api/buildings", params={"view": "summary", "limit": 100})).json()
+    ids = [building["id"] for building in summary] or ["1"]
+    types = sorted({building["type"] for building in summary}) or ["academic"]
+
+    first_page = (await client.get("/api/buildings/paginated", params={"limit": page_size})).json()
+    total = first_page["total"]
+    last_page = max(1, (total + page_size - 1) // page_size)
+    deep_pages = sorted({max(1, last_page - offset) for offset in range(3)})
+    # Те же глубокие страницы по курсору; у первой страницы курсора нет
+    cursors = await page_cursors(client, page_size, deep_pages)
+    deep_cursor_urls = [
+        f"/api/buildings/paginated?cursor={cursors[page]}&limit={page_size}" if page in cursors
+        else f"/api/buildings/paginated?limit={page_size}"
+        for page in deep_pages
+    ]
+
+    return [
+        Scenario("buildings", [f"/api/buildings?limit={page_size}"]),
+        Scenario("buildings_filtered", [f"/api/buildings?type={t}&limit={page_size}" for t in types]),
+        Scenario("buildings_query", [f"/api/buildings?query=корпус&limit={page_size}"]),
+        Scenario("buildings_paged", [f"/api/buildings/paginated?page={page}&limit={page_size}" for page in range(1, min(last_page, 5) + 1)]),
+        Scenario("buildings_deep_pages", [f"/api/buildings/paginated?page={page}&limit={page_size}" for page in deep_pages]),
+        Scenario("buildings_deep_cursor", deep_cursor_urls),
+        Scenario("building_by_id", [f"/api/buildings/{building_id}" for building_id in ids[:50]]),
+        Scenario("building_types", ["/api/buildings/types"]),
+        Scenario("search_short", ["/api/search?q=ко", "/api/search?q=10", "/api/search?q=би"]),
+        Scenario("search_long", ["/api/search?q=Главный учебный корпус", "/api/search?q=научная библиотека"]),
+        Scenario("search_no_match", ["/api/search?q=zzqxj", "/api/search?q=несуществующее место"]),
+    ]
+
+
+async def run_scenario(client: httpx.AsyncClient,
+                       scenario: Scenario,
+                       requests: int,
+                       concurrency: int,
+                       warmup: int) -> Result:
+    """Выполнение сценария: прогрев, затем requests запросов в concurrency потоков"""
+    for i in range(warmup):
+        await client.get(scenario.urls[i % len(scenario.urls)])
+
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker() -> None:
+        nonlocal errors
+        for i in counter:
+            url = scenario.urls[i % len(scenario.urls)]
+            started = time.perf_counter()
+            response = await client.get(url)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return Result(
+        scenario.name,
+        len(latencies),
+        errors,
+        len(latencies) / elapsed if elapsed else 0.0,
+        percentile(latencies, 0.50),
+        percentile(latencies, 0.95),
+        percentile(latencies, 0.99),
+    )
+
+
+@asynccontextmanager
+async def asgi_client() -> AsyncIterator[httpx.AsyncClient]:
+    """Клиент к приложению в этом же процессе, с выполнением lifespan"""
+    sys.path.insert(0, BACKEND_DIR)
+    import main
+
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            yield client
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@asynccontextmanager
+async def uvicorn_client(workers: int) -> AsyncIterator[httpx.AsyncClient]:
+    """Клиент к локальному uvicorn, запущенному в отдельном процессе"""
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--no-access-log", "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=os.environ.copy(),
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        limits = httpx.Limits(max_connections=256, max_keepalive_connections=256)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+            deadline = time.monotonic() + 30
+            while True:
+                if process.poll() is not None:
+                    raise RuntimeError(f"uvicorn завершился с кодом {process.returncode}")
+                try:
+                    if (await client.get("/health")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise RuntimeError("uvicorn не запустился за 30 секунд")
+                await asyncio.sleep(0.1)
+            yield client
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def best_result(runs: List[Result]) -> Result:
+    """Сводка нескольких прогонов сценария: лучшие показатели, запросы и ошибки суммируются"""
+    return Result(
+        runs[0].name,
+        sum(r.requests for r in runs),
+        sum(r.errors for r in runs),
+        max(r.rps for r in runs),
+        min(r.p50 for r in runs),
+        min(r.p95 for r in runs),
+        min(r.p99 for r in runs),
+    )
+
+
+def compare(results: List[Result],
+            baseline: Dict[str, Dict[str, float]],
+            threshold: float,
+            noise_floor_ms: float = 0.0) -> List[str]:
+    """Список регрессий относительно эталона
+
+    Рост p95 меньше noise_floor_ms регрессией не считается: на быстрых
+    сценариях относительный порог срабатывает от шума планировщика.
+    """
+    regressions = []
+    for result in results:
+        reference = baseline.get(result.name)
+        if not reference:
+            continue
+        if (reference["p95_ms"] and result.p95 > reference["p95_ms"] * (1 + threshold)
+                and result.p95 - reference["p95_ms"] > noise_floor_ms):
+            regressions.append(
+                f"{result.name}: p95 {result.p95:.2f}ms против {reference['p95_ms']:.2f}ms в эталоне"
+            )
+        if reference["rps"] and result.rps < reference["rps"] * (1 - threshold):
+            regressions.append(
+                f"{result.name}: {result.rps:.0f} rps против {reference['rps']:.0f} rps в эталоне"
+            )
+    return regressions
+
+
+def print_table(results: List[Result]) -> None:
+    print(f"{'сценарий':<24}{'запросов':>10}{'ошибок':>8}{'rps':>10}{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}")
+    for r in results:
+        print(f"{r.name:<24}{r.requests:>10}{r.errors:>8}{r.rps:>10.0f}{r.p50:>10.2f}{r.p95:>10.2f}{r.p99:>10.2f}")
+
+
+async def run(args: argparse.Namespace) -> List[Result]:
+    client_context = asgi_client() if args.mode == "asgi" else uvicorn_client(args.workers)
+    async with client_context as client:
+        scenarios = await build_scenarios(client, args.page_size)
+        if args.only:
+            scenarios = [scenario for scenario in scenarios if scenario.name in args.only]
+        runs: Dict[str, List[Result]] = {scenario.name: [] for scenario in scenarios}
+        for _ in range(args.runs):
+            for scenario in scenarios:
+                runs[scenario.name].append(
+                    await run_scenario(client, scenario, args.requests, args.concurrency, args.warmup)
+                )
+        return [best_result(runs[scenario.name]) for scenario in scenarios]
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Замеры производительности API")
+    parser.add_argument("--mode", choices=["asgi", "uvicorn"], default="asgi")
+    parser.add_argument("--requests", type=int, default=500, help="запросов на сценарий в одном прогоне")
+    parser.add_argument("--runs", type=int, default=5, help="прогонов сценария; берется лучший")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=1, help="воркеров uvicorn")
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--only", nargs="*", help="запустить только указанные сценарии")
+    parser.add_argument("--database", help="путь к файлу SQLite; по умолчанию временная копия с начальными данными")
+    parser.add_argument("--cache", action="store_true", help="не отключать кэш ответов")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.3, help="допустимое ухудшение, доля")
+    parser.add_argument("--noise-floor-ms", type=float, default=2.0, help="рост p95 меньше этого не считается регрессией")
+    parser.add_argument("--json", help="записать результаты в файл")
+    args = parser.parse_args(argv)
+    if args.runs < 1:
+        parser.error("--runs должно быть не меньше 1")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+
+    # Настройки читаются модулями при импорте, поэтому задаются до запуска приложения
+    database = args.database or os.path.join(tempfile.mkdtemp(prefix="bench-"), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(database)}"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    if not args.cache:
+        os.environ["API_CACHE_MAX_ENTRIES"] = "0"
+
+    results = asyncio.run(run(args))
+    print_table(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({r.name: r.as_dict() for r in results}, f, ensure_ascii=False, indent=2)
+
+    failed = [r.name for r in results if r.errors]
+    if failed:
+        print(f"Ошибки в ответах: {', '.join(failed)}")
+        return 1
+
+    baselines: Dict[str, Any] = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baselines = json.load(f)
+
+    if args.save_baseline:
+        baselines[args.mode] = {r.name: r.as_dict() for r in results}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, ensure_ascii=False, indent=2)
+        print(f"Эталон для режима {args.mode} сохранен в {args.baseline}")
+        return 0
+
+    if args.mode not in baselines:
+        print(
+            f"ОШИБКА: эталон для режима {args.mode} не найден в {args.baseline}, проверка регрессий "
+            "не выполнена. Сохраните эталон на этой машине: make bench ARGS=--save-baseline",
+            file=sys.stderr,
+        )
+        return 1
+
+    regressions = compare(results, baselines[args.mode], args.threshold, args.noise_floor_ms)
+    for line in regressions:
+        print(f"РЕГРЕССИЯ {line}")
+    if regressions:
+        return 1
+    print(f"Регрессий относительно эталона нет (порог {args.threshold:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
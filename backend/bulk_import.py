@@ -0,0 +1,258 @@
+"""
+Массовый импорт зданий из файлов JSON, NDJSON, CSV и GeoJSON
+
+Файл читается потоково, в память целиком не загружается. Запись идет одной
+транзакцией через Database.bulk_load: пачки executemany, индексы и FTS
+перестраиваются в конце.
+
+Запуск из каталога backend:
+
+    python bulk_import.py campus.ndjson                          # upsert по id
+    python bulk_import.py campus.json --mode replace             # полная замена
+    python bulk_import.py buildings.csv --database data/university_map.db
+
+Форматы:
+    json     массив зданий в формате get_pgu_real_data()
+    ndjson   одно здание в строке
+    csv      колонки полей здания; x и y — координаты, departments и amenities
+             через «|», rooms — JSON массив аудиторий
+    geojson  FeatureCollection: свойства — поля здания, геометрия Point — координаты
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional, TextIO
+
+from pydantic import ValidationError
+
+from models import Building
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1 << 16
+
+FORMATS = ("json", "ndjson", "csv", "geojson")
+
+EXTENSIONS = {
+    ".json": "json",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+    ".csv": "csv",
+    ".geojson": "geojson",
+}
+
+CSV_LIST_SEPARATOR = "|"
+CSV_BOOLEAN_TRUE = {"1", "true", "yes", "да"}
+CSV_INT_FIELDS = ("floor_count", "year_built")
+CSV_BOOLEAN_FIELDS = ("accessible", "has_elevator", "has_parking")
+
+
+class ImportFormatError(ValueError):
+    """Ошибка структуры входного файла"""
+
+
+def iter_json_array(stream: TextIO, start_marker: Optional[str] = None) -> Iterator[Any]:
+    """Элементы JSON массива по одному, без чтения файла целиком
+
+    При start_marker массив ищется после первого вхождения этой строки
+    (например, ключа "features" в GeoJSON), иначе массив — корень документа.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+
+    def fill() -> bool:
+        nonlocal buffer, position
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            return False
+        buffer = buffer[position:] + chunk
+        position = 0
+        return True
+
+    def skip_whitespace() -> None:
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n":
+                position += 1
+            if position < len(buffer) or not fill():
+                return
+
+    if start_marker is not None:
+        while True:
+            index = buffer.find(start_marker, position)
+            if index >= 0:
+                position = index + len(start_marker)
+                break
+            # Маркер может оказаться разрезанным на границе блоков
+            position = max(position, len(buffer) - len(start_marker))
+            if not fill():
+                raise ImportFormatError(f"Не найден {start_marker}")
+        skip_whitespace()
+        if buffer[position:position + 1] == ":":
+            position += 1
+
+    skip_whitespace()
+    if buffer[position:position + 1] != "[":
+        raise ImportFormatError("Ожидался JSON массив")
+    position += 1
+
+    while True:
+        skip_whitespace()
+        if buffer[position:position + 1] == "]":
+            return
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+                break
+            except json.JSONDecodeError:
+                # Элемент не дочитан до конца блока
+                if not fill():
+                    raise ImportFormatError("Неожиданный конец файла внутри элемента массива")
+        position = end
+        yield item
+
+        skip_whitespace()
+        separator = buffer[position:position + 1]
+        if separator == ",":
+            position += 1
+        elif separator == "]":
+            return
+        else:
+            raise ImportFormatError(f"Ожидалась запятая между элементами массива, получено {separator!r}")
+
+
+def read_json(stream: TextIO) -> Iterator[Dict[str, Any]]:
+    return iter_json_array(stream)
+
+
+def read_ndjson(stream: TextIO) -> Iterator[Dict[str, Any]]:
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ImportFormatError(f"Строка {line_number}: {e}") from e
+
+
+def read_csv(stream: TextIO) -> Iterator[Dict[str, Any]]:
+    reader = csv.DictReader(stream)
+    for row in reader:
+        building: Dict[str, Any] = {key: value for key, value in row.items() if value not in (None, "")}
+        try:
+            x, y = building.pop("x", None), building.pop("y", None)
+            if x is not None and y is not None:
+                building["coordinates"] = {"x": float(x), "y": float(y)}
+            for field in ("departments", "amenities"):
+                if field in building:
+                    building[field] = [item.strip() for item in building[field].split(CSV_LIST_SEPARATOR) if item.strip()]
+            for field in CSV_INT_FIELDS:
+                if field in building:
+                    building[field] = int(building[field])
+            for field in CSV_BOOLEAN_FIELDS:
+                if field in building:
+                    building[field] = building[field].strip().lower() in CSV_BOOLEAN_TRUE
+            if "rooms" in building:
+                building["rooms"] = json.loads(building["rooms"])
+        except ValueError as e:
+            raise ImportFormatError(f"Строка {reader.line_num}: {e}") from e
+        yield building
+
+
+def read_geojson(stream: TextIO) -> Iterator[Dict[str, Any]]:
+    for feature in iter_json_array(stream, start_marker='"features"'):
+        building = dict(feature.get("properties") or {})
+        if "id" not in building and feature.get("id") is not None:
+            building["id"] = str(feature["id"])
+        geometry = feature.get("geometry") or {}
+        if geometry.get("type") == "Point":
+            x, y = geometry["coordinates"][:2]
+            building["coordinates"] = {"x": x, "y": y}
+        yield building
+
+
+READERS = {
+    "json": read_json,
+    "ndjson": read_ndjson,
+    "csv": read_csv,
+    "geojson": read_geojson,
+}
+
+
+def describe_errors(error: ValidationError) -> str:
+    """Краткое описание ошибок pydantic: путь к полю и причина"""
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in error.errors()[:5]
+    )
+
+
+def validate(buildings: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Проверка записей моделью Building с номером записи в сообщении об ошибке
+
+    Запись, которая не разбирается моделью, после загрузки сломала бы снимок
+    зданий и все запросы к API, поэтому импорт останавливается на ней. Дальше
+    передаются значения, приведенные моделью: "no" в булевом поле или "3" в
+    номере этажа сохраняются так же, как их потом прочитает снимок.
+    """
+    for number, building in enumerate(buildings, start=1):
+        if not isinstance(building, dict):
+            raise ImportFormatError(f"Запись {number}: ожидался объект, получено {type(building).__name__}")
+        missing = [field for field in ("id", "name", "type") if building.get(field) is None]
+        if missing:
+            raise ImportFormatError(f"Запись {number}: нет обязательных полей {', '.join(missing)}")
+        building["id"] = str(building["id"])
+        try:
+            model = Building.model_validate(building)
+        except ValidationError as e:
+            raise ImportFormatError(f"Запись {number} ({building['id']}): {describe_errors(e)}") from e
+        yield model.model_dump(mode="json")
+
+
+def detect_format(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in EXTENSIONS:
+        raise ImportFormatError(f"Не удалось определить формат по расширению {extension!r}, укажите --format")
+    return EXTENSIONS[extension]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Массовый импорт зданий")
+    parser.add_argument("path", help="входной файл")
+    parser.add_argument("--format", choices=FORMATS, help="по умолчанию определяется по расширению")
+    parser.add_argument("--mode", choices=("upsert", "replace"), default="upsert")
+    parser.add_argument("--database", help="файл SQLite; по умолчанию из DATABASE_URL")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    from database import Database
+
+    try:
+        file_format = args.format or detect_format(args.path)
+        database = Database(args.database)
+        try:
+            database.init_database()
+            started = time.perf_counter()
+            with open(args.path, encoding="utf-8-sig", newline="") as stream:
+                loaded = database.bulk_load(validate(READERS[file_format](stream)), args.mode, args.batch_size)
+        finally:
+            database.close()
+    except (ImportFormatError, OSError, sqlite3.Error) as e:
+        logger.error("Импорт не выполнен: %s", e)
+        return 1
+
+    logger.info("Импортировано %d зданий (%s, %s) за %.1f с", loaded, file_format, args.mode, time.perf_counter() - started)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""
+Пул заранее настроенных соединений SQLite
+"""
+
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Настройки пула и PRAGMA из переменных окружения
+DEFAULT_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DEFAULT_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "16384"))
+
+
+class PoolTimeoutError(RuntimeError):
+    """Не удалось получить соединение из пула за отведенное время"""
+
+
+class ConnectionPool:
+    """Ограниченный пул соединений для чтения и одно соединение для записи"""
+
+    def __init__(self,
+                 db_path: str,
+                 size: int = DEFAULT_POOL_SIZE,
+                 timeout: float = DEFAULT_POOL_TIMEOUT):
+        self.db_path = db_path
+        self.size = max(1, size)
+        self.timeout = timeout
+
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._readers: List[sqlite3.Connection] = []
+        self._writer: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._writer_lock = threading.Lock()
+
+        self._checkouts = 0
+        self._writer_checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+
+    def _connect(self, readonly: bool) -> sqlite3.Connection:
+        """Открытие соединения и применение PRAGMA"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row  # Для получения данных как dict
+
+        if not readonly:
+            # Режим журнала сохраняется в файле базы, достаточно установить его писателем
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA foreign_keys=ON")
+        if readonly:
+            conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    def _checkout_reader(self) -> sqlite3.Connection:
+        """Получение соединения для чтения: свободное, новое или после ожидания"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if len(self._readers) < self.size:
+                conn = self._connect(readonly=True)
+                self._readers.append(conn)
+                return conn
+            self._waits += 1
+
+        started = time.perf_counter()
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolTimeoutError(
+                f"Нет свободных соединений с базой данных за {self.timeout} с"
+            ) from None
+        finally:
+            with self._lock:
+                self._wait_time += time.perf_counter() - started
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """Соединение только для чтения, возвращается в пул после использования"""
+        conn = self._checkout_reader()
+        with self._lock:
+            self._checkouts += 1
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """Единственное соединение для записи: фиксирует транзакцию или откатывает при ошибке"""
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = self._connect(readonly=False)
+            conn = self._writer
+            with self._lock:
+                self._writer_checkouts += 1
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика использования пула"""
+        with self._lock:
+            return {
+                "size": self.size,
+                "open": len(self._readers) + (1 if self._writer is not None else 0),
+                "idle": self._idle.qsize(),
+                "checkouts": self._checkouts,
+                "writer_checkouts": self._writer_checkouts,
+                "waits": self._waits,
+                "wait_time_ms": round(self._wait_time * 1000, 3),
+            }
+
+    def close(self) -> None:
+        """Закрытие всех соединений пула"""
+        with self._writer_lock, self._lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers.clear()
+            self._idle = queue.LifoQueue()
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        logger.info("Пул соединений с базой данных закрыт")
@@ -1,149 +1,246 @@
 from fastapi import HTTPException, Query
-from typing import List, Optional, Dict, Any
-from models import Building, BuildingResponse, SearchResult, SearchResponse, SearchResultType, Room
-from database import db
+from typing import List, Optional, Dict, Any, Tuple
+from models import Building, BuildingBatchResponse, BuildingResponse, BuildingSummary, BuildingView, IndoorRouteResponse, IndoorRouteStep, NearestResponse, NearestResult, RoutePoint, RouteResponse, SearchResult, SearchResponse, SearchResultType, Room, RoomLocation
+from async_database import adb
+from indoor_routing import normalize_room_number
+from pagination import InvalidCursorError, cursor_field, decode_cursor, encode_cursor
 import logging
+import math
 import re
 
 logger = logging.getLogger(__name__)
 
+# Наибольшее смещение поисковой выдачи, как у параметра offset в /api/search
+SEARCH_MAX_OFFSET = 1000
+
 class SearchController:
     @staticmethod
-    async def advanced_search(query: str, limit: int = 10) -> SearchResponse:
+    def cursor_offset(cursor: str) -> int:
+        """Смещение из курсора поиска; 400, если курсор поврежден или выходит за пределы выдачи"""
+        try:
+            offset = cursor_field(decode_cursor(cursor), "offset", (int,))
+            if not 0 <= offset <= SEARCH_MAX_OFFSET:
+                raise InvalidCursorError(f"Смещение курсора вне выдачи: {offset}")
+        except InvalidCursorError as e:
+            logger.warning("Некорректный курсор поиска: %s", e)
+            raise HTTPException(status_code=400, detail="Некорректный курсор поиска")
+        return offset
+
+    @staticmethod
+    async def advanced_search(
+        query: str,
+        limit: int = 10,
+        offset: int = 0,
+        cursor: Optional[str] = None
+    ) -> SearchResponse:
         """Расширенный поиск по зданиям, аудиториям и услугам"""
+        if cursor:
+            offset = SearchController.cursor_offset(cursor)
         try:
-            logger.info(f"Расширенный поиск: query='{query}', limit={limit}")
+            logger.debug("Расширенный поиск: query=%r, limit=%s, offset=%s, cursor=%s", query, limit, offset, cursor)
             
             if not query or len(query.strip()) < 2:
-                return SearchResponse(results=[], total=0, query=query)
-            
-            search_term = query.lower().strip()
-            results = []
-            
-            # Получаем все здания для поиска
-            all_buildings = db.get_all_buildings()
-            
-            for building in all_buildings:
-                # Поиск по названию здания
-                if search_term in building.name.lower():
-                    results.append(SearchResult(
-                        type=SearchResultType.BUILDING,
-                        building=building,
-                        match_text=building.name,
-                        priority=1
-                    ))
-                
-                # Поиск по описанию здания
-                if building.description and search_term in building.description.lower():
-                    results.append(SearchResult(
-                        type=SearchResultType.BUILDING,
-                        building=building,
-                        match_text=building.description,
-                        priority=2
-                    ))
-                
-                # Поиск по аудиториям
-                if building.rooms:
-                    for room in building.rooms:
-                        if search_term in room.number.lower():
-                            results.append(SearchResult(
-                                type=SearchResultType.ROOM,
-                                building=building,
-                                room=room,
-                                match_text=f"Аудитория {room.number}",
-                                priority=1
-                            ))
-                
-                # Поиск по услугам/удобствам
-                if building.amenities:
-                    for amenity in building.amenities:
-                        if search_term in amenity.lower():
-                            results.append(SearchResult(
-                                type=SearchResultType.AMENITY,
-                                building=building,
-                                amenity=amenity,
-                                match_text=amenity,
-                                priority=3
-                            ))
-            
-            # Сортировка по приоритету и релевантности
-            results.sort(key=lambda x: (x.priority, x.match_text))
-            
-            # Ограничиваем количество результатов
-            results = results[:limit]
-            
-            logger.info(f"Найдено {len(results)} результатов для запроса '{query}'")
+                return SearchResponse(results=[], total=0, query=query, offset=offset)
+            
+            # Ранжирование и отбор страницы выполняются по индексу,
+            # модели SearchResult строятся только для выдаваемых записей
+            results, total, corrected_query = await adb.search(query, offset, limit)
+            
+            next_cursor = encode_cursor({"offset": offset + limit}) if offset + limit < total else None
+            
+            if corrected_query:
+                logger.debug("Запрос %r исправлен на %r", query, corrected_query)
+            logger.debug("Найдено %d результатов для запроса %r", total, query)
             
             return SearchResponse(
                 results=results,
-                total=len(results),
-                query=query
+                total=total,
+                query=query,
+                corrected_query=corrected_query,
+                offset=offset,
+                next_cursor=next_cursor
             )
             
         except Exception as e:
-            logger.error(f"Ошибка при расширенном поиске: {e}")
+            logger.error("Ошибка при расширенном поиске: %s", e)
             raise HTTPException(status_code=500, detail="Ошибка сервера при поиске")
 
+    @staticmethod
+    async def get_popular_suggestions(phrases: List[str]) -> List[str]:
+        """Популярные запросы, по которым поиск находит результаты"""
+        try:
+            return await adb.searchable(phrases)
+        except Exception as e:
+            logger.error("Ошибка при получении популярных запросов: %s", e)
+            raise HTTPException(status_code=500, detail="Ошибка сервера при получении подсказок")
+
+    @staticmethod
+    async def get_suggestions(prefix: str, limit: int = 10) -> List[str]:
+        """Подсказки для поиска по префиксу"""
+        try:
+            return await adb.suggest(prefix, limit)
+        except Exception as e:
+            logger.error("Ошибка при получении подсказок: %s", e)
+            raise HTTPException(status_code=500, detail="Ошибка сервера при получении подсказок")
+
 class BuildingController:
+    @staticmethod
+    def projection_fields(view: BuildingView = BuildingView.FULL, fields: Optional[str] = None) -> Optional[List[str]]:
+        """Список полей для выборки или None, если нужна полная модель"""
+        if fields:
+            selected = [field.strip() for field in fields.split(",") if field.strip()]
+            unknown = set(selected) - set(Building.model_fields)
+            if unknown:
+                raise HTTPException(status_code=400, detail=f"Неизвестные поля: {', '.join(sorted(unknown))}")
+            return selected
+        if view == BuildingView.SUMMARY:
+            return list(BuildingSummary.model_fields)
+        return None
+    
     @staticmethod
     async def get_buildings(
         query: Optional[str] = None,
         type: Optional[str] = None,
         page: int = 1,
-        limit: int = 50
-    ) -> List[Building]:
+        limit: int = 50,
+        view: BuildingView = BuildingView.FULL,
+        fields: Optional[str] = None
+    ) -> List[Any]:
         """Получение списка зданий с фильтрацией и поиском"""
+        selected = BuildingController.projection_fields(view, fields)
         try:
-            logger.info(f"Запрос зданий: query={query}, type={type}, page={page}, limit={limit}")
+            logger.debug(
+                "Запрос зданий: query=%s, type=%s, page=%s, limit=%s, view=%s, fields=%s",
+                query, type, page, limit, view.value, fields
+            )
+            
+            if selected is not None:
+                buildings = await adb.get_building_projection(
+                    selected,
+                    query=query,
+                    building_type=type,
+                    page=page,
+                    limit=limit
+                )
+                logger.debug("Найдено %d зданий", len(buildings))
+                return buildings
             
-            buildings = db.get_all_buildings(
+            buildings = await adb.get_all_buildings(
                 query=query,
                 building_type=type,
                 page=page,
                 limit=limit
             )
             
-            logger.info(f"Найдено {len(buildings)} зданий")
+            logger.debug("Найдено %d зданий", len(buildings))
             return buildings
             
         except Exception as e:
-            logger.error(f"Ошибка при получении зданий: {e}")
+            logger.error("Ошибка при получении зданий: %s", e)
             raise HTTPException(status_code=500, detail="Ошибка сервера при получении зданий")
     
     @staticmethod
-    async def get_building_by_id(building_id: str) -> Building:
+    async def get_building_by_id(
+        building_id: str,
+        view: BuildingView = BuildingView.FULL,
+        fields: Optional[str] = None
+    ) -> Any:
         """Получение здания по ID"""
+        selected = BuildingController.projection_fields(view, fields)
         try:
-            logger.info(f"Запрос здания по ID: {building_id}")
+            logger.debug("Запрос здания по ID: %s", building_id)
             
-            building = db.get_building_by_id(building_id)
+            if selected is not None:
+                projection = await adb.get_building_projection(selected, building_id=building_id)
+                if not projection:
+                    logger.warning("Здание с ID %s не найдено", building_id)
+                    raise HTTPException(status_code=404, detail=f"Здание с ID {building_id} не найдено")
+                return projection[0]
+            
+            building = await adb.get_building_by_id(building_id)
             
             if not building:
-                logger.warning(f"Здание с ID {building_id} не найдено")
+                logger.warning("Здание с ID %s не найдено", building_id)
                 raise HTTPException(status_code=404, detail=f"Здание с ID {building_id} не найдено")
             
-            logger.info(f"Найдено здание: {building.name}")
+            logger.debug("Найдено здание: %s", building.name)
             return building
             
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Ошибка при получении здания {building_id}: {e}")
+            logger.error("Ошибка при получении здания %s: %s", building_id, e)
             raise HTTPException(status_code=500, detail="Ошибка сервера при получении здания")
     
+    @staticmethod
+    def parse_bbox(bbox: str) -> Tuple[float, float, float, float]:
+        """Разбор прямоугольника x1,y1,x2,y2"""
+        try:
+            x1, y1, x2, y2 = (float(value) for value in bbox.split(","))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="bbox должен иметь вид x1,y1,x2,y2")
+        if not all(math.isfinite(value) for value in (x1, y1, x2, y2)):
+            raise HTTPException(status_code=400, detail="bbox должен состоять из конечных чисел")
+        return x1, y1, x2, y2
+    
+    @staticmethod
+    async def get_buildings_within(
+        bbox: str,
+        type: Optional[str] = None,
+        limit: int = 500,
+        view: BuildingView = BuildingView.FULL,
+        fields: Optional[str] = None
+    ) -> List[Any]:
+        """Получение зданий в прямоугольнике карты"""
+        x1, y1, x2, y2 = BuildingController.parse_bbox(bbox)
+        selected = BuildingController.projection_fields(view, fields)
+        try:
+            logger.debug("Запрос зданий в области: bbox=%s, type=%s, limit=%s", bbox, type, limit)
+            
+            with_rooms = selected is None or "rooms" in selected
+            buildings = await adb.get_buildings_within(
+                x1, y1, x2, y2, building_type=type, limit=limit, with_rooms=with_rooms
+            )
+            
+            logger.debug("Найдено %d зданий в области", len(buildings))
+            if selected is not None:
+                include = {"id", *selected}
+                return [building.model_dump(include=include) for building in buildings]
+            return buildings
+            
+        except Exception as e:
+            logger.error("Ошибка при получении зданий в области: %s", e)
+            raise HTTPException(status_code=500, detail="Ошибка сервера при получении зданий")
+    
+    @staticmethod
+    async def get_buildings_batch(building_ids: List[str]) -> BuildingBatchResponse:
+        """Получение нескольких зданий за один запрос"""
+        try:
+            logger.debug("Пакетный запрос зданий: %d ID", len(building_ids))
+            
+            buildings, missing = await adb.get_buildings_by_ids(building_ids)
+            
+            if missing:
+                logger.warning("Здания не найдены: %s", missing)
+            return BuildingBatchResponse(buildings=buildings, missing=missing)
+            
+        except Exception as e:
+            logger.error("Ошибка при пакетном получении зданий: %s", e)
+            raise HTTPException(status_code=500, detail="Ошибка сервера при получении зданий")
+    
     @staticmethod
     async def get_building_types() -> List[Dict[str, Any]]:
         """Получение типов зданий со статистикой"""
         try:
-            logger.info("Запрос типов зданий")
+            logger.debug("Запрос типов зданий")
             
-            types = db.get_building_types()
+            types = await adb.get_building_types()
             
-            logger.info(f"Найдено {len(types)} типов зданий")
+            logger.debug("Найдено %d типов зданий", len(types))
             return types
             
         except Exception as e:
-            logger.error(f"Ошибка при получении типов зданий: {e}")
+            logger.error("Ошибка при получении типов зданий: %s", e)
             raise HTTPException(status_code=500, detail="Ошибка сервера при получении типов зданий")
     
     @staticmethod
@@ -151,22 +248,180 @@ class BuildingController:
         query: Optional[str] = None,
         type: Optional[str] = None,
         page: int = 1,
-        limit: int = 50
+        limit: int = 50,
+        cursor: Optional[str] = None
     ) -> BuildingResponse:
         """Получение зданий с пагинацией и метаинформацией"""
         try:
-            buildings = await BuildingController.get_buildings(query, type, page, limit)
-            total = db.get_total_count(query, type)
+            logger.debug(
+                "Запрос страницы зданий: query=%s, type=%s, page=%s, limit=%s, cursor=%s",
+                query, type, page, limit, cursor
+            )
+            
+            buildings, total, next_cursor = await adb.get_buildings_page(
+                query=query,
+                building_type=type,
+                page=page,
+                limit=limit,
+                cursor=cursor
+            )
             
             return BuildingResponse(
                 buildings=buildings,
                 total=total,
                 page=page,
+                limit=limit,
+                next_cursor=next_cursor
+            )
+            
+        except InvalidCursorError as e:
+            logger.warning("Некорректный курсор пагинации: %s", e)
+            raise HTTPException(status_code=400, detail="Некорректный курсор пагинации")
+        except Exception as e:
+            logger.error("Ошибка при получении зданий с пагинацией: %s", e)
+            raise HTTPException(status_code=500, detail="Ошибка сервера")
+
+class RoomController:
+    @staticmethod
+    async def find_rooms(
+        number: Optional[str] = None,
+        building_id: Optional[str] = None,
+        floor: Optional[int] = None,
+        type: Optional[str] = None,
+        limit: int = 100
+    ) -> List[RoomLocation]:
+        """Поиск аудиторий по номеру, зданию, этажу и типу"""
+        try:
+            logger.debug(
+                "Запрос аудиторий: number=%s, building_id=%s, floor=%s, type=%s",
+                number, building_id, floor, type
+            )
+            
+            rooms = await adb.find_rooms(
+                number=number,
+                building_id=building_id,
+                floor=floor,
+                room_type=type,
                 limit=limit
             )
             
+            logger.debug("Найдено %d аудиторий", len(rooms))
+            return rooms
+            
+        except Exception as e:
+            logger.error("Ошибка при поиске аудиторий: %s", e)
+            raise HTTPException(status_code=500, detail="Ошибка сервера при поиске аудиторий")
+
+class NearestController:
+    @staticmethod
+    async def resolve_origin(origin: str) -> Tuple[float, float]:
+        """Исходная точка: координаты x,y или ID здания"""
+        if "," in origin:
+            try:
+                x, y = (float(value) for value in origin.split(","))
+            except ValueError:
+                raise HTTPException(status_code=400, detail="from должен быть ID здания или координатами x,y")
+            if not (math.isfinite(x) and math.isfinite(y)):
+                raise HTTPException(status_code=400, detail="Координаты from должны быть конечными числами")
+            return x, y
+        
+        building = await adb.get_building_by_id(origin, with_rooms=False)
+        if not building:
+            logger.warning("Здание с ID %s не найдено", origin)
+            raise HTTPException(status_code=404, detail=f"Здание с ID {origin} не найдено")
+        coordinates = building.coordinates or {}
+        if "x" not in coordinates or "y" not in coordinates:
+            raise HTTPException(status_code=400, detail=f"У здания {origin} нет координат")
+        return coordinates["x"], coordinates["y"]
+    
+    @staticmethod
+    async def find_nearest(origin: str, type: str, k: int = 5) -> NearestResponse:
+        """Ближайшие к точке здания с аудиториями нужного типа или услугой"""
+        x, y = await NearestController.resolve_origin(origin)
+        try:
+            logger.debug("Поиск ближайших: from=%s, type=%s, k=%s", origin, type, k)
+            
+            found = await adb.find_nearest(x, y, type, k)
+            results = [
+                NearestResult(
+                    building=BuildingSummary(**place.building.model_dump(include=set(BuildingSummary.model_fields))),
+                    distance=round(distance, 2),
+                    rooms=list(place.rooms),
+                    amenity=place.amenity
+                )
+                for distance, place in found
+            ]
+            
+            logger.debug("Найдено %d ближайших зданий", len(results))
+            return NearestResponse(origin={"x": x, "y": y}, type=type, results=results)
+            
+        except Exception as e:
+            logger.error("Ошибка при поиске ближайших: %s", e)
+            raise HTTPException(status_code=500, detail="Ошибка сервера при поиске ближайших")
+
+class RouteController:
+    @staticmethod
+    async def get_route(from_id: str, to_id: str, accessible: bool = False) -> RouteResponse:
+        """Маршрут между зданиями по графу дорожек"""
+        try:
+            logger.debug("Запрос маршрута: from=%s, to=%s, accessible=%s", from_id, to_id, accessible)
+            
+            buildings, missing = await adb.get_buildings_by_ids([from_id, to_id], with_rooms=False)
+            if missing:
+                logger.warning("Здания для маршрута не найдены: %s", ", ".join(missing))
+                raise HTTPException(status_code=404, detail=f"Здание с ID {missing[0]} не найдено")
+            
+            route = await adb.find_route(from_id, to_id, accessible)
+            if route is None:
+                raise HTTPException(status_code=404, detail=f"Маршрут от {from_id} до {to_id} не найден")
+            
+            logger.debug("Маршрут найден: %d точек, %.1f", len(route.nodes), route.distance)
+            return RouteResponse(
+                from_id=from_id,
+                to_id=to_id,
+                accessible=accessible,
+                distance=round(route.distance, 2),
+                points=[
+                    RoutePoint(node=node.id, x=node.x, y=node.y, building_id=node.building_id)
+                    for node in route.nodes
+                ]
+            )
+            
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error("Ошибка при построении маршрута %s - %s: %s", from_id, to_id, e)
+            raise HTTPException(status_code=500, detail="Ошибка сервера при построении маршрута")
+    
+    @staticmethod
+    async def get_indoor_route(building_id: str, room: str, step_free: bool = False) -> IndoorRouteResponse:
+        """Маршрут внутри здания от входа до аудитории"""
+        try:
+            logger.debug("Запрос маршрута в здании: building_id=%s, room=%s, step_free=%s", building_id, room, step_free)
+            
+            building = await adb.get_building_by_id(building_id)
+            if not building:
+                logger.warning("Здание с ID %s не найдено", building_id)
+                raise HTTPException(status_code=404, detail=f"Здание с ID {building_id} не найдено")
+            
+            number = normalize_room_number(room)
+            if not any(normalize_room_number(item.number) == number for item in building.rooms or []):
+                raise HTTPException(status_code=404, detail=f"Аудитория {room} в здании {building_id} не найдена")
+            
+            route = await adb.find_indoor_route(building_id, room, step_free)
+            if route is None:
+                raise HTTPException(status_code=404, detail=f"Маршрут без ступеней до аудитории {room} не найден")
+            
+            return IndoorRouteResponse(
+                building_id=building_id,
+                room=route.room,
+                step_free=step_free,
+                duration=route.duration,
+                steps=[IndoorRouteStep(kind=step.kind, floor=step.floor, text=step.text) for step in route.steps]
+            )
+            
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Ошибка при получении зданий с пагинацией: {e}")
-            raise HTTPException(status_code=500, detail="Ошибка сервера") 
\ No newline at end of file
+            logger.error("Ошибка при построении маршрута в здании %s: %s", building_id, e)
+            raise HTTPException(status_code=500, detail="Ошибка сервера при построении маршрута")
@@ -2,12 +2,146 @@ import sqlite3
 import json
 import logging
 import os
-from typing import List, Optional, Dict, Any
-from models import Building, Room, RoomType
-from pgu_real_data import get_pgu_real_data
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Dict, Any, Iterable, Tuple, ContextManager
+import metrics
+from connection_pool import ConnectionPool
+from pagination import InvalidCursorError, cursor_field, decode_cursor, encode_cursor
+from models import Building, Room, RoomType, RoomLocation, SearchResult
+from search_index import SearchIndex
+from autocomplete import Autocomplete
+from spatial_index import GridIndex
+from nearby_index import ROOM_TYPE_KEYS, NearbyIndex, NearbyPlace, category_key
+from routing import Route, RoutePlanner
+from indoor_routing import IndoorRoute, IndoorRouter
 
 logger = logging.getLogger(__name__)
 
+FTS_TOKEN_RE = re.compile(r"\w+")
+
+# Веса bm25 для колонок buildings_fts: name, description
+FTS_BM25_WEIGHTS = (10.0, 1.0)
+
+# Колонки buildings, хранящие JSON, и булевы флаги
+JSON_COLUMNS = {"coordinates", "departments", "amenities"}
+BOOLEAN_COLUMNS = {"accessible", "has_elevator", "has_parking"}
+
+BUILDING_COLUMNS = (
+    "id", "name", "type", "description", "image_url", "coordinates", "floor_count", "year_built",
+    "departments", "amenities", "accessible", "has_elevator", "has_parking",
+)
+
+# Вторичные индексы; при массовой загрузке удаляются и строятся заново в конце
+INDEXES = {
+    "idx_buildings_type": "CREATE INDEX IF NOT EXISTS idx_buildings_type ON buildings (type)",
+    "idx_rooms_number": "CREATE INDEX IF NOT EXISTS idx_rooms_number ON rooms (number)",
+    "idx_rooms_building_floor": "CREATE INDEX IF NOT EXISTS idx_rooms_building_floor ON rooms (building_id, floor)",
+    "idx_rooms_type": "CREATE INDEX IF NOT EXISTS idx_rooms_type ON rooms (type)",
+}
+
+FTS_TRIGGERS = ("buildings_fts_ai", "buildings_fts_ad", "buildings_fts_au")
+
+# Режимы массовой загрузки: insert — только добавление, upsert — добавление или
+# обновление по id, replace — полная замена всех зданий
+LOAD_MODES = ("insert", "upsert", "replace")
+
+# Как часто проверяется, не изменил ли данные другой процесс (импорт, другой воркер)
+DB_GENERATION_CHECK_INTERVAL = float(os.getenv("DB_GENERATION_CHECK_INTERVAL", "1.0"))
+
+# Сколько количеств по текстовым запросам хранится между изменениями данных
+COUNT_CACHE_MAX_ENTRIES = int(os.getenv("COUNT_CACHE_MAX_ENTRIES", "1024"))
+
+# Сколько ID передается в одном запросе к таблице rooms (ограничение числа параметров SQLite)
+ROOMS_BATCH_SIZE = 500
+
+class BuildingSnapshot:
+    """Разобранные объекты зданий для одной версии данных
+    
+    Аудитории в снимок не входят: у зданий снимка список rooms пуст. Индексам
+    нужны только номера и типы аудиторий, они читают их из таблицы rooms при
+    построении, а модели Room создаются лишь для зданий, которые отдаются с
+    аудиториями.
+    """
+    
+    def __init__(self, version: int, buildings: List[Building], database: "Database"):
+        self.version = version
+        self.database = database
+        self.buildings = buildings
+        self.by_id: Dict[str, Building] = {building.id: building for building in buildings}
+        self.by_type: Dict[str, List[Building]] = {}
+        for building in buildings:
+            self.by_type.setdefault(building.type, []).append(building)
+        
+        self._search_index: Optional[SearchIndex] = None
+        self._autocomplete: Optional[Autocomplete] = None
+        self._spatial_index: Optional[GridIndex[Building]] = None
+        self._nearby_index: Optional[NearbyIndex] = None
+        self._route_planner: Optional[RoutePlanner] = None
+        self.indoor_router = IndoorRouter(self.by_id, database.get_building_rooms)
+        self._index_lock = threading.Lock()
+    
+    @property
+    def search_index(self) -> SearchIndex:
+        """Поисковый индекс, построенный по этому снимку"""
+        if self._search_index is None:
+            with self._index_lock:
+                if self._search_index is None:
+                    self._search_index = SearchIndex.build(self.buildings, self.database.room_numbers())
+        return self._search_index
+    
+    @property
+    def autocomplete(self) -> Autocomplete:
+        """Словарь автодополнения, построенный по этому снимку"""
+        if self._autocomplete is None:
+            with self._index_lock:
+                if self._autocomplete is None:
+                    self._autocomplete = Autocomplete.build(self.buildings, self.database.room_number_counts())
+        return self._autocomplete
+    
+    @property
+    def spatial_index(self) -> GridIndex[Building]:
+        """Сетка зданий по координатам на карте, построенная по этому снимку"""
+        if self._spatial_index is None:
+            with self._index_lock:
+                if self._spatial_index is None:
+                    self._spatial_index = GridIndex(
+                        (building.coordinates["x"], building.coordinates["y"], building)
+                        for building in self.buildings
+                        if building.coordinates and "x" in building.coordinates and "y" in building.coordinates
+                    )
+                    logger.info(
+                        "Пространственный индекс построен: %d зданий, ячейка %.0f",
+                        len(self._spatial_index), self._spatial_index.cell_size,
+                    )
+        return self._spatial_index
+    
+    @property
+    def nearby_index(self) -> NearbyIndex:
+        """Сетки зданий по типам аудиторий и услугам, построенные по этому снимку"""
+        if self._nearby_index is None:
+            with self._index_lock:
+                if self._nearby_index is None:
+                    self._nearby_index = NearbyIndex.build(self.buildings, self.database.room_types())
+        return self._nearby_index
+    
+    @property
+    def route_planner(self) -> RoutePlanner:
+        """Граф дорожек между зданиями этого снимка с кэшем маршрутов"""
+        if self._route_planner is None:
+            with self._index_lock:
+                if self._route_planner is None:
+                    self._route_planner = RoutePlanner.build(self.buildings)
+        return self._route_planner
+    
+    def select(self, building_type: Optional[str] = None) -> List[Building]:
+        """Здания с учетом фильтра по типу в порядке хранения"""
+        if building_type:
+            return self.by_type.get(building_type, [])
+        return self.buildings
+
 class Database:
     def __init__(self, db_path: str = None):
         if db_path is None:
@@ -20,23 +154,41 @@ class Database:
         else:
             self.db_path = db_path
         
-        # Создаем директорию для базы данных если её нет
-        db_dir = os.path.dirname(self.db_path)
-        if db_dir and not os.path.exists(db_dir):
-            os.makedirs(db_dir, exist_ok=True)
-            
-        self.init_database()
-        self.populate_initial_data()
+        # Версия данных увеличивается при любой записи и сбрасывает снимок
+        self._data_version = 0
+        self._snapshot: Optional[BuildingSnapshot] = None
+        self._snapshot_lock = threading.Lock()
+        # LRU количеств по (версия, запрос, тип): запрос приходит от клиента, поэтому размер ограничен
+        self._count_cache: "OrderedDict[Tuple[int, Optional[str], Optional[str]], int]" = OrderedDict()
+        self._count_lock = threading.Lock()
+        self.fts_enabled = False
+        
+        # Поколение данных в таблице meta меняется при массовой загрузке из любого процесса
+        self._generation: Optional[int] = None
+        self._generation_lock = threading.Lock()
+        
+        # Соединения открываются при первом обращении; схема и начальные данные
+        # создаются явно через init_database() и populate_initial_data()
+        self.pool = ConnectionPool(self.db_path)
     
-    def get_connection(self):
-        """Получение соединения с базой данных"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row  # Для получения данных как dict
-        return conn
+    def get_connection(self, write: bool = False) -> ContextManager[sqlite3.Connection]:
+        """Получение соединения с базой данных из пула"""
+        if write:
+            return self.pool.writer()
+        return self.pool.reader()
+    
+    def close(self) -> None:
+        """Закрытие соединений с базой данных"""
+        self.pool.close()
     
     def init_database(self):
         """Инициализация базы данных"""
-        with self.get_connection() as conn:
+        # Создаем директорию для базы данных если её нет
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+        
+        with self.get_connection(write=True) as conn:
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS buildings (
                     id TEXT PRIMARY KEY,
@@ -49,130 +201,701 @@ class Database:
                     year_built INTEGER,
                     departments TEXT,  -- JSON строка
                     amenities TEXT,    -- JSON строка
-                    rooms TEXT,        -- JSON строка для аудиторий
                     accessible BOOLEAN DEFAULT 0,
                     has_elevator BOOLEAN DEFAULT 0,
                     has_parking BOOLEAN DEFAULT 0
                 )
             """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rooms (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    building_id TEXT NOT NULL REFERENCES buildings (id) ON DELETE CASCADE,
+                    number TEXT NOT NULL,
+                    floor INTEGER NOT NULL,
+                    type TEXT NOT NULL,
+                    capacity INTEGER,
+                    equipment TEXT,    -- JSON строка
+                    accessible BOOLEAN DEFAULT 0
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            """)
+            for index_sql in INDEXES.values():
+                conn.execute(index_sql)
+            self._migrate_rooms_column(conn)
+            self.fts_enabled = self._init_fts(conn)
             conn.commit()
-            logger.info("База данных инициализирована")
+            logger.debug("База данных инициализирована")
+    
+    def _migrate_rooms_column(self, conn: sqlite3.Connection) -> None:
+        """Перенос аудиторий из JSON колонки buildings.rooms в таблицу rooms"""
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(buildings)")}
+        if "rooms" not in columns:
+            return
+        
+        rows = conn.execute("SELECT id, rooms FROM buildings WHERE rooms IS NOT NULL").fetchall()
+        buildings = [{"id": row["id"], "rooms": json.loads(row["rooms"])} for row in rows]
+        self._insert_rooms_many(conn, buildings)
+        moved = sum(len(building_data["rooms"]) for building_data in buildings)
+        
+        try:
+            conn.execute("ALTER TABLE buildings DROP COLUMN rooms")
+        except sqlite3.OperationalError:
+            # Старые версии SQLite не умеют удалять колонки
+            conn.execute("UPDATE buildings SET rooms = NULL")
+        
+        logger.info("Перенесено %d аудиторий в таблицу rooms", moved)
+    
+    @staticmethod
+    def _insert_rooms_many(conn: sqlite3.Connection, buildings: List[Dict[str, Any]]) -> None:
+        """Добавление аудиторий нескольких зданий одним executemany"""
+        # Наборы оборудования сильно повторяются, каждый кодируется в JSON один раз
+        encoded: Dict[Tuple[str, ...], str] = {}
+        
+        def encode_equipment(equipment: List[str]) -> str:
+            key = tuple(equipment)
+            value = encoded.get(key)
+            if value is None:
+                value = encoded[key] = json.dumps(equipment)
+            return value
+        
+        conn.executemany("""
+            INSERT INTO rooms (building_id, number, floor, type, capacity, equipment, accessible)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (
+            (
+                building_data["id"],
+                room["number"],
+                room["floor"],
+                room["type"],
+                room.get("capacity"),
+                encode_equipment(room.get("equipment") or []),
+                bool(room.get("accessible", False))
+            )
+            for building_data in buildings
+            for room in building_data.get("rooms") or []
+        ))
+    
+    def _init_fts(self, conn: sqlite3.Connection) -> bool:
+        """Создание FTS5 индекса по названию и описанию зданий"""
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'buildings_fts'"
+        ).fetchone()
+        
+        try:
+            conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS buildings_fts USING fts5(
+                    name, description,
+                    content='buildings',
+                    content_rowid='rowid',
+                    tokenize='unicode61 remove_diacritics 2',
+                    prefix='2 3'
+                )
+            """)
+        except sqlite3.OperationalError as e:
+            logger.warning("FTS5 недоступен, поиск будет выполняться через LIKE: %s", e)
+            return False
+        
+        self._create_fts_triggers(conn)
+        
+        if not exists:
+            # Индексируем данные, добавленные до появления FTS таблицы
+            conn.execute("INSERT INTO buildings_fts(buildings_fts) VALUES ('rebuild')")
+            logger.info("FTS5 индекс зданий построен")
+        
+        return True
+    
+    @staticmethod
+    def _create_fts_triggers(conn: sqlite3.Connection) -> None:
+        """Триггеры синхронизации FTS индекса с таблицей buildings"""
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS buildings_fts_ai AFTER INSERT ON buildings BEGIN
+                INSERT INTO buildings_fts(rowid, name, description)
+                VALUES (new.rowid, new.name, new.description);
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS buildings_fts_ad AFTER DELETE ON buildings BEGIN
+                INSERT INTO buildings_fts(buildings_fts, rowid, name, description)
+                VALUES ('delete', old.rowid, old.name, old.description);
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS buildings_fts_au AFTER UPDATE ON buildings BEGIN
+                INSERT INTO buildings_fts(buildings_fts, rowid, name, description)
+                VALUES ('delete', old.rowid, old.name, old.description);
+                INSERT INTO buildings_fts(rowid, name, description)
+                VALUES (new.rowid, new.name, new.description);
+            END
+        """)
+    
+    @staticmethod
+    def _fts_match_expression(query: str) -> Optional[str]:
+        """Префиксный запрос FTS5: каждое слово запроса как префикс"""
+        tokens = FTS_TOKEN_RE.findall(query.lower())
+        if not tokens:
+            return None
+        return " ".join(f'"{token}"*' for token in tokens)
+    
+    def _filter_sql(self,
+                    columns: str,
+                    query: Optional[str],
+                    building_type: Optional[str],
+                    ranked: bool = False,
+                    after: Optional[Dict[str, Any]] = None) -> Tuple[str, List[Any]]:
+        """SQL выборки зданий по текстовому запросу и типу
+        
+        При ranked=True к колонкам добавляются ключи сортировки sort_rank и sort_rowid,
+        after — позиция курсора, после которой продолжается выдача.
+        """
+        params: List[Any] = []
+        match = self._fts_match_expression(query) if query and self.fts_enabled else None
+        
+        if match:
+            weights = ", ".join(str(weight) for weight in FTS_BM25_WEIGHTS)
+            rank_expr = f"bm25(buildings_fts, {weights})"
+        else:
+            rank_expr = "NULL"
+        
+        if ranked:
+            columns += f", {rank_expr} AS sort_rank, buildings.rowid AS sort_rowid"
+        
+        if match:
+            sql = (
+                f"SELECT {columns} FROM buildings_fts "
+                "JOIN buildings ON buildings.rowid = buildings_fts.rowid "
+                "WHERE buildings_fts MATCH ?"
+            )
+            params.append(match)
+        else:
+            sql = f"SELECT {columns} FROM buildings WHERE 1=1"
+            if query:
+                sql += " AND (name LIKE ? OR description LIKE ?)"
+                like_query = f"%{query}%"
+                params.extend([like_query, like_query])
+        
+        if building_type:
+            sql += " AND buildings.type = ?"
+            params.append(building_type)
+        
+        if after is not None and not match:
+            # Keyset: продолжаем строго после последней выданной строки
+            sql += " AND buildings.rowid > ?"
+            params.append(after["rowid"])
+        
+        if ranked:
+            if match:
+                sql += f" ORDER BY {rank_expr}, buildings.rowid"
+            else:
+                sql += " ORDER BY buildings.rowid"
+        
+        if after is not None and match:
+            # bm25 нельзя использовать в WHERE, сравниваем уже вычисленный ключ сортировки
+            if after["rank"] is None:
+                raise InvalidCursorError("Курсор не соответствует поисковому запросу")
+            sql = (
+                f"SELECT * FROM ({sql}) "
+                "WHERE sort_rank > ? OR (sort_rank = ? AND sort_rowid > ?) "
+                "ORDER BY sort_rank, sort_rowid"
+            )
+            params.extend([after["rank"], after["rank"], after["rowid"]])
+        
+        return sql, params
     
-    def populate_initial_data(self):
-        """Заполнение начальными данными"""
-        # Проверяем, есть ли уже данные
+    def populate_initial_data(self) -> int:
+        """Заполнение начальными данными, если база пуста; возвращает число добавленных зданий"""
         with self.get_connection() as conn:
-            cursor = conn.execute("SELECT COUNT(*) FROM buildings")
-            count = cursor.fetchone()[0]
-            
-            if count > 0:
-                logger.info(f"База уже содержит {count} зданий")
-                return
+            if conn.execute("SELECT 1 FROM buildings LIMIT 1").fetchone():
+                return 0
+        
+        # Модуль с данными импортируется только когда они действительно нужны
+        from pgu_real_data import get_pgu_real_data
         
         # Реальные данные ПГУ (Пензенский государственный университет)
-        initial_buildings = get_pgu_real_data()
+        added = self.bulk_load(get_pgu_real_data())
+        logger.info("Добавлено %d зданий в базу данных", added)
+        return added
+    
+    @staticmethod
+    def _building_params(building_data: Dict[str, Any]) -> Tuple[Any, ...]:
+        """Значения колонок BUILDING_COLUMNS для словаря здания"""
+        return (
+            building_data["id"],
+            building_data["name"],
+            building_data["type"],
+            building_data.get("description"),
+            building_data.get("image_url"),
+            json.dumps(building_data.get("coordinates")) if building_data.get("coordinates") else None,
+            building_data.get("floor_count"),
+            building_data.get("year_built"),
+            json.dumps(building_data.get("departments") or []),
+            json.dumps(building_data.get("amenities") or []),
+            bool(building_data.get("accessible", False)),
+            bool(building_data.get("has_elevator", False)),
+            bool(building_data.get("has_parking", False))
+        )
+    
+    def bulk_load(self,
+                  buildings: Iterable[Dict[str, Any]],
+                  mode: str = "insert",
+                  batch_size: int = 1000) -> int:
+        """Загрузка зданий с аудиториями одной транзакцией
+        
+        buildings читается потоково пачками по batch_size через executemany.
+        Вторичные индексы и триггеры FTS на время загрузки удаляются, индексы
+        и FTS строятся заново одним проходом в конце. При ошибке транзакция
+        откатывается целиком вместе с удалением индексов.
+        """
+        if mode not in LOAD_MODES:
+            raise ValueError(f"Неизвестный режим загрузки: {mode}")
+        
+        columns = ", ".join(BUILDING_COLUMNS)
+        placeholders = ", ".join("?" for _ in BUILDING_COLUMNS)
+        insert_sql = f"INSERT INTO buildings ({columns}) VALUES ({placeholders})"
+        if mode == "upsert":
+            updates = ", ".join(f"{column} = excluded.{column}" for column in BUILDING_COLUMNS[1:])
+            insert_sql += f" ON CONFLICT (id) DO UPDATE SET {updates}"
+        
+        # Для замены аудиторий при upsert нужен индекс по building_id
+        deferred = [name for name in INDEXES if not (mode == "upsert" and name == "idx_rooms_building_floor")]
+        
+        loaded = 0
+        with self.get_connection(write=True) as conn:
+            # Явная транзакция: иначе sqlite3 фиксирует DROP INDEX сразу, и при ошибке
+            # база осталась бы без индексов
+            conn.execute("BEGIN")
+            for name in deferred:
+                conn.execute(f"DROP INDEX IF EXISTS {name}")
+            if self.fts_enabled:
+                for name in FTS_TRIGGERS:
+                    conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+            
+            if mode == "replace":
+                conn.execute("DELETE FROM rooms")
+                conn.execute("DELETE FROM buildings")
+            
+            batch: List[Dict[str, Any]] = []
+            
+            def flush() -> None:
+                conn.executemany(insert_sql, [self._building_params(building_data) for building_data in batch])
+                if mode == "upsert":
+                    conn.executemany("DELETE FROM rooms WHERE building_id = ?", [(b["id"],) for b in batch])
+                self._insert_rooms_many(conn, batch)
+                batch.clear()
+            
+            for building_data in buildings:
+                batch.append(building_data)
+                loaded += 1
+                if len(batch) >= batch_size:
+                    flush()
+            if batch:
+                flush()
+            
+            for name in deferred:
+                conn.execute(INDEXES[name])
+            if self.fts_enabled:
+                self._create_fts_triggers(conn)
+                conn.execute("INSERT INTO buildings_fts(buildings_fts) VALUES ('rebuild')")
+            
+            conn.execute("""
+                INSERT INTO meta (key, value) VALUES ('generation', 1)
+                ON CONFLICT (key) DO UPDATE SET value = value + 1
+            """)
+            generation = conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()[0]
+        
+        self._generation = generation
+        self.invalidate_cache()
+        return loaded
+    
+    @property
+    def data_version(self) -> int:
+        """Текущая версия данных; загрузки из других процессов учитывает check_generation()"""
+        return self._data_version
+    
+    def check_generation(self) -> None:
+        """Сброс кэшей, если поколение данных в meta изменил другой процесс
+        
+        Выполняет запрос к базе, поэтому вызывается из пула потоков раз в
+        DB_GENERATION_CHECK_INTERVAL секунд, а не на пути каждого запроса.
+        """
+        if not self._generation_lock.acquire(blocking=False):
+            return
+        try:
+            with self.get_connection() as conn:
+                row = conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+            generation = row[0] if row else 0
+            if self._generation is not None and generation != self._generation:
+                logger.info("Данные изменены другим процессом (поколение %s), кэши сброшены", generation)
+                self.invalidate_cache()
+            self._generation = generation
+        finally:
+            self._generation_lock.release()
+    
+    def invalidate_cache(self) -> None:
+        """Увеличение версии данных после записи"""
+        with self._snapshot_lock:
+            self._data_version += 1
+            self._snapshot = None
+        with self._count_lock:
+            self._count_cache.clear()
+    
+    def get_snapshot(self) -> BuildingSnapshot:
+        """Снимок всех зданий в памяти, перестраивается при смене версии данных"""
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == self.data_version:
+            metrics.cache_requests.inc(cache="snapshot", result="hit")
+            return snapshot
+        
+        with self._snapshot_lock:
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.version == self._data_version:
+                metrics.cache_requests.inc(cache="snapshot", result="hit")
+                return snapshot
+            
+            metrics.cache_requests.inc(cache="snapshot", result="miss")
+            return self._build_snapshot()
+    
+    @metrics.observe_db
+    def _build_snapshot(self) -> BuildingSnapshot:
+        """Чтение всех зданий без аудиторий; вызывается под _snapshot_lock"""
+        version = self._data_version
+        with self.get_connection() as conn:
+            building_rows = conn.execute("SELECT * FROM buildings ORDER BY rowid").fetchall()
+        
+        # Разбор JSON и создание моделей измеряются отдельно
+        with metrics.json_decode_duration.time():
+            building_data = [self._decode_building(row) for row in building_rows]
         
-        # Добавляем данные в базу
+        with metrics.model_build_duration.time():
+            buildings = [Building(**data) for data in building_data]
+        
+        snapshot = BuildingSnapshot(version, buildings, self)
+        self._snapshot = snapshot
+        logger.info("Снимок зданий построен: %d зданий, версия %d", len(buildings), version)
+        return snapshot
+    
+    def _tuples(self, sql: str, params: Iterable[Any] = ()) -> List[Tuple[Any, ...]]:
+        """Строки запроса кортежами: для индексов, которым не нужны sqlite3.Row"""
         with self.get_connection() as conn:
-            for building_data in initial_buildings:
-                conn.execute("""
-                    INSERT INTO buildings 
-                    (id, name, type, description, image_url, coordinates, floor_count, year_built, departments, amenities, rooms, accessible, has_elevator, has_parking)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    building_data["id"],
-                    building_data["name"],
-                    building_data["type"],
-                    building_data.get("description"),
-                    building_data.get("image_url"),
-                    json.dumps(building_data.get("coordinates")) if building_data.get("coordinates") else None,
-                    building_data.get("floor_count"),
-                    building_data.get("year_built"),
-                    json.dumps(building_data.get("departments", [])),
-                    json.dumps(building_data.get("amenities", [])),
-                    json.dumps(building_data.get("rooms", [])),
-                    building_data.get("accessible", False),
-                    building_data.get("has_elevator", False),
-                    building_data.get("has_parking", False)
-                ))
-            conn.commit()
-            logger.info(f"Добавлено {len(initial_buildings)} зданий в базу данных")
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            return cursor.execute(sql, list(params)).fetchall()
+    
+    def room_numbers(self) -> List[Tuple[int, str, str]]:
+        """(id, building_id, number) всех аудиторий для поискового индекса"""
+        return self._tuples("SELECT id, building_id, number FROM rooms ORDER BY id")
+    
+    def room_number_counts(self) -> List[Tuple[str, int]]:
+        """Номера аудиторий с количеством зданий, где они встречаются"""
+        return self._tuples("SELECT number, COUNT(*) FROM rooms GROUP BY number")
+    
+    def room_types(self) -> List[Tuple[str, str]]:
+        """Пары (building_id, тип аудитории), которые есть в данных"""
+        return self._tuples("SELECT DISTINCT building_id, type FROM rooms")
+    
+    def get_rooms(self, building_ids: Iterable[str], room_type: Optional[str] = None) -> Dict[str, List[Room]]:
+        """Аудитории зданий по ID здания, пачками по ROOMS_BATCH_SIZE"""
+        ids = list(dict.fromkeys(building_ids))
+        rooms: Dict[str, List[Room]] = {}
+        with self.get_connection() as conn:
+            for start in range(0, len(ids), ROOMS_BATCH_SIZE):
+                batch = ids[start:start + ROOMS_BATCH_SIZE]
+                sql = f"SELECT * FROM rooms WHERE building_id IN ({', '.join('?' for _ in batch)})"
+                params: List[Any] = list(batch)
+                if room_type:
+                    sql += " AND type = ?"
+                    params.append(room_type)
+                for row in conn.execute(sql + " ORDER BY id", params):
+                    rooms.setdefault(row["building_id"], []).append(self._row_to_room(row))
+        return rooms
     
+    def get_building_rooms(self, building_id: str) -> List[Room]:
+        """Аудитории одного здания"""
+        return self.get_rooms([building_id]).get(building_id, [])
+    
+    def get_rooms_by_ids(self, room_ids: Iterable[int]) -> Dict[int, Room]:
+        """Аудитории по ID строк таблицы rooms"""
+        ids = list(dict.fromkeys(room_ids))
+        rooms: Dict[int, Room] = {}
+        with self.get_connection() as conn:
+            for start in range(0, len(ids), ROOMS_BATCH_SIZE):
+                batch = ids[start:start + ROOMS_BATCH_SIZE]
+                sql = f"SELECT * FROM rooms WHERE id IN ({', '.join('?' for _ in batch)})"
+                for row in conn.execute(sql, batch):
+                    rooms[row["id"]] = self._row_to_room(row)
+        return rooms
+    
+    def with_rooms(self, buildings: List[Building]) -> List[Building]:
+        """Копии зданий снимка с аудиториями из таблицы rooms"""
+        if not buildings:
+            return buildings
+        rooms = self.get_rooms(building.id for building in buildings)
+        return [building.model_copy(update={"rooms": rooms.get(building.id, [])}) for building in buildings]
+    
+    @staticmethod
+    def _decode_room(row: sqlite3.Row) -> Dict[str, Any]:
+        """Поля модели Room из строки таблицы rooms"""
+        return {
+            "number": row["number"],
+            "floor": row["floor"],
+            "type": row["type"],
+            "capacity": row["capacity"],
+            "equipment": json.loads(row["equipment"]) if row["equipment"] else [],
+            "accessible": bool(row["accessible"]),
+        }
+    
+    @staticmethod
+    def _decode_building(row: sqlite3.Row) -> Dict[str, Any]:
+        """Поля модели Building из строки таблицы buildings, без аудиторий"""
+        building_data = dict(row)
+        building_data.pop("rooms", None)  # колонка могла остаться после миграции
+        
+        # Парсим JSON поля
+        if building_data["coordinates"]:
+            building_data["coordinates"] = json.loads(building_data["coordinates"])
+        if building_data["departments"]:
+            building_data["departments"] = json.loads(building_data["departments"])
+        if building_data["amenities"]:
+            building_data["amenities"] = json.loads(building_data["amenities"])
+        return building_data
+    
+    @classmethod
+    def _row_to_room(cls, row: sqlite3.Row) -> Room:
+        """Преобразование строки таблицы rooms в модель"""
+        return Room(**cls._decode_room(row))
+    
+    @classmethod
+    def _row_to_building(cls, row: sqlite3.Row, rooms: Optional[List[Room]] = None) -> Building:
+        """Преобразование строки таблицы buildings в модель"""
+        building_data = cls._decode_building(row)
+        building_data["rooms"] = rooms or []
+        return Building(**building_data)
+    
+    @metrics.observe_db
     def get_all_buildings(self, 
                          query: Optional[str] = None,
                          building_type: Optional[str] = None,
                          page: int = 1,
                          limit: int = 50) -> List[Building]:
         """Получение всех зданий с фильтрацией"""
+        snapshot = self.get_snapshot()
+        offset = (page - 1) * limit
         
-        sql = "SELECT * FROM buildings WHERE 1=1"
-        params = []
-        
-        if query:
-            sql += " AND (name LIKE ? OR description LIKE ?)"
-            like_query = f"%{query}%"
-            params.extend([like_query, like_query])
-        
-        if building_type:
-            sql += " AND type = ?"
-            params.append(building_type)
+        if not query:
+            return self.with_rooms(snapshot.select(building_type)[offset:offset + limit])
         
-        # Пагинация
-        offset = (page - 1) * limit
+        # Поиск выполняется в SQL (FTS5 с ранжированием bm25), объекты берутся из снимка
+        sql, params = self._filter_sql("buildings.id", query, building_type, ranked=True)
         sql += " LIMIT ? OFFSET ?"
         params.extend([limit, offset])
         
         with self.get_connection() as conn:
             cursor = conn.execute(sql, params)
-            rows = cursor.fetchall()
-            
-            buildings = []
-            for row in rows:
-                building_data = dict(row)
-                
-                # Парсим JSON поля
-                if building_data["coordinates"]:
-                    building_data["coordinates"] = json.loads(building_data["coordinates"])
-                if building_data["departments"]:
-                    building_data["departments"] = json.loads(building_data["departments"])
-                if building_data["amenities"]:
-                    building_data["amenities"] = json.loads(building_data["amenities"])
-                if building_data["rooms"]:
-                    rooms_data = json.loads(building_data["rooms"])
-                    building_data["rooms"] = [Room(**room) for room in rooms_data]
-                else:
-                    building_data["rooms"] = []
-                
-                buildings.append(Building(**building_data))
-            
-            return buildings
+            ids = [row["id"] for row in cursor.fetchall()]
+        
+        return self.with_rooms([snapshot.by_id[building_id] for building_id in ids if building_id in snapshot.by_id])
     
-    def get_building_by_id(self, building_id: str) -> Optional[Building]:
-        """Получение здания по ID"""
+    @metrics.observe_db
+    def get_building_projection(self,
+                                fields: List[str],
+                                query: Optional[str] = None,
+                                building_type: Optional[str] = None,
+                                page: int = 1,
+                                limit: int = 50,
+                                building_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Выборка только запрошенных полей зданий без построения моделей
+        
+        Читаются только нужные колонки, JSON разбирается только для них,
+        аудитории загружаются отдельным запросом лишь если запрошено поле rooms.
+        """
+        unknown = set(fields) - set(Building.model_fields)
+        if unknown:
+            raise ValueError(f"Неизвестные поля: {', '.join(sorted(unknown))}")
+        
+        fields = ["id"] + [field for field in dict.fromkeys(fields) if field != "id"]
+        columns = ", ".join(f"buildings.{field}" for field in fields if field != "rooms")
+        
+        if building_id is not None:
+            sql = f"SELECT {columns} FROM buildings WHERE id = ?"
+            params: List[Any] = [building_id]
+        else:
+            sql, params = self._filter_sql(columns, query, building_type, ranked=True)
+            sql += " LIMIT ? OFFSET ?"
+            params.extend([limit, (page - 1) * limit])
+        
         with self.get_connection() as conn:
-            cursor = conn.execute("SELECT * FROM buildings WHERE id = ?", (building_id,))
-            row = cursor.fetchone()
+            rows = conn.execute(sql, params).fetchall()
             
-            if not row:
-                return None
-            
-            building_data = dict(row)
-            
-            # Парсим JSON поля
-            if building_data["coordinates"]:
-                building_data["coordinates"] = json.loads(building_data["coordinates"])
-            if building_data["departments"]:
-                building_data["departments"] = json.loads(building_data["departments"])
-            if building_data["amenities"]:
-                building_data["amenities"] = json.loads(building_data["amenities"])
-            if building_data["rooms"]:
-                rooms_data = json.loads(building_data["rooms"])
-                building_data["rooms"] = [Room(**room) for room in rooms_data]
+            rooms_by_building: Dict[str, List[Dict[str, Any]]] = {}
+            if "rooms" in fields and rows:
+                ids = [row["id"] for row in rows]
+                placeholders = ", ".join("?" for _ in ids)
+                for room_row in conn.execute(
+                    f"SELECT * FROM rooms WHERE building_id IN ({placeholders}) ORDER BY id", ids
+                ):
+                    rooms_by_building.setdefault(room_row["building_id"], []).append(
+                        self._row_to_room(room_row).model_dump()
+                    )
+        
+        result = []
+        for row in rows:
+            item: Dict[str, Any] = {}
+            for field in fields:
+                if field == "rooms":
+                    item["rooms"] = rooms_by_building.get(row["id"], [])
+                    continue
+                value = row[field]
+                if field == "coordinates":
+                    value = {axis: float(v) for axis, v in json.loads(value).items()} if value else None
+                elif field in JSON_COLUMNS:
+                    value = json.loads(value) if value else []
+                elif field in BOOLEAN_COLUMNS:
+                    value = bool(value)
+                item[field] = value
+            result.append(item)
+        return result
+    
+    @metrics.observe_db
+    def get_buildings_within(self,
+                             x1: float,
+                             y1: float,
+                             x2: float,
+                             y2: float,
+                             building_type: Optional[str] = None,
+                             limit: Optional[int] = None,
+                             with_rooms: bool = True) -> List[Building]:
+        """Здания, координаты которых попадают в прямоугольник, в порядке хранения"""
+        buildings = self.get_snapshot().spatial_index.within(x1, y1, x2, y2)
+        if building_type:
+            buildings = [building for building in buildings if building.type == building_type]
+        if limit is not None:
+            buildings = buildings[:limit]
+        return self.with_rooms(buildings) if with_rooms else buildings
+    
+    @metrics.observe_db
+    def find_nearest(self, x: float, y: float, category: str, k: int = 5) -> List[Tuple[float, NearbyPlace]]:
+        """k ближайших к точке зданий, где есть аудитории типа category или услуга с таким названием"""
+        found = self.get_snapshot().nearby_index.nearest(x, y, category, k)
+        room_type = category_key(category)
+        if room_type not in ROOM_TYPE_KEYS or not found:
+            return found
+        # Индекс знает только, в каких зданиях есть такие аудитории; сами аудитории читаются для k зданий
+        rooms = self.get_rooms((place.building.id for _, place in found), room_type)
+        return [
+            (distance, place._replace(rooms=tuple(rooms.get(place.building.id, []))))
+            for distance, place in found
+        ]
+    
+    @metrics.observe_db
+    def find_route(self, from_id: str, to_id: str, accessible: bool = False) -> Optional[Route]:
+        """Кратчайший маршрут между зданиями по графу дорожек или None, если пути нет"""
+        return self.get_snapshot().route_planner.route(from_id, to_id, accessible)
+    
+    @metrics.observe_db
+    def find_indoor_route(self, building_id: str, room_number: str, step_free: bool = False) -> Optional[IndoorRoute]:
+        """Маршрут от входа здания до аудитории или None, если здания, аудитории или пути нет"""
+        graph = self.get_snapshot().indoor_router.graph(building_id)
+        if graph is None:
+            return None
+        return graph.route(room_number, step_free)
+    
+    @metrics.observe_db
+    def get_building_by_id(self, building_id: str, with_rooms: bool = True) -> Optional[Building]:
+        """Получение здания по ID; with_rooms=False — без чтения аудиторий"""
+        building = self.get_snapshot().by_id.get(building_id)
+        if building is None or not with_rooms:
+            return building
+        return building.model_copy(update={"rooms": self.get_building_rooms(building_id)})
+    
+    @metrics.observe_db
+    def find_rooms(self,
+                   number: Optional[str] = None,
+                   building_id: Optional[str] = None,
+                   floor: Optional[int] = None,
+                   room_type: Optional[str] = None,
+                   limit: int = 100) -> List[RoomLocation]:
+        """Поиск аудиторий по номеру, зданию, этажу и типу через индексы таблицы rooms"""
+        sql = """
+            SELECT rooms.*, buildings.name AS building_name
+            FROM rooms JOIN buildings ON buildings.id = rooms.building_id
+            WHERE 1=1
+        """
+        params: List[Any] = []
+        
+        if number:
+            sql += " AND rooms.number = ?"
+            params.append(number)
+        
+        if building_id:
+            sql += " AND rooms.building_id = ?"
+            params.append(building_id)
+        
+        if floor is not None:
+            sql += " AND rooms.floor = ?"
+            params.append(floor)
+        
+        if room_type:
+            sql += " AND rooms.type = ?"
+            params.append(room_type)
+        
+        sql += " ORDER BY rooms.id LIMIT ?"
+        params.append(limit)
+        
+        with self.get_connection() as conn:
+            return [
+                RoomLocation(
+                    building_id=row["building_id"],
+                    building_name=row["building_name"],
+                    room=self._row_to_room(row)
+                )
+                for row in conn.execute(sql, params)
+            ]
+    
+    @metrics.observe_db
+    def search(self, query: str, offset: int = 0, limit: int = 10) -> Tuple[List[SearchResult], int, Optional[str]]:
+        """Страница поиска по индексу снимка, общее число совпадений и исправленный запрос
+        
+        Индекс хранит только ID аудиторий; модели аудиторий и зданий с аудиториями
+        читаются для выдаваемой страницы.
+        """
+        entries, total, corrected_query = self.get_snapshot().search_index.top(query, offset, limit)
+        rooms = self.get_rooms_by_ids(entry.room_id for entry in entries if entry.room_id is not None)
+        buildings = {
+            building.id: building
+            for building in self.with_rooms(list({entry.building.id: entry.building for entry in entries}.values()))
+        }
+        results = [
+            SearchResult(
+                type=entry.kind,
+                building=buildings[entry.building.id],
+                room=rooms.get(entry.room_id) if entry.room_id is not None else None,
+                amenity=entry.amenity,
+                match_text=entry.match_text,
+                priority=entry.priority
+            )
+            for entry in entries
+        ]
+        return results, total, corrected_query
+    
+    @metrics.observe_db
+    def get_buildings_by_ids(self, building_ids: List[str], with_rooms: bool = True) -> Tuple[List[Building], List[str]]:
+        """Получение нескольких зданий по ID в порядке запроса и список ненайденных ID"""
+        by_id = self.get_snapshot().by_id
+        buildings = []
+        missing = []
+        for building_id in dict.fromkeys(building_ids):
+            building = by_id.get(building_id)
+            if building is None:
+                missing.append(building_id)
             else:
-                building_data["rooms"] = []
-            
-            return Building(**building_data)
+                buildings.append(building)
+        return (self.with_rooms(buildings) if with_rooms else buildings), missing
     
+    @metrics.observe_db
     def get_building_types(self) -> List[Dict[str, Any]]:
         """Получение типов зданий со статистикой"""
         with self.get_connection() as conn:
@@ -201,25 +924,107 @@ class Database:
                 for row in cursor.fetchall()
             ]
     
+    @metrics.observe_db
     def get_total_count(self, 
                        query: Optional[str] = None,
                        building_type: Optional[str] = None) -> int:
         """Получение общего количества зданий с учетом фильтров"""
-        sql = "SELECT COUNT(*) FROM buildings WHERE 1=1"
-        params = []
+        if not query:
+            return len(self.get_snapshot().select(building_type))
         
-        if query:
-            sql += " AND (name LIKE ? OR description LIKE ?)"
-            like_query = f"%{query}%"
-            params.extend([like_query, like_query])
+        key = (self.data_version, query, building_type)
+        count = self._cached_count(key)
+        if count is not None:
+            metrics.cache_requests.inc(cache="count", result="hit")
+            return count
+        metrics.cache_requests.inc(cache="count", result="miss")
         
-        if building_type:
-            sql += " AND type = ?"
-            params.append(building_type)
+        sql, params = self._filter_sql("COUNT(*)", query, building_type)
         
         with self.get_connection() as conn:
             cursor = conn.execute(sql, params)
-            return cursor.fetchone()[0]
+            count = cursor.fetchone()[0]
+        
+        self._store_count(key, count)
+        return count
+    
+    def _cached_count(self, key: Tuple[int, Optional[str], Optional[str]]) -> Optional[int]:
+        with self._count_lock:
+            count = self._count_cache.get(key)
+            if count is not None:
+                self._count_cache.move_to_end(key)
+            return count
+    
+    def _store_count(self, key: Tuple[int, Optional[str], Optional[str]], count: int) -> None:
+        with self._count_lock:
+            self._count_cache[key] = count
+            self._count_cache.move_to_end(key)
+            while len(self._count_cache) > COUNT_CACHE_MAX_ENTRIES:
+                self._count_cache.popitem(last=False)
+    
+    @staticmethod
+    def _page_position(cursor: str) -> Dict[str, Any]:
+        """Ключ сортировки последней выданной строки из курсора страницы"""
+        position = decode_cursor(cursor)
+        return {
+            "rowid": cursor_field(position, "rowid", (int,)),
+            "rank": cursor_field(position, "rank", (int, float), optional=True),
+        }
+    
+    @metrics.observe_db
+    def get_buildings_page(self,
+                           query: Optional[str] = None,
+                           building_type: Optional[str] = None,
+                           page: int = 1,
+                           limit: int = 50,
+                           cursor: Optional[str] = None) -> Tuple[List[Building], int, Optional[str]]:
+        """Страница зданий, общее количество и курсор следующей страницы
+        
+        Без курсора страница выбирается по номеру, а количество считается тем же
+        запросом оконной функцией. С курсором выдача продолжается по ключу
+        сортировки (rowid или bm25 + rowid), количество берется из кэша.
+        """
+        snapshot = self.get_snapshot()
+        after = self._page_position(cursor) if cursor else None
+        total: Optional[int] = None
+        
+        if after is None:
+            if not query:
+                total = len(snapshot.select(building_type))
+            else:
+                total = self._cached_count((snapshot.version, query, building_type))
+        
+        sql, params = self._filter_sql("buildings.id", query, building_type, ranked=True, after=after)
+        if after is None and total is None:
+            # Количество считается оконной функцией в том же запросе, что и страница
+            sql = (
+                f"SELECT *, COUNT(*) OVER () AS total_count FROM ({sql}) "
+                "ORDER BY sort_rank, sort_rowid"
+            )
+        # Лишняя строка показывает, есть ли следующая страница
+        sql += " LIMIT ?"
+        params.append(limit + 1)
+        if after is None:
+            sql += " OFFSET ?"
+            params.append((page - 1) * limit)
+        
+        with self.get_connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        
+        if total is None and after is None and rows:
+            total = rows[0]["total_count"]
+            self._store_count((snapshot.version, query, building_type), total)
+        if total is None:
+            total = self.get_total_count(query, building_type)
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor({"rank": last["sort_rank"], "rowid": last["sort_rowid"]})
+        
+        buildings = self.with_rooms([snapshot.by_id[row["id"]] for row in rows if row["id"] in snapshot.by_id])
+        return buildings, total, next_cursor
 
 # Глобальный экземпляр базы данных
 db = Database() 
\ No newline at end of file
@@ -0,0 +1,121 @@
+"""
+Нечеткое сопоставление слов поискового запроса: опечатки, раскладка клавиатуры, ё/е
+"""
+
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Соответствие клавиш латинской и русской раскладок ЙЦУКЕН
+LATIN_KEYS = "qwertyuiop[]asdfghjkl;'zxcvbnm,.`"
+CYRILLIC_KEYS = "йцукенгшщзхъфывапролджэячсмитьбюё"
+
+EN_TO_RU = str.maketrans(LATIN_KEYS, CYRILLIC_KEYS)
+RU_TO_EN = str.maketrans(CYRILLIC_KEYS, LATIN_KEYS)
+
+# Минимальная длина слова для исправления опечаток
+MIN_FUZZY_LENGTH = 3
+
+# Сколько слов с наибольшим числом общих триграмм проверяется расстоянием редактирования
+MAX_CANDIDATES = 32
+
+
+def fold(text: str) -> str:
+    """Приведение к нижнему регистру и замена ё на е"""
+    return text.lower().replace("ё", "е")
+
+
+def swap_layout(text: str) -> str:
+    """Перевод текста, набранного в другой раскладке
+
+    Направление определяется по преобладающему алфавиту: латиница переводится
+    в кириллицу и наоборот.
+    """
+    latin = sum(1 for char in text if "a" <= char <= "z")
+    cyrillic = sum(1 for char in text if "а" <= char <= "я" or char == "ё")
+    if latin > cyrillic:
+        return text.translate(EN_TO_RU)
+    return text.translate(RU_TO_EN)
+
+
+def max_distance(word: str) -> int:
+    """Допустимое количество правок в зависимости от длины слова"""
+    return 1 if len(word) <= 5 else 2
+
+
+def padded_trigrams(word: str) -> List[str]:
+    """Триграммы слова с маркерами начала и конца"""
+    padded = f"^{word}$"
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Расстояние Дамерау-Левенштейна (с перестановкой соседних букв), ограниченное limit
+
+    Возвращает limit + 1, как только расстояние заведомо превышает limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+
+    previous_previous: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+class FuzzyIndex:
+    """Триграммный индекс словаря для быстрого подбора исправлений"""
+
+    def __init__(self, vocabulary: Dict[str, int]):
+        # Слово -> частота (количество записей поиска, в которых оно встречается)
+        self.vocabulary = vocabulary
+        self.words = list(vocabulary)
+        self.postings: Dict[str, List[int]] = {}
+        for word_id, word in enumerate(self.words):
+            for gram in set(padded_trigrams(word)):
+                self.postings.setdefault(gram, []).append(word_id)
+
+    @classmethod
+    def build(cls, words: Iterable[Tuple[str, int]]) -> "FuzzyIndex":
+        """Построение по парам (слово, частота); короткие и числовые слова пропускаются"""
+        vocabulary: Dict[str, int] = {}
+        for word, frequency in words:
+            word = fold(word)
+            if len(word) >= MIN_FUZZY_LENGTH and word.isalpha():
+                vocabulary[word] = vocabulary.get(word, 0) + frequency
+        return cls(vocabulary)
+
+    def __contains__(self, word: str) -> bool:
+        return fold(word) in self.vocabulary
+
+    def suggest(self, word: str) -> Optional[str]:
+        """Ближайшее слово словаря с учетом опечаток или None"""
+        word = fold(word)
+        if len(word) < MIN_FUZZY_LENGTH or word in self.vocabulary:
+            return None
+
+        overlap: Counter = Counter()
+        for gram in set(padded_trigrams(word)):
+            for word_id in self.postings.get(gram, ()):
+                overlap[word_id] += 1
+
+        limit = max_distance(word)
+        best: Optional[Tuple[int, int, str]] = None
+        for word_id, _ in overlap.most_common(MAX_CANDIDATES):
+            candidate = self.words[word_id]
+            distance = edit_distance(word, candidate, limit)
+            if distance > limit:
+                continue
+            # Меньше правок лучше, при равенстве — более частое слово
+            key = (distance, -self.vocabulary[candidate], candidate)
+            if best is None or key < best:
+                best = key
+        return best[2] if best else None
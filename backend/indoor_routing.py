@@ -0,0 +1,213 @@
+"""
+Маршруты внутри здания: от входа до аудитории через лестницы и лифты
+
+Здание моделируется графом: на каждом этаже коридор, лестничная клетка и,
+если есть лифт, лифтовой холл; аудитории подключены к коридору своего этажа.
+Вес ребра — ориентировочное время в секундах. В режиме без ступеней лестницы
+не используются, а недоступные аудитории и здания без доступного входа
+считаются недостижимыми.
+
+Граф здания строится при первом запросе по аудиториям из таблицы rooms, дерево кратчайших путей от входа —
+при первом запросе в каждом режиме; дальше маршрут до любой аудитории
+восстанавливается проходом по дереву.
+"""
+
+import heapq
+import logging
+import math
+import re
+import threading
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from fuzzy import fold
+from models import Building, IndoorStepKind, Room
+
+logger = logging.getLogger(__name__)
+
+# Ориентировочное время участков маршрута, секунды
+ENTRANCE_TIME = 10.0
+CORRIDOR_TIME = 30.0
+ROOM_TIME = 15.0
+STAIRS_FLOOR_TIME = 20.0
+ELEVATOR_WAIT_TIME = 40.0
+ELEVATOR_FLOOR_TIME = 5.0
+
+ENTRANCE_FLOOR = 1
+
+ROOM_PREFIX_RE = re.compile(r"^(аудитория|ауд\.?|кабинет|каб\.?|комната)\s*")
+
+
+def normalize_room_number(number: str) -> str:
+    """Номер аудитории для сравнения: регистр, ё/е и слово «аудитория» в начале"""
+    return ROOM_PREFIX_RE.sub("", fold(number).strip())
+
+
+class IndoorNode(NamedTuple):
+    """Узел графа здания"""
+    kind: str  # entrance, corridor, stairs, elevator, room
+    floor: int
+    room: Optional[Room] = None
+
+
+class IndoorStep(NamedTuple):
+    """Шаг маршрута для отображения пользователю"""
+    kind: IndoorStepKind
+    floor: int
+    text: str
+
+
+class IndoorRoute(NamedTuple):
+    """Маршрут от входа до аудитории"""
+    room: Room
+    duration: float
+    steps: Tuple[IndoorStep, ...]
+
+
+class BuildingGraph:
+    """Граф одного здания с деревьями кратчайших путей от входа по режимам"""
+
+    def __init__(self, building: Building, rooms: List[Room]):
+        self.building = building
+        self.nodes: List[IndoorNode] = []
+        # Соседи узла: (номер соседа, время, проходимо без ступеней)
+        self.adjacency: List[List[Tuple[int, float, bool]]] = []
+        self.rooms: Dict[str, List[int]] = {}
+        self._trees: Dict[bool, Tuple[List[float], List[int]]] = {}
+        self._lock = threading.Lock()
+
+        floors = [room.floor for room in rooms]
+        lowest = min(floors + [ENTRANCE_FLOOR])
+        highest = max(floors + [building.floor_count or ENTRANCE_FLOOR, ENTRANCE_FLOOR])
+
+        corridors: Dict[int, int] = {}
+        stairs: Dict[int, int] = {}
+        elevators: Dict[int, int] = {}
+        for floor in range(lowest, highest + 1):
+            corridors[floor] = self._add_node(IndoorNode("corridor", floor))
+            stairs[floor] = self._add_node(IndoorNode("stairs", floor))
+            self._add_edge(corridors[floor], stairs[floor], CORRIDOR_TIME)
+            if floor > lowest:
+                self._add_edge(stairs[floor - 1], stairs[floor], STAIRS_FLOOR_TIME, step_free=False)
+            if building.has_elevator:
+                elevators[floor] = self._add_node(IndoorNode("elevator", floor))
+                self._add_edge(corridors[floor], elevators[floor], CORRIDOR_TIME + ELEVATOR_WAIT_TIME)
+                if floor > lowest:
+                    self._add_edge(elevators[floor - 1], elevators[floor], ELEVATOR_FLOOR_TIME)
+
+        # Вход без ступеней только у доступного здания
+        self.entrance = self._add_node(IndoorNode("entrance", ENTRANCE_FLOOR))
+        self._add_edge(self.entrance, corridors[ENTRANCE_FLOOR], ENTRANCE_TIME, step_free=building.accessible)
+
+        for room in rooms:
+            position = self._add_node(IndoorNode("room", room.floor, room))
+            self._add_edge(corridors[room.floor], position, ROOM_TIME, step_free=room.accessible)
+            self.rooms.setdefault(normalize_room_number(room.number), []).append(position)
+
+    def _add_node(self, node: IndoorNode) -> int:
+        self.nodes.append(node)
+        self.adjacency.append([])
+        return len(self.nodes) - 1
+
+    def _add_edge(self, source: int, target: int, time: float, step_free: bool = True) -> None:
+        self.adjacency[source].append((target, time, step_free))
+        self.adjacency[target].append((source, time, step_free))
+
+    def tree(self, step_free: bool) -> Tuple[List[float], List[int]]:
+        """Дерево кратчайших путей от входа; считается один раз на режим"""
+        tree = self._trees.get(step_free)
+        if tree is None:
+            with self._lock:
+                tree = self._trees.get(step_free)
+                if tree is None:
+                    tree = self._trees[step_free] = self._dijkstra(step_free)
+        return tree
+
+    def _dijkstra(self, step_free: bool) -> Tuple[List[float], List[int]]:
+        distances = [math.inf] * len(self.nodes)
+        previous = [-1] * len(self.nodes)
+        distances[self.entrance] = 0.0
+        queue = [(0.0, self.entrance)]
+        while queue:
+            distance, position = heapq.heappop(queue)
+            if distance > distances[position]:
+                continue
+            # Через аудиторию не проходят, в нее только приходят
+            if self.nodes[position].kind == "room":
+                continue
+            for neighbour, time, edge_step_free in self.adjacency[position]:
+                if step_free and not edge_step_free:
+                    continue
+                candidate = distance + time
+                if candidate < distances[neighbour]:
+                    distances[neighbour] = candidate
+                    previous[neighbour] = position
+                    heapq.heappush(queue, (candidate, neighbour))
+        return distances, previous
+
+    def has_room(self, number: str) -> bool:
+        return normalize_room_number(number) in self.rooms
+
+    def route(self, number: str, step_free: bool = False) -> Optional[IndoorRoute]:
+        """Маршрут от входа до аудитории или None, если она недостижима в этом режиме"""
+        candidates = self.rooms.get(normalize_room_number(number))
+        if not candidates:
+            return None
+        distances, previous = self.tree(step_free)
+        target = min(candidates, key=lambda position: distances[position])
+        if math.isinf(distances[target]):
+            return None
+
+        path = [target]
+        while previous[path[-1]] != -1:
+            path.append(previous[path[-1]])
+        path.reverse()
+        return IndoorRoute(self.nodes[target].room, distances[target], tuple(self._steps(path)))
+
+    def _steps(self, path: List[int]) -> List[IndoorStep]:
+        """Шаги маршрута: подряд идущие пролеты лестницы или поездка на лифте объединяются"""
+        steps = [IndoorStep(IndoorStepKind.ENTER, ENTRANCE_FLOOR, f"Войдите в {self.building.name}")]
+        index = 1
+        while index < len(path):
+            node = self.nodes[path[index]]
+            if node.kind in ("stairs", "elevator"):
+                start_floor = node.floor
+                while index + 1 < len(path) and self.nodes[path[index + 1]].kind == node.kind:
+                    index += 1
+                floor = self.nodes[path[index]].floor
+                if floor != start_floor:
+                    steps.append(self._vertical_step(node.kind, start_floor, floor))
+            elif node.kind == "room":
+                room = node.room
+                steps.append(IndoorStep(IndoorStepKind.ARRIVE, room.floor, f"Аудитория {room.number}, {room.floor} этаж"))
+            index += 1
+        return steps
+
+    @staticmethod
+    def _vertical_step(kind: str, start_floor: int, floor: int) -> IndoorStep:
+        direction = "Поднимитесь" if floor > start_floor else "Спуститесь"
+        if kind == "elevator":
+            return IndoorStep(IndoorStepKind.ELEVATOR, floor, f"{direction} на лифте на {floor} этаж")
+        return IndoorStep(IndoorStepKind.STAIRS, floor, f"{direction} по лестнице на {floor} этаж")
+
+
+class IndoorRouter:
+    """Графы зданий одного снимка, строятся по мере запросов"""
+
+    def __init__(self, buildings: Dict[str, Building], load_rooms: Callable[[str], List[Room]]):
+        self.buildings = buildings
+        self.load_rooms = load_rooms
+        self._graphs: Dict[str, BuildingGraph] = {}
+        self._lock = threading.Lock()
+
+    def graph(self, building_id: str) -> Optional[BuildingGraph]:
+        graph = self._graphs.get(building_id)
+        if graph is None:
+            building = self.buildings.get(building_id)
+            if building is None:
+                return None
+            with self._lock:
+                graph = self._graphs.get(building_id)
+                if graph is None:
+                    graph = self._graphs[building_id] = BuildingGraph(building, self.load_rooms(building_id))
+                    logger.debug("Граф здания %s построен: %d узлов", building_id, len(graph.nodes))
+        return graph
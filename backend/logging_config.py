@@ -0,0 +1,114 @@
+"""
+Настройка логирования: запись через очередь в отдельном потоке и выборочный access-лог
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # text | json
+ACCESS_LOG_SAMPLE_RATE = float(os.getenv("ACCESS_LOG_SAMPLE_RATE", "1.0"))
+
+# Запросы медленнее порога логируются всегда, независимо от выборки
+ACCESS_LOG_SLOW_MS = float(os.getenv("ACCESS_LOG_SLOW_MS", "500"))
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+access_logger = logging.getLogger("access")
+
+_listener: Optional[QueueListener] = None
+
+
+class RecordQueueHandler(QueueHandler):
+    """Передача записи в очередь без форматирования
+
+    Стандартный prepare форматирует сообщение в потоке вызова и убирает
+    args и exc_info. Здесь запись уходит как есть: сообщение и traceback
+    форматирует обработчик в потоке слушателя.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна строка JSON на запись; поля из extra={"fields": {...}} добавляются как есть"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            data.update(fields)
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def setup_logging() -> None:
+    """Перенаправление логов в очередь, которую разбирает фоновый поток"""
+    global _listener
+    if _listener is not None:
+        return
+
+    handler = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers = [RecordQueueHandler(log_queue)]
+    root.setLevel(LOG_LEVEL)
+
+    _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Дописывание оставшихся записей и остановка фонового потока"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def log_access(method: str, path: str, status: int, duration_ms: float, client: Optional[str]) -> None:
+    """Одна строка access-лога на запрос с учетом выборки
+
+    Ошибки сервера и медленные запросы записываются всегда.
+    """
+    if not access_logger.isEnabledFor(logging.INFO):
+        return
+    if (
+        status < 500
+        and duration_ms < ACCESS_LOG_SLOW_MS
+        and ACCESS_LOG_SAMPLE_RATE < 1.0
+        and random.random() >= ACCESS_LOG_SAMPLE_RATE
+    ):
+        return
+
+    access_logger.info(
+        "%s %s %d %.1fms",
+        method, path, status, duration_ms,
+        extra={"fields": {
+            "method": method,
+            "path": path,
+            "status": status,
+            "duration_ms": round(duration_ms, 3),
+            "client": client,
+        }},
+    )
@@ -1,28 +1,104 @@
-from fastapi import FastAPI, HTTPException, Query, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Query, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from typing import List, Optional, Dict, Any
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response
+from typing import List, Optional, Dict, Any, Iterator, Union
 import asyncio
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, contextmanager
 import logging
+import time
 
 # Импорты новых модулей
-from models import Building, BuildingResponse, SearchResponse
-from controllers import BuildingController, SearchController
-from database import db
+from models import Building, BuildingBatchResponse, BuildingResponse, BuildingSummary, BuildingView, IndoorRouteResponse, NearestResponse, RouteResponse, SearchResponse, RoomLocation, RoomType
+from controllers import BuildingController, NearestController, RouteController, SearchController, RoomController
+from database import DB_GENERATION_CHECK_INTERVAL, db
+from async_database import adb
+from response_cache import etag_matches, response_cache
+from logging_config import setup_logging, log_access
+from map_tiles import TileStore, tile_store
+import metrics
+import profiling
 
-# Настройка логирования
-logging.basicConfig(level=logging.INFO)
+# Настройка логирования: запись в отдельном потоке через очередь
+setup_logging()
 logger = logging.getLogger(__name__)
 
+# Максимальное количество ID в пакетном запросе зданий
+MAX_BATCH_IDS = 200
+
+# Популярные запросы для пустой строки поиска; отдаются только те, что находят результаты
+POPULAR_SUGGESTIONS = [
+    "столовая", "библиотека", "аудитория 101", "туалет", 
+    "кафе", "спортзал", "главный корпус", "общежитие",
+    "деканат", "ректорат", "лифт", "парковка"
+]
+
+@contextmanager
+def startup_phase(name: str) -> Iterator[None]:
+    """Замер длительности этапа запуска"""
+    started = time.perf_counter()
+    yield
+    logger.info("Этап запуска «%s»: %.1f мс", name, (time.perf_counter() - started) * 1000)
+
+def warm_up() -> None:
+    """Построение снимка зданий и индексов по нему до первых запросов"""
+    with startup_phase("снимок зданий"):
+        snapshot = db.get_snapshot()
+    with startup_phase("поисковый индекс"):
+        snapshot.search_index
+    with startup_phase("автодополнение"):
+        snapshot.autocomplete
+    with startup_phase("пространственный индекс"):
+        snapshot.spatial_index
+    with startup_phase("индекс ближайших мест"):
+        snapshot.nearby_index
+    with startup_phase("граф дорожек"):
+        snapshot.route_planner
+    logger.info("Прогрев завершен: %d зданий", len(snapshot.buildings))
+
+def log_warm_up_failure(task: "asyncio.Task[None]") -> None:
+    """Ошибка фонового прогрева иначе останется в задаче незамеченной"""
+    if task.cancelled() or task.exception() is None:
+        return
+    logger.error("Прогрев не выполнен, снимок построится при первом запросе",
+                 exc_info=task.exception())
+
+async def watch_generation() -> None:
+    """Периодическая проверка, не загрузил ли данные другой процесс
+    
+    Запрос к базе выполняется в пуле потоков, поэтому ожидание соединения
+    из пула не задерживает event loop.
+    """
+    while True:
+        try:
+            await adb.run(db.check_generation)
+        except Exception as e:
+            logger.warning("Не удалось проверить поколение данных: %s", e)
+        await asyncio.sleep(DB_GENERATION_CHECK_INTERVAL)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     logger.info("Запуск приложения...")
-    logger.info(f"База данных инициализирована с {db.get_total_count()} зданиями")
+    started = time.perf_counter()
+    with startup_phase("схема базы данных"):
+        await adb.run(db.init_database)
+    with startup_phase("начальные данные"):
+        await adb.run(db.populate_initial_data)
+    # Прогрев идет в фоне: порт открывается сразу, ранние запросы дождутся снимка
+    warm_up_task = asyncio.create_task(adb.run(warm_up))
+    warm_up_task.add_done_callback(log_warm_up_failure)
+    generation_task = asyncio.create_task(watch_generation())
+    logger.info("Приложение готово к запросам за %.1f мс", (time.perf_counter() - started) * 1000)
     yield
     # Shutdown
     logger.info("Завершение приложения...")
+    generation_task.cancel()
+    await asyncio.gather(generation_task, return_exceptions=True)
+    if not warm_up_task.done():
+        await asyncio.gather(warm_up_task, return_exceptions=True)
+    adb.shutdown()
+    logger.info("Статистика пула соединений: %s", db.pool.stats())
+    db.close()
 
 # Инициализация FastAPI
 app = FastAPI(
@@ -41,13 +117,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Middleware для логирования
+# Middleware для логирования и метрик: одна строка access-лога на запрос с учетом выборки,
+# счетчик и гистограмма длительности по шаблону маршрута
 @app.middleware("http")
 async def log_requests(request, call_next):
-    logger.info(f"{request.method} {request.url}")
-    response = await call_next(request)
-    logger.info(f"Ответ: {response.status_code}")
-    return response
+    started = time.perf_counter()
+    metrics.http_in_flight.inc()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        duration = time.perf_counter() - started
+        metrics.http_in_flight.dec()
+        # Шаблон маршрута вместо пути, чтобы не плодить метки на каждый ID
+        route = request.scope.get("route")
+        route_path = route.path if route is not None else "unmatched"
+        metrics.http_requests.inc(method=request.method, route=route_path, status=status_code)
+        metrics.http_request_duration.observe(duration, method=request.method, route=route_path)
+        log_access(
+            request.method,
+            request.url.path,
+            status_code,
+            duration * 1000,
+            request.client.host if request.client else None
+        )
+
+# Профилирование отдельных запросов по флагу; без PROFILE_TOKEN/PROFILE_ALLOWED_IPS не подключается
+if profiling.PROFILING_ENABLED:
+    app.middleware("http")(profiling.profile_requests)
 
 # Routes
 @app.get("/", response_model=Dict[str, str])
@@ -62,15 +161,37 @@ async def root():
 @app.get("/health", response_model=Dict[str, str])
 async def health_check():
     """Проверка здоровья API"""
-    buildings_count = db.get_total_count()
+    buildings_count = await adb.get_total_count()
     return {"status": "healthy", "buildings_count": str(buildings_count)}
 
-@app.get("/api/buildings", response_model=List[Building])
+# Состояние пула соединений и кэша ответов снимается в момент запроса метрик
+metrics.registry.register(metrics.CallbackGauge(
+    "db_pool", "Статистика пула соединений SQLite",
+    lambda: {(name,): value for name, value in db.pool.stats().items()},
+    ("stat",)
+))
+metrics.registry.register(metrics.CallbackGauge(
+    "response_cache_entries", "Количество ответов в кэше",
+    lambda: {(): response_cache.stats()["entries"]}
+))
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    """Метрики в текстовом формате Prometheus"""
+    return PlainTextResponse(
+        metrics.registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+@app.get("/api/buildings", response_model=Union[List[Building], List[BuildingSummary], List[Dict[str, Any]]])
 async def get_buildings(
+    request: Request,
     query: Optional[str] = Query(None, description="Поисковый запрос по названию"),
     type: Optional[str] = Query(None, description="Фильтр по типу здания"),
     page: int = Query(1, ge=1, description="Номер страницы"),
-    limit: int = Query(50, ge=1, le=100, description="Количество результатов на странице")
+    limit: int = Query(50, ge=1, le=100, description="Количество результатов на странице"),
+    view: BuildingView = Query(BuildingView.FULL, description="Представление: full или summary (id, name, type, coordinates)"),
+    fields: Optional[str] = Query(None, description="Список полей через запятую, например: id,name,coordinates")
 ):
     """
     Получение списка зданий университета
@@ -79,29 +200,78 @@ async def get_buildings(
     - **type**: Фильтр по типу здания (academic, living, sports, dining, administrative)
     - **page**: Номер страницы для пагинации
     - **limit**: Количество результатов на странице (максимум 100)
+    - **view**: summary возвращает только данные для отрисовки карты, без аудиторий
+    - **fields**: Произвольный набор полей (имеет приоритет над view)
     """
-    return await BuildingController.get_buildings(query, type, page, limit)
+    return await response_cache.respond(
+        request,
+        ("buildings", query, type, page, limit, view, fields),
+        lambda: BuildingController.get_buildings(query, type, page, limit, view, fields)
+    )
 
 @app.get("/api/buildings/paginated", response_model=BuildingResponse)
 async def get_buildings_paginated(
+    request: Request,
     query: Optional[str] = Query(None, description="Поисковый запрос по названию"),
     type: Optional[str] = Query(None, description="Фильтр по типу здания"),
-    page: int = Query(1, ge=1, description="Номер страницы"),
-    limit: int = Query(50, ge=1, le=100, description="Количество результатов на странице")
+    page: int = Query(1, ge=1, description="Номер страницы (игнорируется при указании cursor)"),
+    limit: int = Query(50, ge=1, le=100, description="Количество результатов на странице"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из next_cursor")
 ):
     """
     Получение списка зданий с метаинформацией о пагинации
+    
+    Для глубоких страниц передавайте **cursor** из поля next_cursor предыдущего ответа:
+    выдача продолжается по ключу сортировки без OFFSET.
     """
-    return await BuildingController.get_buildings_with_pagination(query, type, page, limit)
+    return await response_cache.respond(
+        request,
+        ("buildings_paginated", query, type, page, limit, cursor),
+        lambda: BuildingController.get_buildings_with_pagination(query, type, page, limit, cursor)
+    )
 
-@app.get("/api/buildings/{building_id}", response_model=Building)
-async def get_building(building_id: str):
+@app.get("/api/buildings/batch", response_model=BuildingBatchResponse)
+async def get_buildings_batch(
+    request: Request,
+    ids: str = Query(..., description="ID зданий через запятую, например: 1,2,СТ")
+):
     """
-    Получение детальной информации о здании по ID
+    Получение нескольких зданий одним запросом
     
-    - **building_id**: Уникальный идентификатор здания
+    Здания возвращаются в порядке перечисления ID, ненайденные ID перечислены в **missing**
+    """
+    building_ids = [building_id.strip() for building_id in ids.split(",") if building_id.strip()]
+    if not building_ids:
+        raise HTTPException(status_code=400, detail="Не указаны ID зданий")
+    if len(building_ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"Можно запросить не более {MAX_BATCH_IDS} зданий")
+    
+    return await response_cache.respond(
+        request,
+        ("buildings_batch", tuple(building_ids)),
+        lambda: BuildingController.get_buildings_batch(building_ids)
+    )
+
+@app.get("/api/buildings/within", response_model=Union[List[Building], List[BuildingSummary], List[Dict[str, Any]]])
+async def get_buildings_within(
+    request: Request,
+    bbox: str = Query(..., description="Прямоугольник на карте: x1,y1,x2,y2"),
+    type: Optional[str] = Query(None, description="Фильтр по типу здания"),
+    limit: int = Query(500, ge=1, le=5000, description="Максимальное количество зданий"),
+    view: BuildingView = Query(BuildingView.FULL, description="Представление: full или summary (id, name, type, coordinates)"),
+    fields: Optional[str] = Query(None, description="Список полей через запятую, например: id,name,coordinates")
+):
+    """
+    Здания, попадающие в видимую область карты
+    
+    Поиск идет по пространственному индексу, время ответа зависит от размера области,
+    а не от общего числа зданий. Для отрисовки карты достаточно **view=summary**.
     """
-    return await BuildingController.get_building_by_id(building_id)
+    return await response_cache.respond(
+        request,
+        ("buildings_within", bbox, type, limit, view, fields),
+        lambda: BuildingController.get_buildings_within(bbox, type, limit, view, fields)
+    )
 
 @app.get("/api/buildings/types", response_model=List[Dict[str, Any]])
 async def get_building_types():
@@ -112,37 +282,189 @@ async def get_building_types():
     """
     return await BuildingController.get_building_types()
 
+@app.get("/api/buildings/{building_id}", response_model=Union[Building, BuildingSummary, Dict[str, Any]])
+async def get_building(
+    request: Request,
+    building_id: str,
+    view: BuildingView = Query(BuildingView.FULL, description="Представление: full или summary"),
+    fields: Optional[str] = Query(None, description="Список полей через запятую")
+):
+    """
+    Получение детальной информации о здании по ID
+    
+    - **building_id**: Уникальный идентификатор здания
+    - **view** / **fields**: Сокращенное представление здания
+    """
+    return await response_cache.respond(
+        request,
+        ("building", building_id, view, fields),
+        lambda: BuildingController.get_building_by_id(building_id, view, fields)
+    )
+
+@app.get("/api/rooms", response_model=List[RoomLocation])
+async def find_rooms(
+    number: Optional[str] = Query(None, description="Номер аудитории"),
+    building_id: Optional[str] = Query(None, description="ID здания"),
+    floor: Optional[int] = Query(None, description="Этаж"),
+    type: Optional[RoomType] = Query(None, description="Тип аудитории"),
+    limit: int = Query(100, ge=1, le=500, description="Максимальное количество результатов")
+):
+    """
+    Поиск аудиторий
+    
+    - **number**: Точный номер аудитории (например: "202")
+    - **building_id**: Ограничить поиск зданием
+    - **floor**: Ограничить поиск этажом
+    - **type**: Тип аудитории (classroom, lab, office, toilet, cafe, library, auditorium, room, other)
+    """
+    return await RoomController.find_rooms(number, building_id, floor, type.value if type else None, limit)
+
+@app.get("/api/nearest", response_model=NearestResponse)
+async def find_nearest(
+    request: Request,
+    from_: str = Query(..., alias="from", description="ID здания или координаты x,y"),
+    type: str = Query(..., min_length=1, description="Тип аудитории (toilet, cafe, library, ...) или название услуги"),
+    k: int = Query(5, ge=1, le=50, description="Количество ближайших зданий")
+):
+    """
+    Ближайшие здания с аудиториями нужного типа или услугой
+    
+    - **from**: ID здания (например: "1") или точка на карте "x,y"
+    - **type**: Тип аудитории из RoomType или название услуги ("Wi-Fi", "Медпункт");
+      для toilet, cafe, library учитываются и услуги здания ("Буфет", "Библиотека")
+    - **k**: Сколько зданий вернуть, по возрастанию расстояния
+    """
+    return await response_cache.respond(
+        request,
+        ("nearest", from_, type, k),
+        lambda: NearestController.find_nearest(from_, type, k)
+    )
+
+@app.get("/api/route", response_model=RouteResponse)
+async def get_route(
+    request: Request,
+    from_: str = Query(..., alias="from", description="ID начального здания"),
+    to: str = Query(..., description="ID конечного здания"),
+    accessible: bool = Query(False, description="Только доступные для маломобильных дорожки и входы")
+):
+    """
+    Пешеходный маршрут между зданиями
+    
+    - **from** / **to**: ID зданий; маршрут ведет от ближайшего подходящего входа к входу цели
+    - **accessible**: Не использовать недоступные дорожки и входы
+    
+    Граф дорожек загружается из файла WALKWAYS_PATH, без него здания соединяются
+    с ближайшими соседями по прямой.
+    """
+    return await response_cache.respond(
+        request,
+        ("route", from_, to, accessible),
+        lambda: RouteController.get_route(from_, to, accessible)
+    )
+
+@app.get("/api/route/indoor", response_model=IndoorRouteResponse)
+async def get_indoor_route(
+    request: Request,
+    building_id: str = Query(..., description="ID здания"),
+    room: str = Query(..., min_length=1, description="Номер аудитории, например 501"),
+    step_free: bool = Query(False, description="Без лестниц и недоступных помещений")
+):
+    """
+    Маршрут внутри здания от входа до аудитории
+    
+    - **building_id** / **room**: Здание и номер аудитории ("501" или "аудитория 501")
+    - **step_free**: Только лифты и доступные помещения; в здании без доступного входа
+      или без лифта верхние этажи в этом режиме недостижимы
+    """
+    return await response_cache.respond(
+        request,
+        ("indoor_route", building_id, room, step_free),
+        lambda: RouteController.get_indoor_route(building_id, room, step_free)
+    )
+
 @app.get("/api/search", response_model=SearchResponse)
 async def advanced_search(
+    request: Request,
     q: str = Query(..., description="Поисковый запрос"),
-    limit: int = Query(10, ge=1, le=50, description="Максимальное количество результатов")
+    limit: int = Query(10, ge=1, le=50, description="Максимальное количество результатов"),
+    offset: int = Query(0, ge=0, le=1000, description="Смещение от начала выдачи"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из next_cursor")
 ):
     """
     Расширенный поиск по зданиям, аудиториям и услугам
     
     - **q**: Поисковый запрос (название здания, номер аудитории, услуга)
     - **limit**: Максимальное количество результатов (по умолчанию 10, максимум 50)
+    - **offset** / **cursor**: Продолжение выдачи; **total** содержит полное число совпадений
     
     Поддерживаемые типы поиска:
     - Поиск по названию здания
     - Поиск по номеру аудитории (например: "101", "аудитория 202")
     - Поиск по услугам и удобствам (например: "кафе", "туалет", "библиотека")
     """
-    return await SearchController.advanced_search(q, limit)
+    return await response_cache.respond(
+        request,
+        ("search", q, limit, offset, cursor),
+        lambda: SearchController.advanced_search(q, limit, offset, cursor)
+    )
 
 @app.get("/api/suggestions", response_model=List[str])
-async def get_search_suggestions():
+async def get_search_suggestions(
+    request: Request,
+    q: Optional[str] = Query(None, description="Начало поискового запроса"),
+    limit: int = Query(10, ge=1, le=50, description="Максимальное количество подсказок")
+):
     """
     Получение подсказок для поиска
     
-    Возвращает список популярных поисковых запросов
+    - **q**: Префикс запроса; подсказки строятся по названиям зданий, аудиториям, услугам и кафедрам
+    
+    Без **q** возвращает популярные поисковые запросы, по которым есть результаты
+    """
+    if not q or not q.strip():
+        return await response_cache.respond(
+            request,
+            ("suggestions", None),
+            lambda: SearchController.get_popular_suggestions(POPULAR_SUGGESTIONS)
+        )
+    
+    return await response_cache.respond(
+        request,
+        ("suggestions", q, limit),
+        lambda: SearchController.get_suggestions(q, limit)
+    )
+
+@app.get("/api/map/manifest", response_model=Dict[str, Any])
+async def get_map_manifest(request: Request):
+    """
+    Описание тайлов карты: viewBox, сетка по уровням масштаба, файлы тайлов и рамки зданий
+    
+    Ответ проверяется по ETag; файлы тайлов из него кэшируются навсегда.
+    """
+    manifest = tile_store.manifest()
+    if manifest is None:
+        raise HTTPException(status_code=404, detail="Тайлы карты не собраны")
+    etag = f'"{manifest["version"]}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(manifest, headers=headers)
+
+@app.get("/api/map/tiles/{name:path}", response_class=FileResponse)
+async def get_map_tile(request: Request, name: str):
+    """
+    Файл тайла или общих определений карты из manifest
+    
+    Отдается заранее сжатый вариант (brotli или gzip) по Accept-Encoding.
     """
-    suggestions = [
-        "столовая", "библиотека", "аудитория 101", "туалет", 
-        "кафе", "спортзал", "главный корпус", "общежитие",
-        "деканат", "ректорат", "лифт", "парковка"
-    ]
-    return suggestions
+    resolved = tile_store.resolve(name, request.headers.get("accept-encoding", ""))
+    if resolved is None:
+        raise HTTPException(status_code=404, detail=f"Тайл {name} не найден")
+    path, encoding = resolved
+    headers = {"Cache-Control": TileStore.IMMUTABLE, "Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return FileResponse(path, media_type="image/svg+xml", headers=headers)
 
 # Обработчики ошибок
 @app.exception_handler(404)
@@ -154,7 +476,7 @@ async def not_found_handler(request, exc):
 
 @app.exception_handler(500)
 async def internal_error_handler(request, exc):
-    logger.error(f"Внутренняя ошибка сервера: {exc}")
+    logger.error("Внутренняя ошибка сервера: %s", exc)
     return JSONResponse(
         status_code=500,
         content={"detail": "Внутренняя ошибка сервера"}
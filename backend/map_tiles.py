@@ -0,0 +1,667 @@
+"""
+Векторные тайлы карты: сборка из SVG и раздача
+
+Сборка (из каталога backend):
+
+    python map_tiles.py ../front/public/map.svg                  # в MAP_TILES_DIR
+    python map_tiles.py map.svg --output map_tiles --max-zoom 3 --precision 1
+
+Из SVG удаляются метаданные и атрибуты редакторов, координаты округляются,
+карта режется на тайлы по уровням масштаба: на уровне z сетка 2^z x 2^z.
+Объект с data-id (здание) вместе с подписью id="<data-id>-text" попадает
+целиком в каждый тайл, который пересекает, так что клиент собирает здания
+по data-id без склейки геометрии. На мелких масштабах объекты меньше
+пикселя отбрасываются, а координаты округляются грубее.
+
+Общие определения (defs, style, градиенты) выносятся в отдельный файл. Имена
+файлов содержат хэш содержимого, поэтому тайлы отдаются с immutable кэшем;
+manifest.json со списком тайлов отдается с проверкой по ETag. Рядом с каждым
+файлом лежат сжатые варианты .gz и, если установлен пакет brotli, .br.
+"""
+
+import argparse
+import copy
+import gzip
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # сжатие brotli необязательно
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+MAP_TILES_DIR = os.getenv("MAP_TILES_DIR", "map_tiles")
+
+SVG_NS = "http://www.w3.org/2000/svg"
+XLINK_NS = "http://www.w3.org/1999/xlink"
+XML_NS = "http://www.w3.org/XML/1998/namespace"
+KEPT_NAMESPACES = {SVG_NS, XLINK_NS, XML_NS}
+
+ET.register_namespace("", SVG_NS)
+ET.register_namespace("xlink", XLINK_NS)
+
+MANIFEST_NAME = "manifest.json"
+DEFAULT_MAX_ZOOM = 3
+DEFAULT_PRECISION = 2
+# Примерный размер тайла на экране: объекты меньше пикселя на этом масштабе не выводятся
+TILE_PIXELS = 256
+
+# Элементы, которые сами не рисуются и нужны всем тайлам
+SHARED_TAGS = {
+    "defs", "style", "symbol", "clipPath", "mask", "marker",
+    "linearGradient", "radialGradient", "pattern", "filter",
+}
+METADATA_TAGS = {"metadata", "title", "desc"}
+# Трансформации, толщина линий и кегль не округляются: масштаб 0.35 не должен стать нулем
+GEOMETRY_ATTRIBUTES = {"x", "y", "width", "height", "cx", "cy", "r", "rx", "ry", "x1", "y1", "x2", "y2"}
+LIST_ATTRIBUTES = {"d", "points"}
+
+NUMBER_RE = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+PATH_TOKEN_RE = re.compile(r"[A-Za-z]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+ARC_FLAG_RE = re.compile(r"[01]")
+# Позиции флагов большой дуги и направления среди семи аргументов A/a
+ARC_FLAG_POSITIONS = (3, 4)
+TRANSFORM_RE = re.compile(r"(matrix|translate|scale|rotate|skewX|skewY)\s*\(([^)]*)\)")
+
+Matrix = Tuple[float, float, float, float, float, float]
+BBox = Tuple[float, float, float, float]
+IDENTITY: Matrix = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+
+class MapTilesError(ValueError):
+    """Ошибка входного SVG"""
+
+
+def local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def namespace(name: str) -> Optional[str]:
+    return name[1:].split("}", 1)[0] if name.startswith("{") else None
+
+
+# ---------- Очистка и округление ----------
+
+def strip_metadata(element: ET.Element) -> None:
+    """Удаление метаданных, элементов и атрибутов из пространств имен редакторов"""
+    for child in list(element):
+        if not isinstance(child.tag, str) or namespace(child.tag) not in (None, *KEPT_NAMESPACES):
+            element.remove(child)
+        elif local_name(child.tag) in METADATA_TAGS and element.get("data-id") is None:
+            element.remove(child)
+        else:
+            strip_metadata(child)
+    for name in list(element.attrib):
+        if namespace(name) not in (None, *KEPT_NAMESPACES):
+            del element.attrib[name]
+    # Переводы строк и отступы между тегами
+    if element.text is not None and not element.text.strip():
+        element.text = None
+    if element.tail is not None and not element.tail.strip():
+        element.tail = None
+
+
+def format_number(value: float, decimals: int) -> str:
+    text = f"{round(value, decimals):.{decimals}f}"
+    if "." in text:
+        text = text.rstrip("0").rstrip(".")
+    return "0" if text in ("-0", "") else text
+
+
+def path_tokens(value: str) -> List[str]:
+    """Команды и числа пути; флаги дуги всегда по одному символу
+
+    В компактной записи флаги A/a пишутся слитно (``a25 25 0 011 50 0``),
+    поэтому в их позициях берется ровно один символ 0 или 1.
+    """
+    tokens: List[str] = []
+    command = ""
+    argument = 0
+    position = 0
+    while position < len(value):
+        if value[position].isspace() or value[position] == ",":
+            position += 1
+            continue
+        if command in ("A", "a") and argument % 7 in ARC_FLAG_POSITIONS:
+            match = ARC_FLAG_RE.match(value, position)
+        else:
+            match = PATH_TOKEN_RE.match(value, position)
+        if match is None:
+            position += 1
+            continue
+        token = match.group()
+        if token[0].isalpha():
+            command = token
+            argument = 0
+        else:
+            argument += 1
+        tokens.append(token)
+        position = match.end()
+    return tokens
+
+
+def round_list(value: str, decimals: int) -> str:
+    """Округление чисел в d и points с компактной записью без лишних пробелов"""
+    parts: List[str] = []
+    previous_is_number = False
+    for token in path_tokens(value):
+        if token[0].isalpha():
+            parts.append(token)
+            previous_is_number = False
+            continue
+        number = format_number(float(token), decimals)
+        if previous_is_number and not number.startswith("-"):
+            parts.append(" ")
+        parts.append(number)
+        previous_is_number = True
+    return "".join(parts)
+
+
+def round_coordinates(element: ET.Element, decimals: int) -> None:
+    for current in element.iter():
+        for name, value in current.attrib.items():
+            if name in LIST_ATTRIBUTES:
+                current.set(name, round_list(value, decimals))
+            elif name in GEOMETRY_ATTRIBUTES:
+                current.set(name, NUMBER_RE.sub(lambda match: format_number(float(match.group()), decimals), value))
+
+
+# ---------- Геометрия ----------
+
+def multiply(m: Matrix, n: Matrix) -> Matrix:
+    a, b, c, d, e, f = m
+    a2, b2, c2, d2, e2, f2 = n
+    return (
+        a * a2 + c * b2, b * a2 + d * b2,
+        a * c2 + c * d2, b * c2 + d * d2,
+        a * e2 + c * f2 + e, b * e2 + d * f2 + f,
+    )
+
+
+def parse_transform(value: Optional[str]) -> Matrix:
+    matrix = IDENTITY
+    for name, arguments in TRANSFORM_RE.findall(value or ""):
+        args = [float(number) for number in NUMBER_RE.findall(arguments)]
+        if name == "matrix" and len(args) == 6:
+            step = tuple(args)
+        elif name == "translate":
+            step = (1.0, 0.0, 0.0, 1.0, args[0] if args else 0.0, args[1] if len(args) > 1 else 0.0)
+        elif name == "scale":
+            sx = args[0] if args else 1.0
+            step = (sx, 0.0, 0.0, args[1] if len(args) > 1 else sx, 0.0, 0.0)
+        elif name == "rotate" and args:
+            angle = math.radians(args[0])
+            cos, sin = math.cos(angle), math.sin(angle)
+            step = (cos, sin, -sin, cos, 0.0, 0.0)
+            if len(args) == 3:
+                cx, cy = args[1], args[2]
+                step = multiply(multiply((1.0, 0.0, 0.0, 1.0, cx, cy), step), (1.0, 0.0, 0.0, 1.0, -cx, -cy))
+        elif name == "skewX" and args:
+            step = (1.0, 0.0, math.tan(math.radians(args[0])), 1.0, 0.0, 0.0)
+        elif name == "skewY" and args:
+            step = (1.0, math.tan(math.radians(args[0])), 0.0, 1.0, 0.0, 0.0)
+        else:
+            continue
+        matrix = multiply(matrix, step)
+    return matrix
+
+
+def path_points(d: str) -> List[Tuple[float, float]]:
+    """Опорные и контрольные точки пути: их рамка содержит рамку кривой
+
+    Некорректный хвост пути обрывает разбор, рамка считается по уже
+    разобранным точкам.
+    """
+    tokens = path_tokens(d)
+    points: List[Tuple[float, float]] = []
+    x = y = start_x = start_y = 0.0
+    command = ""
+    index = 0
+
+    def take(count: int) -> List[float]:
+        nonlocal index
+        values = [float(token) for token in tokens[index:index + count]]
+        if len(values) < count:
+            raise ValueError("Не хватает координат в пути")
+        index += count
+        return values
+
+    try:
+        while index < len(tokens):
+            if tokens[index][0].isalpha():
+                command = tokens[index]
+                index += 1
+                if command in "Zz":
+                    x, y = start_x, start_y
+                    continue
+            if not command:
+                index += 1
+                continue
+            if index >= len(tokens) or tokens[index][0].isalpha():
+                continue
+            relative = command.islower()
+            upper = command.upper()
+            base_x, base_y = (x, y) if relative else (0.0, 0.0)
+
+            if upper in "MLT":
+                dx, dy = take(2)
+                x, y = base_x + dx, base_y + dy
+                if upper == "M":
+                    start_x, start_y = x, y
+                    # Следующие пары после M — это линии
+                    command = "l" if relative else "L"
+            elif upper == "H":
+                (dx,) = take(1)
+                x = base_x + dx if relative else dx
+            elif upper == "V":
+                (dy,) = take(1)
+                y = base_y + dy if relative else dy
+            elif upper in "CSQ":
+                values = take({"C": 6, "S": 4, "Q": 4}[upper])
+                for position in range(0, len(values) - 2, 2):
+                    points.append((base_x + values[position], base_y + values[position + 1]))
+                x, y = base_x + values[-2], base_y + values[-1]
+            elif upper == "A":
+                rx, ry, _, _, _, dx, dy = take(7)
+                radius = max(abs(rx), abs(ry))
+                end_x, end_y = base_x + dx, base_y + dy
+                points.extend([(x - radius, y - radius), (x + radius, y + radius),
+                               (end_x - radius, end_y - radius), (end_x + radius, end_y + radius)])
+                x, y = end_x, end_y
+            else:
+                index += 1
+                continue
+            points.append((x, y))
+    except ValueError:
+        pass
+    return points
+
+
+def number(element: ET.Element, name: str, default: float = 0.0) -> float:
+    match = NUMBER_RE.search(element.get(name, ""))
+    return float(match.group()) if match else default
+
+
+def local_points(element: ET.Element) -> List[Tuple[float, float]]:
+    """Точки, задающие рамку элемента в его собственной системе координат"""
+    tag = local_name(element.tag)
+    if tag in ("rect", "image", "use", "foreignObject"):
+        x, y = number(element, "x"), number(element, "y")
+        return [(x, y), (x + number(element, "width"), y + number(element, "height"))]
+    if tag in ("circle", "ellipse"):
+        cx, cy = number(element, "cx"), number(element, "cy")
+        rx = number(element, "r") if tag == "circle" else number(element, "rx")
+        ry = number(element, "r") if tag == "circle" else number(element, "ry")
+        return [(cx - rx, cy - ry), (cx + rx, cy + ry)]
+    if tag == "line":
+        return [(number(element, "x1"), number(element, "y1")), (number(element, "x2"), number(element, "y2"))]
+    if tag in ("polygon", "polyline"):
+        values = [float(value) for value in NUMBER_RE.findall(element.get("points", ""))]
+        return list(zip(values[0::2], values[1::2]))
+    if tag == "path":
+        return path_points(element.get("d", ""))
+    if tag == "text":
+        # Размер подписи оценивается по кеглю и длине текста
+        x, y = number(element, "x"), number(element, "y")
+        size = number(element, "font-size", 12.0)
+        text = "".join(element.itertext())
+        return [(x, y - size), (x + 0.6 * size * max(len(text), 1), y + 0.25 * size)]
+    return []
+
+
+def element_bbox(element: ET.Element, matrix: Matrix) -> Optional[BBox]:
+    """Рамка элемента и его потомков в координатах карты"""
+    matrix = multiply(matrix, parse_transform(element.get("transform")))
+    xs: List[float] = []
+    ys: List[float] = []
+    a, b, c, d, e, f = matrix
+    for x, y in local_points(element):
+        xs.append(a * x + c * y + e)
+        ys.append(b * x + d * y + f)
+    bbox = (min(xs), min(ys), max(xs), max(ys)) if xs else None
+    if local_name(element.tag) == "text":
+        return bbox
+    for child in element:
+        child_bbox = element_bbox(child, matrix)
+        if child_bbox is None:
+            continue
+        bbox = child_bbox if bbox is None else (
+            min(bbox[0], child_bbox[0]), min(bbox[1], child_bbox[1]),
+            max(bbox[2], child_bbox[2]), max(bbox[3], child_bbox[3]),
+        )
+    return bbox
+
+
+# ---------- Разбиение на объекты и тайлы ----------
+
+class Feature(NamedTuple):
+    """Объект карты: здание с data-id или отдельный элемент фона"""
+    element: ET.Element
+    key: Optional[str]  # data-id здания, к которому относится объект
+    bbox: BBox  # у частей здания — общая рамка здания с подписью
+    path: Tuple[ET.Element, ...]  # группы от корня до объекта
+
+
+class TileSet(NamedTuple):
+    """Результат сборки: описание для manifest.json и содержимое файлов"""
+    manifest: Dict[str, Any]
+    files: Dict[str, bytes]
+
+
+def extract_shared(root: ET.Element) -> List[ET.Element]:
+    """Вынос defs, style и прочих нерисуемых элементов из дерева"""
+    shared: List[ET.Element] = []
+
+    def walk(parent: ET.Element) -> None:
+        for child in list(parent):
+            if local_name(child.tag) in SHARED_TAGS:
+                parent.remove(child)
+                shared.append(child)
+            else:
+                walk(child)
+
+    walk(root)
+    return shared
+
+
+def collect_features(root: ET.Element) -> List[Feature]:
+    """Объекты в порядке отрисовки; группы без data-id раскрываются
+
+    Здание и его подпись получают общую рамку, поэтому по тайлам они
+    раскладываются вместе: подпись есть в каждом тайле, где есть здание.
+    """
+    building_ids = {element.get("data-id") for element in root.iter() if element.get("data-id")}
+    features: List[Feature] = []
+
+    def walk(element: ET.Element, matrix: Matrix, path: Tuple[ET.Element, ...]) -> None:
+        for child in element:
+            data_id = child.get("data-id")
+            label_of = (child.get("id") or "")[:-len("-text")] if (child.get("id") or "").endswith("-text") else None
+            is_group = local_name(child.tag) in ("g", "a", "switch")
+            if data_id is None and label_of not in building_ids and is_group:
+                walk(child, multiply(matrix, parse_transform(child.get("transform"))), path + (child,))
+                continue
+            bbox = element_bbox(child, matrix)
+            if bbox is not None:
+                features.append(Feature(child, data_id or (label_of if label_of in building_ids else None), bbox, path))
+
+    walk(root, IDENTITY, ())
+
+    extents: Dict[str, BBox] = {}
+    for feature in features:
+        if feature.key is None:
+            continue
+        box = extents.get(feature.key, feature.bbox)
+        extents[feature.key] = (
+            min(box[0], feature.bbox[0]), min(box[1], feature.bbox[1]),
+            max(box[2], feature.bbox[2]), max(box[3], feature.bbox[3]),
+        )
+    return [feature if feature.key is None else feature._replace(bbox=extents[feature.key]) for feature in features]
+
+
+def parse_view_box(root: ET.Element, features: List[Feature]) -> BBox:
+    values = [float(value) for value in NUMBER_RE.findall(root.get("viewBox", ""))]
+    if len(values) == 4 and values[2] > 0 and values[3] > 0:
+        return values[0], values[1], values[0] + values[2], values[1] + values[3]
+    width, height = number(root, "width"), number(root, "height")
+    if width > 0 and height > 0:
+        return 0.0, 0.0, width, height
+    if not features:
+        raise MapTilesError("У SVG нет viewBox и размеров, а объектов нет")
+    return (min(f.bbox[0] for f in features), min(f.bbox[1] for f in features),
+            max(f.bbox[2] for f in features), max(f.bbox[3] for f in features))
+
+
+def render_svg(root: ET.Element, view_box: BBox, features: Iterable[Feature], decimals: int,
+               extra: Iterable[ET.Element] = ()) -> bytes:
+    """SVG документ из выбранных объектов с сохранением цепочек групп"""
+    document = ET.Element(f"{{{SVG_NS}}}svg", {
+        name: value for name, value in root.attrib.items() if name not in ("width", "height", "viewBox")
+    })
+    min_x, min_y, max_x, max_y = view_box
+    document.set("viewBox", " ".join(
+        format_number(value, decimals + 2) for value in (min_x, min_y, max_x - min_x, max_y - min_y)
+    ))
+    for element in extra:
+        document.append(copy.deepcopy(element))
+
+    # Объекты копируются: одни и те же элементы попадают в тайлы разных уровней с разным округлением
+    groups: Dict[int, ET.Element] = {}
+    for feature in features:
+        parent = document
+        for group in feature.path:
+            group_copy = groups.get(id(group))
+            if group_copy is None:
+                group_copy = groups[id(group)] = ET.SubElement(parent, group.tag, dict(group.attrib))
+            parent = group_copy
+        parent.append(copy.deepcopy(feature.element))
+
+    round_coordinates(document, decimals)
+    return ET.tostring(document, encoding="utf-8", short_empty_elements=True)
+
+
+def content_name(prefix: str, content: bytes) -> str:
+    return f"{prefix}.{hashlib.sha1(content).hexdigest()[:12]}.svg"
+
+
+def build_tiles(source: bytes, max_zoom: int = DEFAULT_MAX_ZOOM, precision: int = DEFAULT_PRECISION) -> TileSet:
+    """Разбиение SVG на тайлы уровней 0..max_zoom"""
+    try:
+        root = ET.fromstring(source)
+    except ET.ParseError as e:
+        raise MapTilesError(f"Некорректный SVG: {e}") from e
+    if local_name(root.tag) != "svg":
+        raise MapTilesError("Корневой элемент не svg")
+
+    strip_metadata(root)
+    shared = extract_shared(root)
+    features = collect_features(root)
+    view_box = parse_view_box(root, features)
+    min_x, min_y, max_x, max_y = view_box
+    width, height = max_x - min_x, max_y - min_y
+
+    files: Dict[str, bytes] = {}
+    defs_content = render_svg(root, view_box, [], precision, shared)
+    defs_name = content_name("defs", defs_content)
+    files[defs_name] = defs_content
+
+    buildings = {feature.key: list(feature.bbox) for feature in features if feature.key is not None}
+
+    zooms: Dict[str, Any] = {}
+    for zoom in range(max_zoom + 1):
+        count = 1 << zoom
+        tile_width, tile_height = width / count, height / count
+        min_size = max(tile_width, tile_height) / TILE_PIXELS
+        decimals = max(0, precision - (max_zoom - zoom))
+
+        grid: Dict[Tuple[int, int], List[Feature]] = {}
+        for feature in features:
+            x1, y1, x2, y2 = feature.bbox
+            # Мелкие объекты фона не видны на обзорных масштабах; здания выводятся всегда
+            if zoom < max_zoom and feature.key is None and max(x2 - x1, y2 - y1) < min_size:
+                continue
+            first_x = max(0, math.floor((x1 - min_x) / tile_width))
+            last_x = min(count - 1, math.floor((x2 - min_x) / tile_width))
+            first_y = max(0, math.floor((y1 - min_y) / tile_height))
+            last_y = min(count - 1, math.floor((y2 - min_y) / tile_height))
+            for tile_x in range(first_x, last_x + 1):
+                for tile_y in range(first_y, last_y + 1):
+                    grid.setdefault((tile_x, tile_y), []).append(feature)
+
+        tiles: Dict[str, Any] = {}
+        for (tile_x, tile_y), tile_features in sorted(grid.items()):
+            tile_box = (
+                min_x + tile_x * tile_width, min_y + tile_y * tile_height,
+                min_x + (tile_x + 1) * tile_width, min_y + (tile_y + 1) * tile_height,
+            )
+            content = render_svg(root, tile_box, tile_features, decimals)
+            name = content_name(f"{zoom}/{tile_x}/{tile_y}", content)
+            files[name] = content
+            tiles[f"{tile_x}/{tile_y}"] = {
+                "file": name,
+                "buildings": sorted({feature.key for feature in tile_features if feature.key}),
+            }
+        zooms[str(zoom)] = {"tile_width": tile_width, "tile_height": tile_height, "tiles": tiles}
+
+    version = hashlib.sha1("".join(sorted(files)).encode("utf-8")).hexdigest()[:12]
+    manifest = {
+        "version": version,
+        "view_box": [min_x, min_y, width, height],
+        "max_zoom": max_zoom,
+        "defs": defs_name,
+        "zooms": zooms,
+        "buildings": buildings,
+    }
+    return TileSet(manifest, files)
+
+
+def compress(content: bytes) -> Dict[str, bytes]:
+    """Сжатые варианты файла по расширению"""
+    variants = {".gz": gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants[".br"] = brotli.compress(content, quality=11)
+    return variants
+
+
+def write_tiles(tile_set: TileSet, output: str, clean: bool = False) -> None:
+    """Запись тайлов; manifest.json заменяется последним
+
+    Файлы с хэшем в имени не перезаписываются, а файлы прошлых сборок по
+    умолчанию остаются: клиенты со старым manifest.json могут их дозапросить.
+    """
+    for name, content in tile_set.files.items():
+        path = os.path.join(output, name)
+        if os.path.exists(path):
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        for extension, compressed in compress(content).items():
+            # Сжатие не всегда выгодно для крошечных тайлов
+            if len(compressed) < len(content):
+                with open(path + extension, "wb") as f:
+                    f.write(compressed)
+        with open(path, "wb") as f:
+            f.write(content)
+
+    manifest_path = os.path.join(output, MANIFEST_NAME)
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(tile_set.manifest, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+    if clean:
+        keep = {os.path.normpath(os.path.join(output, name)) for name in tile_set.files}
+        for directory, _, names in os.walk(output):
+            for name in names:
+                path = os.path.join(directory, name)
+                base = re.sub(r"\.(gz|br)$", "", path)
+                if name != MANIFEST_NAME and os.path.normpath(base) not in keep:
+                    os.remove(path)
+
+
+# ---------- Раздача ----------
+
+class TileStore:
+    """Тайлы из каталога сборки; manifest.json перечитывается при изменении"""
+
+    IMMUTABLE = "public, max-age=31536000, immutable"
+    ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+    def __init__(self, directory: str = MAP_TILES_DIR):
+        self.directory = directory
+        self._manifest: Optional[Dict[str, Any]] = None
+        self._files: frozenset = frozenset()
+        self._mtime: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def manifest(self) -> Optional[Dict[str, Any]]:
+        """Текущий manifest или None, если тайлы не собраны"""
+        path = os.path.join(self.directory, MANIFEST_NAME)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    with open(path, encoding="utf-8") as f:
+                        manifest = json.load(f)
+                    files = {manifest["defs"]}
+                    for zoom in manifest["zooms"].values():
+                        files.update(tile["file"] for tile in zoom["tiles"].values())
+                    self._manifest, self._files, self._mtime = manifest, frozenset(files), mtime
+                    logger.info("Тайлы карты загружены: версия %s, %d файлов", manifest["version"], len(files))
+        return self._manifest
+
+    def resolve(self, name: str, accept_encoding: str) -> Optional[Tuple[str, Optional[str]]]:
+        """Путь к файлу и Content-Encoding; только файлы из manifest"""
+        if self.manifest() is None or name not in self._files:
+            return None
+        path = os.path.join(self.directory, name)
+        accepted = accepted_encodings(accept_encoding)
+        for encoding, extension in self.ENCODINGS:
+            if encoding in accepted and os.path.exists(path + extension):
+                return path + extension, encoding
+        return path, None
+
+
+def accepted_encodings(header: str) -> set:
+    """Кодировки из Accept-Encoding, кроме явно запрещенных через q=0"""
+    result = set()
+    for item in header.split(","):
+        parts = [part.strip() for part in item.split(";")]
+        if not parts[0]:
+            continue
+        quality = next((part[2:] for part in parts[1:] if part.startswith("q=")), "1")
+        try:
+            if float(quality) > 0:
+                result.add(parts[0].lower())
+        except ValueError:
+            continue
+    return result
+
+
+tile_store = TileStore()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Сборка тайлов карты из SVG")
+    parser.add_argument("source", help="исходный SVG")
+    parser.add_argument("--output", default=MAP_TILES_DIR, help="каталог тайлов; по умолчанию MAP_TILES_DIR")
+    parser.add_argument("--max-zoom", type=int, default=DEFAULT_MAX_ZOOM)
+    parser.add_argument("--precision", type=int, default=DEFAULT_PRECISION, help="знаков после запятой на крупнейшем масштабе")
+    parser.add_argument("--clean", action="store_true", help="удалить файлы прошлых сборок")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    try:
+        started = time.perf_counter()
+        with open(args.source, "rb") as f:
+            source = f.read()
+        tile_set = build_tiles(source, args.max_zoom, args.precision)
+        write_tiles(tile_set, args.output, args.clean)
+    except (MapTilesError, OSError) as e:
+        logger.error("Сборка тайлов не выполнена: %s", e)
+        return 1
+
+    total = sum(len(content) for content in tile_set.files.values())
+    logger.info(
+        "Собрано %d файлов, %.0f КБ на %d уровнях масштаба (исходный SVG %.0f КБ) за %.1f с, brotli: %s",
+        len(tile_set.files), total / 1024, args.max_zoom + 1, len(source) / 1024, time.perf_counter() - started,
+        "да" if brotli is not None else "нет",
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
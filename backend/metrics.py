@@ -0,0 +1,261 @@
+"""
+Метрики приложения в текстовом формате Prometheus
+
+Метрики хранятся в памяти процесса; при нескольких воркерах uvicorn
+каждый воркер отдает свои значения.
+"""
+
+import abc
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+
+LabelValues = Tuple[str, ...]
+
+# Границы корзин гистограмм в секундах: от 100 мкс до 10 с
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric(abc.ABC):
+    """Базовый класс метрики с набором меток"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    @abc.abstractmethod
+    def samples(self) -> List[Tuple[str, LabelValues, float]]:
+        """Пары (имя с суффиксом, значения меток, значение) для вывода"""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, label_values, value in self.samples():
+            names = self.label_names
+            if suffix == "_bucket":
+                names = self.label_names + ("le",)
+            lines.append(f"{self.name}{suffix}{_format_labels(names, label_values)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    """Монотонно растущий счетчик"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def values(self) -> Dict[LabelValues, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self) -> List[Tuple[str, LabelValues, float]]:
+        with self._lock:
+            return [("_total", key, value) for key, value in sorted(self._values.items())]
+
+
+class Gauge(Metric):
+    """Значение, которое может расти и уменьшаться"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self) -> List[Tuple[str, LabelValues, float]]:
+        with self._lock:
+            return [("", key, value) for key, value in sorted(self._values.items())]
+
+
+class CallbackGauge(Metric):
+    """Gauge, значения которого вычисляются в момент отдачи метрик"""
+
+    kind = "gauge"
+
+    def __init__(self,
+                 name: str,
+                 documentation: str,
+                 callback: Callable[[], Dict[LabelValues, float]],
+                 labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self.callback = callback
+
+    def samples(self) -> List[Tuple[str, LabelValues, float]]:
+        return [("", key, value) for key, value in sorted(self.callback().items())]
+
+
+class Histogram(Metric):
+    """Распределение значений по корзинам с суммой и количеством"""
+
+    kind = "histogram"
+
+    def __init__(self,
+                 name: str,
+                 documentation: str,
+                 labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Метки -> (счетчики по корзинам без накопления, сумма, количество)
+        self._values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0, 0)
+            counts[index] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[Tuple[str, LabelValues, float]]:
+        with self._lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+
+        result: List[Tuple[str, LabelValues, float]] = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                result.append(("_bucket", key + (_format_value(bound),), cumulative))
+            result.append(("_sum", key, total))
+            result.append(("_count", key, count))
+        return result
+
+
+class Registry:
+    """Набор метрик процесса"""
+
+    def __init__(self):
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# HTTP
+http_requests = registry.register(Counter(
+    "http_requests", "Количество HTTP запросов", ("method", "route", "status")
+))
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Время обработки HTTP запроса", ("method", "route")
+))
+http_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "Запросы, обрабатываемые в данный момент"
+))
+
+# База данных
+db_queries = registry.register(Counter(
+    "db_queries", "Количество вызовов методов Database", ("method",)
+))
+db_query_duration = registry.register(Histogram(
+    "db_query_duration_seconds", "Время выполнения методов Database", ("method",)
+))
+json_decode_duration = registry.register(Histogram(
+    "json_decode_duration_seconds", "Время разбора JSON колонок при построении снимка"
+))
+model_build_duration = registry.register(Histogram(
+    "model_build_duration_seconds", "Время создания pydantic моделей при построении снимка"
+))
+
+# Кэши
+cache_requests = registry.register(Counter(
+    "cache_requests", "Обращения к кэшам", ("cache", "result")
+))
+
+
+def _cache_hit_ratios() -> Dict[LabelValues, float]:
+    totals: Dict[str, List[float]] = {}
+    for (cache, result), value in cache_requests.values().items():
+        hits_total = totals.setdefault(cache, [0.0, 0.0])
+        hits_total[1] += value
+        if result == "hit":
+            hits_total[0] += value
+    return {(cache,): hits / total for cache, (hits, total) in totals.items() if total}
+
+
+cache_hit_ratio = registry.register(CallbackGauge(
+    "cache_hit_ratio", "Доля попаданий в кэш", _cache_hit_ratios, ("cache",)
+))
+
+
+def observe_db(func: Callable[..., T]) -> Callable[..., T]:
+    """Декоратор метода Database: количество вызовов и длительность"""
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            db_queries.inc(method=name)
+            db_query_duration.observe(time.perf_counter() - started, method=name)
+
+    return wrapper
@@ -37,6 +37,67 @@ class Building(BaseModel):
     has_elevator: bool = Field(False, description="Наличие лифта")
     has_parking: bool = Field(False, description="Наличие парковки")
 
+class BuildingSummary(BaseModel):
+    id: str = Field(..., description="Уникальный ID здания")
+    name: str = Field(..., description="Название здания")
+    type: str = Field(..., description="Тип здания")
+    coordinates: Optional[Dict[str, float]] = Field(None, description="Координаты на карте")
+
+class BuildingBatchResponse(BaseModel):
+    buildings: List[Building]
+    missing: List[str]
+
+class BuildingView(str, Enum):
+    FULL = "full"
+    SUMMARY = "summary"  # Только поля, нужные для отрисовки карты
+
+class RoomLocation(BaseModel):
+    building_id: str = Field(..., description="ID здания")
+    building_name: str = Field(..., description="Название здания")
+    room: Room = Field(..., description="Аудитория")
+
+class NearestResult(BaseModel):
+    building: BuildingSummary = Field(..., description="Здание")
+    distance: float = Field(..., description="Расстояние от исходной точки в единицах карты")
+    rooms: List[Room] = Field(default_factory=list, description="Подходящие аудитории в здании")
+    amenity: Optional[str] = Field(None, description="Подходящая услуга в здании")
+
+class NearestResponse(BaseModel):
+    origin: Dict[str, float] = Field(..., description="Исходная точка на карте")
+    type: str = Field(..., description="Искомый тип аудитории или услуга")
+    results: List[NearestResult]
+
+class RoutePoint(BaseModel):
+    node: str = Field(..., description="ID узла графа дорожек")
+    x: float = Field(..., description="Координата X на карте")
+    y: float = Field(..., description="Координата Y на карте")
+    building_id: Optional[str] = Field(None, description="ID здания, если узел — вход в здание")
+
+class RouteResponse(BaseModel):
+    from_id: str = Field(..., description="ID начального здания")
+    to_id: str = Field(..., description="ID конечного здания")
+    accessible: bool = Field(False, description="Маршрут только по доступным дорожкам и входам")
+    distance: float = Field(..., description="Длина маршрута в единицах карты")
+    points: List[RoutePoint] = Field(..., description="Точки маршрута по порядку")
+
+class IndoorStepKind(str, Enum):
+    ENTER = "enter"
+    STAIRS = "stairs"
+    ELEVATOR = "elevator"
+    ARRIVE = "arrive"
+
+class IndoorRouteStep(BaseModel):
+    kind: IndoorStepKind = Field(..., description="Вид шага")
+    floor: int = Field(..., description="Этаж после шага")
+    text: str = Field(..., description="Подсказка для пользователя")
+
+class IndoorRouteResponse(BaseModel):
+    building_id: str = Field(..., description="ID здания")
+    room: Room = Field(..., description="Аудитория")
+    step_free: bool = Field(False, description="Маршрут без лестниц и недоступных помещений")
+    duration: float = Field(..., description="Ориентировочное время в секундах")
+    steps: List[IndoorRouteStep] = Field(..., description="Шаги маршрута от входа")
+
 class SearchResultType(str, Enum):
     BUILDING = "building"
     ROOM = "room"
@@ -54,9 +115,13 @@ class SearchResponse(BaseModel):
     results: List[SearchResult]
     total: int
     query: str
+    corrected_query: Optional[str] = None  # Исправленный запрос (опечатка, раскладка)
+    offset: int = 0
+    next_cursor: Optional[str] = None
 
 class BuildingResponse(BaseModel):
     buildings: List[Building]
     total: int
     page: int
-    limit: int 
\ No newline at end of file
+    limit: int
+    next_cursor: Optional[str] = None 
\ No newline at end of file
@@ -0,0 +1,95 @@
+"""
+Индекс ближайших мест: для каждого типа аудитории и услуги — сетка зданий,
+где они есть
+
+Индекс хранит только здания; подходящие аудитории найденных зданий
+подставляет в NearbyPlace.rooms тот, кто делает запрос.
+"""
+
+import logging
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from fuzzy import fold
+from models import Building, Room, RoomType
+from spatial_index import GridIndex
+
+logger = logging.getLogger(__name__)
+
+# Услуги, которые отвечают на запрос по типу аудитории, даже если таких
+# аудиторий в здании не заведено: «Буфет» в списке услуг — это тоже кафе
+ROOM_TYPE_AMENITIES: Dict[RoomType, Tuple[str, ...]] = {
+    RoomType.TOILET: ("туалет", "санузел", "wc"),
+    RoomType.CAFE: ("кафе", "буфет", "столов", "кофе"),
+    RoomType.LIBRARY: ("библиотек", "читальн"),
+    RoomType.AUDITORIUM: ("актовый зал", "конференц-зал"),
+    RoomType.LAB: ("лаборатор",),
+}
+
+ROOM_TYPE_KEYS = {room_type.value for room_type in RoomType}
+
+
+class NearbyPlace(NamedTuple):
+    """Здание, в котором есть искомое: подходящие аудитории и услуга"""
+    building: Building
+    rooms: Tuple[Room, ...]
+    amenity: Optional[str]
+
+
+def category_key(name: str) -> str:
+    """Ключ категории: значение RoomType или нормализованное название услуги"""
+    return fold(name).strip()
+
+
+class NearbyIndex:
+    """Сетки зданий по категориям: типам аудиторий и названиям услуг
+
+    Категория строится один раз на снимок, поэтому запрос ближайших — это
+    кольцевой поиск по сетке одной категории, без перебора всего кампуса.
+    """
+
+    def __init__(self, categories: Dict[str, GridIndex[NearbyPlace]]):
+        self.categories = categories
+
+    @classmethod
+    def build(cls, buildings: Iterable[Building], room_types: Iterable[Tuple[str, str]] = ()) -> "NearbyIndex":
+        """Построение индекса по зданиям с координатами и парам (building_id, тип аудитории)"""
+        points: Dict[str, List[Tuple[float, float, NearbyPlace]]] = {}
+        types_by_building: Dict[str, Set[str]] = {}
+        for building_id, room_type in room_types:
+            types_by_building.setdefault(building_id, set()).add(room_type)
+
+        for building in buildings:
+            coordinates = building.coordinates
+            if not coordinates or "x" not in coordinates or "y" not in coordinates:
+                continue
+            x, y = coordinates["x"], coordinates["y"]
+
+            room_types_here = types_by_building.get(building.id, set())
+
+            amenities = [(amenity, category_key(amenity)) for amenity in building.amenities or []]
+            for amenity, key in amenities:
+                if key in ROOM_TYPE_KEYS:
+                    continue
+                points.setdefault(key, []).append((x, y, NearbyPlace(building, (), amenity)))
+
+            for room_type in RoomType:
+                keywords = ROOM_TYPE_AMENITIES.get(room_type, ())
+                amenity = next(
+                    (name for name, key in amenities if any(keyword in key for keyword in keywords)),
+                    None,
+                )
+                if room_type.value in room_types_here or amenity:
+                    points.setdefault(room_type.value, []).append(
+                        (x, y, NearbyPlace(building, (), amenity))
+                    )
+
+        index = cls({key: GridIndex(category) for key, category in points.items()})
+        logger.info("Индекс ближайших мест построен: %d категорий", len(index.categories))
+        return index
+
+    def nearest(self, x: float, y: float, category: str, k: int = 5) -> List[Tuple[float, NearbyPlace]]:
+        """k ближайших зданий категории с расстояниями; неизвестная категория — пустой список"""
+        grid = self.categories.get(category_key(category))
+        if grid is None:
+            return []
+        return grid.nearest(x, y, k)
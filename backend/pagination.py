@@ -0,0 +1,41 @@
+"""
+Непрозрачные курсоры для постраничной выдачи
+"""
+
+import base64
+import json
+from typing import Any, Dict, Tuple, Type
+
+
+class InvalidCursorError(ValueError):
+    """Курсор поврежден или не подходит к запросу"""
+
+
+def encode_cursor(position: Dict[str, Any]) -> str:
+    """Кодирование позиции выдачи в строку для клиента"""
+    raw = json.dumps(position, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Разбор курсора; InvalidCursorError если курсор поврежден"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError) as e:
+        raise InvalidCursorError(f"Некорректный курсор: {cursor}") from e
+
+    if not isinstance(position, dict):
+        raise InvalidCursorError(f"Некорректный курсор: {cursor}")
+    return position
+
+
+def cursor_field(position: Dict[str, Any], key: str, types: Tuple[Type, ...], optional: bool = False) -> Any:
+    """Значение поля курсора нужного типа; InvalidCursorError если его нет или тип другой"""
+    value = position.get(key)
+    if value is None and optional:
+        return None
+    # bool — подкласс int, но в курсоре числом не считается
+    if not isinstance(value, types) or isinstance(value, bool):
+        raise InvalidCursorError(f"Некорректное поле курсора {key}: {value!r}")
+    return value
@@ -0,0 +1,163 @@
+"""
+Профилирование отдельных запросов по флагу
+
+Запрос профилируется, если передан заголовок X-Profile: 1 или параметр ?profile=1
+и клиент прошел проверку: его IP входит в PROFILE_ALLOWED_IPS или заголовок
+X-Profile-Token совпадает с PROFILE_TOKEN. Если ни то, ни другое не настроено,
+middleware не подключается и обычные запросы ничего не платят.
+
+Результат сохраняется в PROFILE_DIR в формате pstats, имя файла возвращается
+в заголовке X-Profile-File. Просмотр: python -m pstats <файл> или snakeviz.
+
+Профиль состоит из двух частей. Работа в пуле потоков базы данных (через
+wrap()) относится только к профилируемому запросу. Профайлер потока event loop
+включен на все время ожидания ответа, поэтому в эту часть попадает и работа
+других запросов, которые обрабатывались одновременно с ним. Для чистого
+профиля loop-части запрос стоит снимать без параллельной нагрузки.
+"""
+
+import asyncio
+import cProfile
+import hmac
+import ipaddress
+import itertools
+import logging
+import os
+import pstats
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, List, Optional, TypeVar
+
+from fastapi import Request
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_ALLOWED_IPS = [
+    ipaddress.ip_network(value.strip(), strict=False)
+    for value in os.getenv("PROFILE_ALLOWED_IPS", "").split(",")
+    if value.strip()
+]
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+PROFILING_ENABLED = bool(PROFILE_TOKEN or PROFILE_ALLOWED_IPS)
+
+PROFILE_HEADER = "x-profile"
+PROFILE_TOKEN_HEADER = "x-profile-token"
+
+SLUG_RE = re.compile(r"[^A-Za-z0-9]+")
+
+_sequence = itertools.count(1)
+
+
+class RequestProfile:
+    """Профили одного запроса: поток event loop и потоки пула базы данных"""
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self._worker_profilers: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def wrap(self, func: Callable[..., T]) -> Callable[..., T]:
+        """Функция, которая выполнится под отдельным профайлером в потоке пула"""
+        def profiled(*args, **kwargs):
+            profiler = cProfile.Profile()
+            try:
+                return profiler.runcall(func, *args, **kwargs)
+            finally:
+                with self._lock:
+                    self._worker_profilers.append(profiler)
+        return profiled
+
+    def dump(self, path: str) -> None:
+        """Объединение всех профилей и запись в файл pstats"""
+        stats = pstats.Stats(self.profiler)
+        with self._lock:
+            for profiler in self._worker_profilers:
+                stats.add(profiler)
+        stats.dump_stats(path)
+
+
+_current: ContextVar[Optional[RequestProfile]] = ContextVar("request_profile", default=None)
+
+# cProfile допускает один активный профайлер на поток, поэтому запросы профилируются по одному
+_event_loop_lock = asyncio.Lock()
+
+
+def current_profile() -> Optional[RequestProfile]:
+    """Профиль текущего запроса, если он профилируется"""
+    return _current.get()
+
+
+def wrap(func: Callable[..., T]) -> Callable[..., T]:
+    """Обертка для передачи в пул потоков; без профилирования возвращает func как есть"""
+    profile = _current.get()
+    return func if profile is None else profile.wrap(func)
+
+
+def is_allowed(request: Request) -> bool:
+    """Проверка токена или IP клиента"""
+    token = request.headers.get(PROFILE_TOKEN_HEADER)
+    if PROFILE_TOKEN and token and hmac.compare_digest(token, PROFILE_TOKEN):
+        return True
+
+    if PROFILE_ALLOWED_IPS and request.client:
+        try:
+            address = ipaddress.ip_address(request.client.host)
+        except ValueError:
+            return False
+        return any(address in network for network in PROFILE_ALLOWED_IPS)
+    return False
+
+
+def profile_requested(request: Request) -> bool:
+    """Наличие флага профилирования в заголовке или параметрах запроса"""
+    return request.headers.get(PROFILE_HEADER) == "1" or request.query_params.get("profile") == "1"
+
+
+def profile_path(request: Request) -> str:
+    """Имя файла профиля: время, метод и путь запроса"""
+    slug = SLUG_RE.sub("_", request.url.path).strip("_") or "root"
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_sequence)}-{request.method}-{slug}.pstats"
+    return os.path.join(PROFILE_DIR, name)
+
+
+async def profile_requests(request: Request, call_next):
+    """Middleware профилирования; подключается только при PROFILING_ENABLED"""
+    if not profile_requested(request):
+        return await call_next(request)
+
+    if not is_allowed(request):
+        logger.warning("Запрос профилирования отклонен: %s", request.client.host if request.client else None)
+        return await call_next(request)
+
+    if _event_loop_lock.locked():
+        response = await call_next(request)
+        response.headers["X-Profile"] = "busy"
+        return response
+
+    async with _event_loop_lock:
+        profile = RequestProfile()
+        token = _current.set(profile)
+        started = time.perf_counter()
+        # Профайлер потока: пока запрос ждет, сюда попадают и соседние запросы
+        profile.profiler.enable()
+        try:
+            response = await call_next(request)
+        finally:
+            profile.profiler.disable()
+            _current.reset(token)
+        duration_ms = (time.perf_counter() - started) * 1000
+
+    path = profile_path(request)
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    await asyncio.get_running_loop().run_in_executor(None, profile.dump, path)
+    logger.info("Профиль запроса %s %s сохранен в %s (%.1fms)", request.method, request.url.path, path, duration_ms)
+
+    response.headers["X-Profile-File"] = os.path.basename(path)
+    response.headers["X-Profile-Duration-Ms"] = f"{duration_ms:.1f}"
+    return response
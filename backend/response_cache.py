@@ -0,0 +1,130 @@
+"""
+Кэш готовых JSON ответов с поддержкой ETag и 304 Not Modified
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, NamedTuple, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+import metrics
+import profiling
+from database import db
+
+logger = logging.getLogger(__name__)
+
+API_CACHE_MAX_ENTRIES = int(os.getenv("API_CACHE_MAX_ENTRIES", "1024"))
+API_CACHE_MAX_AGE = int(os.getenv("API_CACHE_MAX_AGE", "60"))
+
+
+class CachedResponse(NamedTuple):
+    """Закодированное тело ответа для одной версии данных"""
+    version: int
+    body: bytes
+    etag: str
+
+
+def encode_json(payload: Any) -> bytes:
+    """Кодирование так же, как это делает JSONResponse"""
+    return json.dumps(
+        jsonable_encoder(payload),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Проверка заголовка If-None-Match"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    """LRU кэш закодированных ответов, сбрасывается при смене версии данных"""
+
+    def __init__(self, max_entries: int = API_CACHE_MAX_ENTRIES, max_age: int = API_CACHE_MAX_AGE):
+        self.max_entries = max_entries
+        self.cache_control = f"public, max-age={max_age}, must-revalidate"
+        self._entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def _get(self, key: Hashable, version: int) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.version != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _put(self, key: Hashable, entry: CachedResponse) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _response(self, request: Request, entry: CachedResponse) -> Response:
+        headers = {"ETag": entry.etag, "Cache-Control": self.cache_control}
+        if etag_matches(request.headers.get("if-none-match"), entry.etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+    async def respond(self,
+                      request: Request,
+                      key: Tuple[Hashable, ...],
+                      build: Callable[[], Awaitable[Any]]) -> Response:
+        """Ответ из кэша или построенный через build и сохраненный в кэш"""
+        version = db.data_version
+        # Профилируемый запрос всегда строит ответ заново
+        entry = self._get(key, version) if profiling.current_profile() is None else None
+
+        if entry is None:
+            self.misses += 1
+            metrics.cache_requests.inc(cache="response", result="miss")
+            payload = await build()
+            body = encode_json(payload)
+            etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+            entry = CachedResponse(version, body, etag)
+            self._put(key, entry)
+        else:
+            self.hits += 1
+            metrics.cache_requests.inc(cache="response", result="hit")
+
+        return self._response(request, entry)
+
+    def clear(self) -> None:
+        """Очистка кэша"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Статистика попаданий в кэш"""
+        with self._lock:
+            size = len(self._entries)
+        return {
+            "entries": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+        }
+
+
+# Глобальный кэш ответов API
+response_cache = ResponseCache()
@@ -0,0 +1,442 @@
+"""
+Маршруты между зданиями по графу пешеходных дорожек
+
+Граф читается из файла WALKWAYS_PATH (JSON): узлы — входы в здания и
+перекрестки дорожек, ребра — участки дорожек.
+
+    {
+      "nodes": [
+        {"id": "1-main", "building_id": "1", "x": 100, "y": 150, "accessible": true},
+        {"id": "j1", "x": 110, "y": 120}
+      ],
+      "edges": [
+        {"from": "1-main", "to": "j1", "length": 32.5, "accessible": true, "oneway": false}
+      ]
+    }
+
+Узел с building_id — вход в здание, у здания может быть несколько входов.
+Длина ребра по умолчанию — расстояние между узлами. В режиме доступности
+маршрут начинается и заканчивается на доступных входах, а по пути проверяется
+только флаг accessible ребер: промежуточный узел — лишь точка на дорожке. Если файла нет, граф
+строится по координатам зданий: каждое здание соединяется с ближайшими соседями.
+
+Поиск — A* с оценкой по прямой и по ориентирам (ALT). Найденные маршруты
+хранятся в LRU кэше; для небольших кампусов деревья кратчайших путей от всех
+зданий считаются заранее, и запрос маршрута сводится к проходу по дереву.
+"""
+
+import heapq
+import json
+import logging
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import metrics
+from models import Building
+from spatial_index import GridIndex
+
+logger = logging.getLogger(__name__)
+
+WALKWAYS_PATH = os.getenv("WALKWAYS_PATH", "walkways.json")
+ROUTE_CACHE_MAX_ENTRIES = int(os.getenv("ROUTE_CACHE_MAX_ENTRIES", "4096"))
+# Деревья кратчайших путей от каждого здания считаются заранее, если зданий не больше этого числа
+ROUTE_PRECOMPUTE_MAX_BUILDINGS = int(os.getenv("ROUTE_PRECOMPUTE_MAX_BUILDINGS", "300"))
+
+# Ориентиры для оценки расстояний в A* на больших графах; 0 отключает их
+ROUTE_LANDMARKS = int(os.getenv("ROUTE_LANDMARKS", "8"))
+
+# Число соседей здания в графе, построенном по координатам
+FALLBACK_NEIGHBOURS = 4
+
+
+class WalkwayFormatError(ValueError):
+    """Ошибка структуры файла графа дорожек"""
+
+
+class Node(NamedTuple):
+    """Узел графа: вход в здание или перекресток дорожек"""
+    id: str
+    x: float
+    y: float
+    building_id: Optional[str]
+    accessible: bool
+
+
+class Route(NamedTuple):
+    """Найденный маршрут: длина и узлы от начала до конца"""
+    distance: float
+    nodes: Tuple[Node, ...]
+
+
+class WalkwayGraph:
+    """Граф дорожек в списках смежности; узлы нумеруются по порядку добавления"""
+
+    def __init__(self):
+        self.nodes: List[Node] = []
+        self.index: Dict[str, int] = {}
+        # Соседи узла: (номер соседа, длина, доступно для маломобильных)
+        self.adjacency: List[List[Tuple[int, float, bool]]] = []
+        self.entrances: Dict[str, List[int]] = {}
+        # Множитель эвристики A*: не больше отношения длины ребра к расстоянию по прямой
+        self.heuristic_scale = 1.0
+        # Есть односторонние ребра: расстояния несимметричны
+        self.directed = False
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def add_node(self, node: Node) -> int:
+        if node.id in self.index:
+            raise WalkwayFormatError(f"Узел {node.id} задан дважды")
+        position = len(self.nodes)
+        self.nodes.append(node)
+        self.index[node.id] = position
+        self.adjacency.append([])
+        if node.building_id is not None:
+            self.entrances.setdefault(node.building_id, []).append(position)
+        return position
+
+    def add_edge(self, source: int, target: int, length: Optional[float] = None,
+                 accessible: bool = True, oneway: bool = False) -> None:
+        straight = self.straight_distance(source, target)
+        if length is None:
+            length = straight
+        if length < 0:
+            raise WalkwayFormatError(f"Отрицательная длина ребра {self.nodes[source].id} - {self.nodes[target].id}")
+        if straight > 0:
+            self.heuristic_scale = min(self.heuristic_scale, length / straight)
+        self.adjacency[source].append((target, length, accessible))
+        if oneway:
+            self.directed = True
+        else:
+            self.adjacency[target].append((source, length, accessible))
+
+    def straight_distance(self, source: int, target: int) -> float:
+        a, b = self.nodes[source], self.nodes[target]
+        return math.hypot(a.x - b.x, a.y - b.y)
+
+    def entrances_of(self, building_id: str, accessible: bool = False) -> List[int]:
+        """Входы здания; в режиме accessible — только доступные"""
+        entrances = self.entrances.get(building_id, [])
+        if accessible:
+            return [position for position in entrances if self.nodes[position].accessible]
+        return entrances
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "WalkwayGraph":
+        """Граф из разобранного JSON файла дорожек"""
+        graph = cls()
+        try:
+            for item in data["nodes"]:
+                building_id = item.get("building_id")
+                graph.add_node(Node(
+                    str(item["id"]),
+                    float(item["x"]),
+                    float(item["y"]),
+                    str(building_id) if building_id is not None else None,
+                    bool(item.get("accessible", True)),
+                ))
+            for item in data["edges"]:
+                source, target = str(item["from"]), str(item["to"])
+                if source not in graph.index or target not in graph.index:
+                    raise WalkwayFormatError(f"Ребро {source} - {target} ссылается на неизвестный узел")
+                length = item.get("length")
+                graph.add_edge(
+                    graph.index[source],
+                    graph.index[target],
+                    float(length) if length is not None else None,
+                    bool(item.get("accessible", True)),
+                    bool(item.get("oneway", False)),
+                )
+        except WalkwayFormatError:
+            raise
+        except (KeyError, TypeError, ValueError) as e:
+            raise WalkwayFormatError(f"Некорректный файл дорожек: {e!r}") from e
+        return graph
+
+    @classmethod
+    def load(cls, path: str) -> "WalkwayGraph":
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    @classmethod
+    def from_buildings(cls, buildings: Iterable[Building], neighbours: int = FALLBACK_NEIGHBOURS) -> "WalkwayGraph":
+        """Граф по координатам: здание соединяется с neighbours ближайшими зданиями"""
+        graph = cls()
+        for building in buildings:
+            coordinates = building.coordinates
+            if not coordinates or "x" not in coordinates or "y" not in coordinates:
+                continue
+            graph.add_node(Node(building.id, coordinates["x"], coordinates["y"], building.id, building.accessible))
+
+        grid = GridIndex((node.x, node.y, position) for position, node in enumerate(graph.nodes))
+        edges = set()
+        for position, node in enumerate(graph.nodes):
+            for _, neighbour in grid.nearest(node.x, node.y, neighbours + 1):
+                if neighbour != position:
+                    edges.add((min(position, neighbour), max(position, neighbour)))
+        for source, target in sorted(edges):
+            graph.add_edge(source, target)
+        graph.connect_components()
+        return graph
+
+    def components(self) -> List[List[int]]:
+        """Компоненты связности без учета направления и доступности ребер"""
+        component = [-1] * len(self.nodes)
+        result: List[List[int]] = []
+        for start in range(len(self.nodes)):
+            if component[start] != -1:
+                continue
+            component[start] = len(result)
+            members = [start]
+            for position in members:
+                for neighbour, _, _ in self.adjacency[position]:
+                    if component[neighbour] == -1:
+                        component[neighbour] = len(result)
+                        members.append(neighbour)
+            result.append(members)
+        return result
+
+    def connect_components(self) -> None:
+        """Соединение отдельных групп зданий ребрами между ближайшими зданиями групп
+
+        Граф ближайших соседей распадается на части, если здания стоят кучками
+        (несколько площадок университета). На каждом шаге каждая группа
+        соединяется с группой, ближайшей к ее центру, так что число групп
+        убывает как минимум вдвое.
+        """
+        while True:
+            components = self.components()
+            if len(components) < 2:
+                return
+            centers = [
+                (sum(self.nodes[p].x for p in members) / len(members),
+                 sum(self.nodes[p].y for p in members) / len(members))
+                for members in components
+            ]
+            grid = GridIndex((x, y, number) for number, (x, y) in enumerate(centers))
+            linked = set()
+            for number, members in enumerate(components):
+                x, y = centers[number]
+                other = next(found for _, found in grid.nearest(x, y, 2) if found != number)
+                if (min(number, other), max(number, other)) in linked:
+                    continue
+                linked.add((min(number, other), max(number, other)))
+                center_x, center_y = centers[other]
+                source = min(members, key=lambda p: math.hypot(self.nodes[p].x - center_x, self.nodes[p].y - center_y))
+                target = min(components[other], key=lambda p: self.straight_distance(source, p))
+                self.add_edge(source, target)
+
+
+class RoutePlanner:
+    """Поиск маршрутов между зданиями с кэшем и необязательным предрасчетом"""
+
+    def __init__(self, graph: WalkwayGraph, cache_size: int = ROUTE_CACHE_MAX_ENTRIES):
+        self.graph = graph
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, str, bool], Optional[Route]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # Деревья кратчайших путей от входов каждого здания: (расстояния, предшественники)
+        self._trees: Dict[str, Tuple[List[float], List[int]]] = {}
+        # Расстояния от каждого узла до ориентиров, по строке на узел
+        self._landmark_rows: List[Tuple[float, ...]] = []
+
+    @classmethod
+    def build(cls, buildings: List[Building], path: str = WALKWAYS_PATH) -> "RoutePlanner":
+        """Граф из файла дорожек, а если его нет — по координатам зданий"""
+        if os.path.exists(path):
+            graph = WalkwayGraph.load(path)
+            source = path
+        else:
+            graph = WalkwayGraph.from_buildings(buildings)
+            source = "координаты зданий"
+        edges = sum(len(neighbours) for neighbours in graph.adjacency)
+        logger.info(
+            "Граф дорожек построен (%s): %d узлов, %d дуг, %d зданий",
+            source, len(graph), edges, len(graph.entrances),
+        )
+        planner = cls(graph)
+        if len(graph.entrances) <= ROUTE_PRECOMPUTE_MAX_BUILDINGS:
+            planner.precompute()
+        else:
+            planner.prepare_landmarks()
+        return planner
+
+    def precompute(self) -> None:
+        """Деревья кратчайших путей от всех зданий; для обычного режима без ограничений доступности"""
+        trees = {
+            building_id: self._dijkstra(entrances, accessible=False)
+            for building_id, entrances in self.graph.entrances.items()
+        }
+        self._trees = trees
+        logger.info("Маршруты посчитаны заранее от %d зданий", len(trees))
+
+    def prepare_landmarks(self, count: int = ROUTE_LANDMARKS) -> None:
+        """Выбор ориентиров и расстояния до них от всех узлов
+
+        Ориентиры выбираются по очереди как самые дальние от уже выбранных,
+        тогда они оказываются на окраинах кампуса и оценка точнее. Для графов
+        с односторонними ребрами оценка по ориентирам неприменима.
+        """
+        if self.graph.directed or count <= 0 or not self.graph.nodes:
+            return
+        columns: List[List[float]] = []
+        nearest = [math.inf] * len(self.graph.nodes)
+        landmark = 0
+        for _ in range(min(count, len(self.graph.nodes))):
+            distances, _ = self._dijkstra([landmark], accessible=False)
+            columns.append(distances)
+            nearest = [min(a, b) for a, b in zip(nearest, distances)]
+            # Самый дальний из достижимых; недостижимые части графа получают свой ориентир
+            unreached = next((position for position, value in enumerate(nearest) if math.isinf(value)), None)
+            landmark = unreached if unreached is not None else max(range(len(nearest)), key=nearest.__getitem__)
+            if nearest[landmark] == 0:
+                break
+        self._landmark_rows = list(zip(*columns))
+        logger.info("Ориентиры для поиска маршрутов: %d", len(columns))
+
+    def route(self, from_id: str, to_id: str, accessible: bool = False) -> Optional[Route]:
+        """Кратчайший маршрут между зданиями или None, если пути нет"""
+        key = (from_id, to_id, accessible)
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                metrics.cache_requests.inc(cache="routes", result="hit")
+                return self._cache[key]
+        metrics.cache_requests.inc(cache="routes", result="miss")
+
+        sources = self.graph.entrances_of(from_id, accessible)
+        targets = self.graph.entrances_of(to_id, accessible)
+        found: Optional[Route] = None
+        if sources and targets:
+            if not accessible and from_id in self._trees:
+                path = self._path_from_tree(self._trees[from_id], targets)
+            else:
+                path = self._astar(sources, targets, accessible)
+            if path is not None:
+                distance, positions = path
+                found = Route(distance, tuple(self.graph.nodes[position] for position in positions))
+
+        with self._cache_lock:
+            self._cache[key] = found
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return found
+
+    def _heuristic(self, targets: List[int]) -> Callable[[int], float]:
+        """Нижняя оценка расстояния до ближайшего из входов цели
+
+        Берется максимум из расстояния по прямой и оценки по ориентирам:
+        |d(L, t) - d(L, v)| не больше d(v, t) по неравенству треугольника.
+        """
+        nodes = self.graph.nodes
+        scale = self.graph.heuristic_scale
+        points = [(nodes[target].x, nodes[target].y) for target in targets]
+        rows = self._landmark_rows
+        if not rows:
+            return lambda position: scale * min(
+                math.hypot(nodes[position].x - x, nodes[position].y - y) for x, y in points
+            )
+
+        # Ориентиры, из которых цель недостижима, ничего не говорят о расстоянии до нее
+        target_rows = []
+        for target in targets:
+            usable = [number for number, value in enumerate(rows[target]) if not math.isinf(value)]
+            target_rows.append((usable, [rows[target][number] for number in usable]))
+
+        def heuristic(position: int) -> float:
+            node = nodes[position]
+            row = rows[position]
+            best = math.inf
+            for (x, y), (usable, target_row) in zip(points, target_rows):
+                bound = scale * math.hypot(node.x - x, node.y - y)
+                for number, value in zip(usable, target_row):
+                    difference = abs(value - row[number])
+                    if difference > bound:
+                        bound = difference
+                if bound < best:
+                    best = bound
+            return best
+
+        return heuristic
+
+    def _astar(self, sources: List[int], targets: List[int], accessible: bool) -> Optional[Tuple[float, List[int]]]:
+        """A* от любого из входов до ближайшего из входов цели"""
+        nodes = self.graph.nodes
+        adjacency = self.graph.adjacency
+        heuristic = self._heuristic(targets)
+        target_set = set(targets)
+
+        distances = [math.inf] * len(nodes)
+        previous = [-1] * len(nodes)
+        closed = bytearray(len(nodes))
+        queue: List[Tuple[float, float, int]] = []
+        for source in sources:
+            distances[source] = 0.0
+            heapq.heappush(queue, (heuristic(source), 0.0, source))
+
+        while queue:
+            _, distance, position = heapq.heappop(queue)
+            if closed[position]:
+                continue
+            if position in target_set:
+                return distance, self._path(previous, position)
+            closed[position] = 1
+            for neighbour, length, edge_accessible in adjacency[position]:
+                if closed[neighbour]:
+                    continue
+                if accessible and not edge_accessible:
+                    continue
+                candidate = distance + length
+                if candidate < distances[neighbour]:
+                    distances[neighbour] = candidate
+                    previous[neighbour] = position
+                    heapq.heappush(queue, (candidate + heuristic(neighbour), candidate, neighbour))
+        return None
+
+    def _dijkstra(self, sources: List[int], accessible: bool) -> Tuple[List[float], List[int]]:
+        """Расстояния и предшественники от входов здания до всех узлов"""
+        nodes = self.graph.nodes
+        adjacency = self.graph.adjacency
+        distances = [math.inf] * len(nodes)
+        previous = [-1] * len(nodes)
+        queue: List[Tuple[float, int]] = []
+        for source in sources:
+            distances[source] = 0.0
+            queue.append((0.0, source))
+        heapq.heapify(queue)
+
+        while queue:
+            distance, position = heapq.heappop(queue)
+            if distance > distances[position]:
+                continue
+            for neighbour, length, edge_accessible in adjacency[position]:
+                if accessible and not edge_accessible:
+                    continue
+                candidate = distance + length
+                if candidate < distances[neighbour]:
+                    distances[neighbour] = candidate
+                    previous[neighbour] = position
+                    heapq.heappush(queue, (candidate, neighbour))
+        return distances, previous
+
+    def _path_from_tree(self, tree: Tuple[List[float], List[int]], targets: List[int]) -> Optional[Tuple[float, List[int]]]:
+        """Путь до ближайшего входа цели по заранее посчитанному дереву"""
+        distances, previous = tree
+        target = min(targets, key=lambda position: distances[position])
+        if math.isinf(distances[target]):
+            return None
+        return distances[target], self._path(previous, target)
+
+    @staticmethod
+    def _path(previous: Any, position: int) -> List[int]:
+        """Восстановление пути по предшественникам; у начального узла предшественник -1"""
+        path = [position]
+        while previous[path[-1]] != -1:
+            path.append(previous[path[-1]])
+        path.reverse()
+        return path
@@ -0,0 +1,211 @@
+"""
+Инвертированный индекс для расширенного поиска по зданиям, аудиториям и услугам
+"""
+
+import heapq
+import logging
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from fuzzy import FuzzyIndex, fold, swap_layout
+from indoor_routing import normalize_room_number
+from models import Building, SearchResultType
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"\w+")
+
+# Длины n-грамм в постинг-листах: биграммы покрывают минимальный запрос из 2 символов
+NGRAM_SIZES = (2, 3)
+
+
+class SearchEntry(NamedTuple):
+    """Индексируемое поле: одно потенциальное совпадение поиска"""
+    kind: SearchResultType
+    building: Building
+    room_id: Optional[int]  # ID строки таблицы rooms для записей аудиторий
+    amenity: Optional[str]
+    match_text: str
+    priority: int
+    text: str  # нормализованный текст поля
+
+
+def normalize(text: str) -> str:
+    """Нормализация текста для индекса и запроса (регистр, ё/е)"""
+    return fold(text).strip()
+
+
+def ngrams(text: str, size: int) -> Set[str]:
+    """Множество n-грамм заданной длины"""
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def tokenize(text: str) -> List[str]:
+    """Разбиение нормализованного текста на слова"""
+    return TOKEN_RE.findall(text)
+
+
+class SearchIndex:
+    """Постинг-листы по словам и n-граммам над всеми полями поиска"""
+
+    def __init__(self):
+        self.entries: List[SearchEntry] = []
+        self.tokens: Dict[str, List[int]] = {}
+        self.grams: Dict[int, Dict[str, List[int]]] = {size: {} for size in NGRAM_SIZES}
+        self.fuzzy = FuzzyIndex({})
+
+    @classmethod
+    def build(cls, buildings: Iterable[Building], rooms: Iterable[Tuple[int, str, str]] = ()) -> "SearchIndex":
+        """Построение индекса по списку зданий и аудиториям (id, building_id, number)"""
+        index = cls()
+        by_id: Dict[str, Building] = {}
+        for building in buildings:
+            by_id[building.id] = building
+            index._add(SearchResultType.BUILDING, building, building.name, priority=1)
+
+            if building.description:
+                index._add(SearchResultType.BUILDING, building, building.description, priority=2)
+
+            for department in building.departments or []:
+                index._add(SearchResultType.BUILDING, building, department, priority=2)
+
+            for amenity in building.amenities or []:
+                index._add(SearchResultType.AMENITY, building, amenity, priority=3, amenity=amenity)
+
+        # Номера аудиторий повторяются от здания к зданию: текст и постинг-листы
+        # считаются один раз на номер
+        room_keys: Dict[str, Tuple[str, str, List[List[int]]]] = {}
+        for room_id, building_id, number in rooms:
+            building = by_id.get(building_id)
+            if building is None:
+                continue
+            keys = room_keys.get(number)
+            if keys is None:
+                normalized = normalize(number)
+                keys = room_keys[number] = (f"Аудитория {number}", normalized, index._postings(normalized))
+            match_text, normalized, postings = keys
+            entry_id = len(index.entries)
+            index.entries.append(
+                SearchEntry(SearchResultType.ROOM, building, room_id, None, match_text, 1, normalized)
+            )
+            for posting in postings:
+                posting.append(entry_id)
+
+        index.fuzzy = FuzzyIndex.build(
+            (token, len(postings)) for token, postings in index.tokens.items()
+        )
+
+        logger.info(
+            "Поисковый индекс построен: %d записей, %d слов, %d триграмм",
+            len(index.entries), len(index.tokens), len(index.grams[NGRAM_SIZES[-1]]),
+        )
+        return index
+
+    def _add(self,
+             kind: SearchResultType,
+             building: Building,
+             match_text: str,
+             priority: int,
+             room_id: Optional[int] = None,
+             amenity: Optional[str] = None,
+             text: Optional[str] = None) -> None:
+        """Добавление записи во все постинг-листы"""
+        normalized = normalize(text if text is not None else match_text)
+        entry_id = len(self.entries)
+        self.entries.append(SearchEntry(kind, building, room_id, amenity, match_text, priority, normalized))
+
+        for posting in self._postings(normalized):
+            posting.append(entry_id)
+
+    def _postings(self, normalized: str) -> List[List[int]]:
+        """Постинг-листы слов и n-грамм текста, куда добавляется запись"""
+        postings = [self.tokens.setdefault(token, []) for token in set(tokenize(normalized))]
+        for size, grams in self.grams.items():
+            postings.extend(grams.setdefault(gram, []) for gram in ngrams(normalized, size))
+        return postings
+
+    def lookup_token(self, token: str) -> List[SearchEntry]:
+        """Записи, содержащие слово целиком"""
+        return [self.entries[entry_id] for entry_id in self.tokens.get(normalize(token), [])]
+
+    def search(self, term: str) -> List[SearchEntry]:
+        """Записи, содержащие подстроку term, в порядке индексации
+
+        Аудитории индексируются по номеру, поэтому для запроса вида
+        «аудитория 101» они ищутся по номеру без слова «аудитория».
+        """
+        term = normalize(term)
+        matches = self._matching_ids(term)
+        number = normalize_room_number(term)
+        if number and number != term:
+            matches.update(
+                entry_id for entry_id in self._matching_ids(number)
+                if self.entries[entry_id].kind == SearchResultType.ROOM
+            )
+        return [self.entries[entry_id] for entry_id in sorted(matches)]
+
+    def _matching_ids(self, term: str) -> Set[int]:
+        """Номера записей, текст которых содержит подстроку term"""
+        if len(term) < NGRAM_SIZES[0]:
+            return set()
+
+        size = max(s for s in NGRAM_SIZES if s <= len(term))
+        postings = self.grams[size]
+
+        lists = []
+        for gram in ngrams(term, size):
+            posting = postings.get(gram)
+            if not posting:
+                return set()
+            lists.append(posting)
+
+        # Пересечение начиная с самого короткого списка
+        lists.sort(key=len)
+        candidates = set(lists[0])
+        for posting in lists[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return set()
+
+        # n-граммы дают кандидатов, подстрока проверяется явно
+        return {entry_id for entry_id in candidates if term in self.entries[entry_id].text}
+
+    def correct(self, term: str) -> Optional[str]:
+        """Исправленный запрос, по которому есть совпадения, или None
+
+        Сначала пробуется перевод раскладки, затем замена каждого незнакомого
+        слова ближайшим словом словаря (для исходного и переведенного запроса).
+        """
+        term = normalize(term)
+        variants = [term]
+        swapped = swap_layout(term)
+        if swapped != term:
+            if self.search(swapped):
+                return swapped
+            variants.append(swapped)
+
+        for variant in variants:
+            corrected = TOKEN_RE.sub(lambda match: self.fuzzy.suggest(match.group()) or match.group(), variant)
+            if corrected != variant and self.search(corrected):
+                return corrected
+        return None
+
+    def top(self, term: str, offset: int = 0, limit: int = 10) -> Tuple[List[SearchEntry], int, Optional[str]]:
+        """Страница лучших совпадений по (priority, match_text), общее число совпадений
+        и исправленный запрос, если точных совпадений не было
+
+        Ранжирование идет по легким кортежам в ограниченной куче размера offset + limit,
+        полная сортировка всех совпадений не выполняется.
+        """
+        matches = self.search(term)
+        corrected = None
+        if not matches:
+            corrected = self.correct(term)
+            if corrected:
+                matches = self.search(corrected)
+
+        ranked = heapq.nsmallest(
+            offset + limit,
+            ((entry.priority, entry.match_text, position) for position, entry in enumerate(matches))
+        )
+        return [matches[position] for _, _, position in ranked[offset:]], len(matches), corrected
@@ -0,0 +1,157 @@
+"""
+Пространственный индекс точек на карте: равномерная сетка ячеек
+"""
+
+import heapq
+import math
+from typing import Dict, Generic, Iterable, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Среднее количество точек в ячейке при автоматическом выборе размера ячейки
+POINTS_PER_CELL = 4
+
+Cell = Tuple[int, int]
+
+
+class GridIndex(Generic[T]):
+    """Точки с привязанными значениями, разложенные по квадратным ячейкам
+
+    Запрос прямоугольника просматривает только пересекающиеся с ним ячейки,
+    поэтому время ответа зависит от площади запроса и числа найденных точек,
+    а не от общего количества точек.
+    """
+
+    def __init__(self, points: Iterable[Tuple[float, float, T]], cell_size: Optional[float] = None):
+        self.xs: List[float] = []
+        self.ys: List[float] = []
+        self.values: List[T] = []
+        for x, y, value in points:
+            self.xs.append(float(x))
+            self.ys.append(float(y))
+            self.values.append(value)
+
+        if cell_size is None:
+            cell_size = self._auto_cell_size()
+        self.cell_size = cell_size
+
+        self.cells: Dict[Cell, List[int]] = {}
+        for position in range(len(self.values)):
+            self.cells.setdefault(self._cell(self.xs[position], self.ys[position]), []).append(position)
+
+        if self.cells:
+            self.min_cell = (min(cx for cx, _ in self.cells), min(cy for _, cy in self.cells))
+            self.max_cell = (max(cx for cx, _ in self.cells), max(cy for _, cy in self.cells))
+        else:
+            self.min_cell = self.max_cell = (0, 0)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def _auto_cell_size(self) -> float:
+        """Размер ячейки, при котором на ячейку приходится около POINTS_PER_CELL точек"""
+        if len(self.values) < 2:
+            return 1.0
+        width = max(self.xs) - min(self.xs)
+        height = max(self.ys) - min(self.ys)
+        area = max(width, 1.0) * max(height, 1.0)
+        return max(1.0, math.sqrt(area * POINTS_PER_CELL / len(self.values)))
+
+    def _cell(self, x: float, y: float) -> Cell:
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def within(self, x1: float, y1: float, x2: float, y2: float) -> List[T]:
+        """Значения точек внутри прямоугольника (границы включаются) в порядке добавления"""
+        x1, x2 = min(x1, x2), max(x1, x2)
+        y1, y2 = min(y1, y2), max(y1, y2)
+
+        min_cx, min_cy = self._cell(x1, y1)
+        max_cx, max_cy = self._cell(x2, y2)
+        min_cx, min_cy = max(min_cx, self.min_cell[0]), max(min_cy, self.min_cell[1])
+        max_cx, max_cy = min(max_cx, self.max_cell[0]), min(max_cy, self.max_cell[1])
+        if min_cx > max_cx or min_cy > max_cy:
+            return []
+
+        # Прямоугольник крупнее карты: дешевле проверить точки, чем пустые ячейки
+        if (max_cx - min_cx + 1) * (max_cy - min_cy + 1) > len(self.cells):
+            candidates: Iterable[int] = (
+                position for positions in self.cells.values() for position in positions
+            )
+        else:
+            candidates = (
+                position
+                for cx in range(min_cx, max_cx + 1)
+                for cy in range(min_cy, max_cy + 1)
+                for position in self.cells.get((cx, cy), ())
+            )
+
+        found = sorted(
+            position for position in candidates
+            if x1 <= self.xs[position] <= x2 and y1 <= self.ys[position] <= y2
+        )
+        return [self.values[position] for position in found]
+
+    def nearest(self, x: float, y: float, k: int = 1) -> List[Tuple[float, T]]:
+        """k ближайших точек с расстояниями, по возрастанию расстояния
+
+        Ячейки просматриваются кольцами вокруг точки запроса, начиная с первого
+        кольца, задевающего сетку; поиск останавливается, когда следующее кольцо
+        заведомо дальше k-й найденной точки. Кольца обрезаются по границам сетки,
+        а если в обрезанном кольце ячеек больше, чем непустых ячеек всего,
+        оставшиеся точки проверяются перебором непустых ячеек.
+        """
+        if k <= 0 or not self.values:
+            return []
+
+        center_x, center_y = self._cell(x, y)
+        (min_cx, min_cy), (max_cx, max_cy) = self.min_cell, self.max_cell
+        # Расстояние Чебышева от ячейки запроса до прямоугольника сетки и до дальнего края
+        first_ring = max(min_cx - center_x, center_x - max_cx, min_cy - center_y, center_y - max_cy, 0)
+        max_ring = max(
+            abs(center_x - min_cx), abs(center_x - max_cx),
+            abs(center_y - min_cy), abs(center_y - max_cy),
+        )
+
+        # Куча из (-расстояние, позиция) размера не больше k
+        best: List[Tuple[float, int]] = []
+
+        def visit(cell: Cell) -> None:
+            for position in self.cells.get(cell, ()):
+                distance = math.hypot(self.xs[position] - x, self.ys[position] - y)
+                if len(best) < k:
+                    heapq.heappush(best, (-distance, -position))
+                elif (-distance, -position) > best[0]:
+                    heapq.heapreplace(best, (-distance, -position))
+
+        for ring in range(first_ring, max_ring + 1):
+            if len(best) == k and (ring - 1) * self.cell_size > -best[0][0]:
+                break
+            width = min(center_x + ring, max_cx) - max(center_x - ring, min_cx) + 1
+            height = min(center_y + ring, max_cy) - max(center_y - ring, min_cy) + 1
+            if 2 * (width + height) > len(self.cells):
+                # Дальние кольца длиннее списка непустых ячеек: проверяем их все разом
+                for cell in self.cells:
+                    if max(abs(cell[0] - center_x), abs(cell[1] - center_y)) >= ring:
+                        visit(cell)
+                break
+            for cell in self._ring(center_x, center_y, ring):
+                visit(cell)
+
+        return [(-distance, self.values[-position]) for distance, position in sorted(best, reverse=True)]
+
+    def _ring(self, center_x: int, center_y: int, ring: int) -> Iterable[Cell]:
+        """Ячейки на границе квадрата со стороной 2 * ring + 1 в пределах сетки"""
+        (min_cx, min_cy), (max_cx, max_cy) = self.min_cell, self.max_cell
+        if ring == 0:
+            yield center_x, center_y
+            return
+        left, right = max(center_x - ring, min_cx), min(center_x + ring, max_cx)
+        for cy in (center_y - ring, center_y + ring):
+            if min_cy <= cy <= max_cy:
+                for cx in range(left, right + 1):
+                    yield cx, cy
+        bottom, top = max(center_y - ring + 1, min_cy), min(center_y + ring - 1, max_cy)
+        for cx in (center_x - ring, center_x + ring):
+            if min_cx <= cx <= max_cx:
+                for cy in range(bottom, top + 1):
+                    yield cx, cy
@@ -0,0 +1,280 @@
+"""
+Генератор синтетических данных кампусов для нагрузочных проверок
+
+Здания и аудитории имеют ту же структуру, что и get_pgu_real_data(), названия
+и описания составляются из реальных русских слов, поэтому поиск и
+автодополнение ведут себя так же, как на настоящих данных. Результат
+полностью определяется параметрами и seed.
+
+Примеры запуска из каталога backend:
+
+    python synthetic_data.py --buildings 10000 --database /tmp/campus.db
+    python synthetic_data.py --buildings 100000 --output campus.ndjson
+"""
+
+import argparse
+import json
+import logging
+import math
+import random
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Готовые размеры наборов данных
+PRESETS = {"1k": 1_000, "10k": 10_000, "100k": 100_000}
+
+# Количество зданий в одном кампусе и расстояние между центрами кампусов на карте
+CAMPUS_SIZE = 60
+CAMPUS_SPACING = 1000
+CAMPUS_RADIUS = 400
+
+CITIES = [
+    "Пенза", "Самара", "Казань", "Саратов", "Ульяновск", "Нижний Новгород", "Воронеж",
+    "Екатеринбург", "Пермь", "Уфа", "Томск", "Новосибирск", "Омск", "Ярославль",
+]
+
+STREETS = [
+    "Красная", "Лермонтова", "Пушкинская", "Советская", "Московская", "Гагарина",
+    "Ленина", "Кирова", "Луначарского", "Ботаническая", "Университетская", "Садовая",
+]
+
+INSTITUTES = [
+    "Политехнический институт", "Медицинский институт", "Педагогический институт",
+    "Юридический институт", "Институт экономики и управления", "Институт физики и математики",
+    "Институт химии и биологии", "Институт истории и филологии", "Институт информационных технологий",
+    "Институт архитектуры и строительства", "Институт иностранных языков", "Институт психологии",
+]
+
+FACULTIES = [
+    "Факультет вычислительной техники", "Факультет информационных технологий и электроники",
+    "Факультет промышленных технологий", "Лечебный факультет", "Факультет стоматологии",
+    "Факультет физико-математических наук", "Факультет истории и права", "Факультет филологии",
+    "Факультет экономики", "Факультет менеджмента", "Факультет журналистики",
+    "Факультет биологии", "Факультет химии", "Факультет социологии",
+]
+
+DEPARTMENTS = [
+    "Кафедра высшей математики", "Кафедра физики", "Кафедра программирования",
+    "Кафедра автоматики и телемеханики", "Кафедра анатомии", "Кафедра хирургии",
+    "Кафедра русского языка", "Кафедра истории России", "Кафедра гражданского права",
+    "Кафедра экономической теории", "Кафедра маркетинга", "Кафедра английского языка",
+    "Кафедра органической химии", "Кафедра общей биологии", "Кафедра философии",
+    "Деканат", "Учебный отдел", "Отдел кадров", "Бухгалтерия", "Приемная комиссия",
+]
+
+SPORTS_NAMES = ["Олимп", "Динамо", "Буревестник", "Спартак", "Молодость", "Атлант", "Юность"]
+
+AMENITIES = {
+    "academic": ["Wi-Fi", "Буфет", "Гардероб", "Библиотека", "Компьютерные классы", "Лаборатории",
+                 "Конференц-залы", "Актовый зал", "Медпункт", "Принтер", "Копировальный центр"],
+    "living": ["Кухни на этажах", "Прачечная", "Комната отдыха", "Wi-Fi", "Душевые",
+               "Спортивная комната", "Учебная комната", "Камера хранения"],
+    "sports": ["Спортивные залы", "Тренажерный зал", "Бассейн", "Раздевалки", "Душ",
+               "Стадион", "Теннисные корты", "Медпункт"],
+    "dining": ["Горячее питание", "Буфет", "Кафе", "Вегетарианское меню", "Кофейня", "Wi-Fi"],
+    "administrative": ["Приемная", "Конференц-залы", "Архив", "Wi-Fi", "Гардероб", "Касса"],
+}
+
+EQUIPMENT = {
+    "classroom": ["Доска", "Проектор", "Интерактивная доска", "Компьютер", "Маркерная доска"],
+    "lab": ["Компьютеры", "Осциллографы", "Микроскопы", "Вытяжной шкаф", "Сервер", "3D-принтер"],
+    "office": ["Компьютеры", "Принтер", "Сейф", "Конференц-стол", "Кафедра", "Деканат"],
+    "toilet": ["Раковины", "Зеркала", "Сушилка для рук"],
+    "cafe": ["Кофемашина", "Столы", "Витрина", "Микроволновая печь"],
+    "library": ["Каталоги", "Компьютеры", "Wi-Fi", "Читальный зал", "Сканер"],
+    "auditorium": ["Микрофоны", "Проектор", "Звуковая система", "Экран"],
+    "room": ["Кровати", "Столы", "Шкафы", "Холодильник", "Wi-Fi"],
+    "other": ["Спортивный инвентарь", "Тренажеры", "Стеллажи", "Плиты", "Холодильники"],
+}
+
+# Тип здания, его доля в кампусе и диапазон этажей
+BUILDING_TYPES: List[Tuple[str, float, Tuple[int, int]]] = [
+    ("academic", 0.50, (2, 8)),
+    ("living", 0.22, (5, 12)),
+    ("sports", 0.08, (1, 3)),
+    ("dining", 0.10, (1, 2)),
+    ("administrative", 0.10, (2, 5)),
+]
+
+# Набор типов помещений на этаже в зависимости от типа здания (с весами)
+ROOM_MIX = {
+    "academic": [("classroom", 6), ("lab", 3), ("office", 2), ("auditorium", 1), ("library", 1)],
+    "living": [("room", 12), ("other", 1)],
+    "sports": [("other", 4), ("office", 1)],
+    "dining": [("cafe", 3), ("other", 1)],
+    "administrative": [("office", 8), ("auditorium", 1)],
+}
+
+# Помещений на этаже, не считая туалета
+ROOMS_PER_FLOOR = {
+    "academic": (6, 14),
+    "living": (10, 20),
+    "sports": (2, 5),
+    "dining": (2, 4),
+    "administrative": (5, 10),
+}
+
+CAPACITY = {
+    "classroom": (20, 45), "lab": (12, 30), "office": (3, 15), "toilet": (0, 0), "cafe": (30, 120),
+    "library": (40, 150), "auditorium": (80, 300), "room": (2, 4), "other": (10, 100),
+}
+
+
+def _campus_name(campus: int) -> Tuple[str, str]:
+    """Город и улица кампуса"""
+    city = CITIES[campus % len(CITIES)]
+    street = STREETS[(campus // len(CITIES)) % len(STREETS)]
+    return city, street
+
+
+def _building_name(rng: random.Random, building_type: str, number: int, institute: str) -> str:
+    if building_type == "academic":
+        return rng.choice([
+            f"Учебный корпус №{number}",
+            f"Корпус {number} ({institute})",
+            institute if number % 7 == 0 else f"Лабораторный корпус №{number}",
+        ])
+    if building_type == "living":
+        return f"Общежитие №{number}"
+    if building_type == "sports":
+        return f"Спортивный комплекс «{rng.choice(SPORTS_NAMES)}»"
+    if building_type == "dining":
+        return rng.choice([f"Столовая №{number}", f"Кафе «Студенческое» №{number}"])
+    return rng.choice(["Административный корпус", "Ректорат", f"Административный корпус №{number}"])
+
+
+def _rooms(rng: random.Random, building_type: str, floor_count: int, accessible: bool, has_elevator: bool) -> List[Dict[str, Any]]:
+    mix = ROOM_MIX[building_type]
+    room_types = [room_type for room_type, _ in mix]
+    weights = [weight for _, weight in mix]
+    low, high = ROOMS_PER_FLOOR[building_type]
+
+    rooms = []
+    for floor in range(1, floor_count + 1):
+        count = rng.randint(low, high)
+        # Без лифта доступен только первый этаж
+        floor_accessible = accessible and (floor == 1 or has_elevator)
+        for index, room_type in enumerate(rng.choices(room_types, weights, k=count), start=1):
+            min_capacity, max_capacity = CAPACITY[room_type]
+            rooms.append({
+                "number": f"{floor}{index:02d}",
+                "floor": floor,
+                "type": room_type,
+                "capacity": rng.randint(min_capacity, max_capacity),
+                "equipment": rng.sample(EQUIPMENT[room_type], k=min(len(EQUIPMENT[room_type]), rng.randint(1, 3))),
+                "accessible": floor_accessible,
+            })
+        rooms.append({
+            "number": f"{floor}{count + 1:02d}",
+            "floor": floor,
+            "type": "toilet",
+            "capacity": 0,
+            "equipment": rng.sample(EQUIPMENT["toilet"], k=2),
+            "accessible": floor_accessible,
+        })
+    return rooms
+
+
+def generate_buildings(count: int, seed: int = 0, campus_size: int = CAMPUS_SIZE) -> Iterator[Dict[str, Any]]:
+    """Поток зданий в формате get_pgu_real_data()
+
+    Здания группируются в кампусы по campus_size штук; кампусы расположены
+    на сетке, здания — вокруг центра своего кампуса. ID имеют вид
+    «<кампус>-<номер>» и не пересекаются с ID реальных данных.
+    """
+    rng = random.Random(seed)
+    type_names = [name for name, _, _ in BUILDING_TYPES]
+    type_weights = [share for _, share, _ in BUILDING_TYPES]
+    floors = {name: floor_range for name, _, floor_range in BUILDING_TYPES}
+    grid = max(1, math.ceil(math.sqrt(count / campus_size)))
+
+    numbers: Dict[str, int] = {}
+    for index in range(count):
+        campus, position = divmod(index, campus_size)
+        if position == 0:
+            numbers = {}
+        city, street = _campus_name(campus)
+        center_x = (campus % grid) * CAMPUS_SPACING + CAMPUS_SPACING / 2
+        center_y = (campus // grid) * CAMPUS_SPACING + CAMPUS_SPACING / 2
+
+        building_type = rng.choices(type_names, type_weights)[0]
+        numbers[building_type] = number = numbers.get(building_type, 0) + 1
+        institute = rng.choice(INSTITUTES)
+        floor_count = rng.randint(*floors[building_type])
+        has_elevator = floor_count >= 5 and rng.random() < 0.8
+        accessible = rng.random() < 0.7
+        name = _building_name(rng, building_type, number, institute)
+
+        departments: List[str] = []
+        if building_type == "academic":
+            departments = [institute] + rng.sample(FACULTIES, k=rng.randint(1, 2)) + rng.sample(DEPARTMENTS, k=rng.randint(1, 3))
+        elif building_type == "administrative":
+            departments = rng.sample(DEPARTMENTS[-5:], k=rng.randint(2, 4))
+
+        amenities = AMENITIES[building_type]
+        yield {
+            "id": f"{campus + 1}-{position + 1}",
+            "name": name,
+            "type": building_type,
+            "description": f"{name}, кампус в г. {city}, ул. {street}, {rng.randint(1, 120)}",
+            "image_url": None,
+            "coordinates": {
+                "x": round(center_x + rng.uniform(-CAMPUS_RADIUS, CAMPUS_RADIUS)),
+                "y": round(center_y + rng.uniform(-CAMPUS_RADIUS, CAMPUS_RADIUS)),
+            },
+            "floor_count": floor_count,
+            "year_built": rng.randint(1930, 2023),
+            "departments": departments,
+            "amenities": rng.sample(amenities, k=rng.randint(2, min(5, len(amenities)))),
+            "accessible": accessible,
+            "has_elevator": has_elevator,
+            "has_parking": rng.random() < 0.4,
+            "rooms": _rooms(rng, building_type, floor_count, accessible, has_elevator),
+        }
+
+
+def write_ndjson(path: str, buildings: Iterator[Dict[str, Any]]) -> int:
+    """Запись зданий в файл NDJSON, по одному зданию в строке"""
+    written = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for building in buildings:
+            f.write(json.dumps(building, ensure_ascii=False))
+            f.write("\n")
+            written += 1
+    return written
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Генерация синтетических кампусов")
+    parser.add_argument("--buildings", default="1k", help="количество зданий или 1k/10k/100k")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--campus-size", type=int, default=CAMPUS_SIZE)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--output", help="файл NDJSON")
+    target.add_argument("--database", help="файл SQLite; существующие здания заменяются")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    count = PRESETS.get(args.buildings) or int(args.buildings)
+    buildings = generate_buildings(count, args.seed, args.campus_size)
+
+    started = time.perf_counter()
+    if args.output:
+        written = write_ndjson(args.output, buildings)
+    else:
+        from database import Database
+
+        database = Database(args.database)
+        database.init_database()
+        written = database.bulk_load(buildings, mode="replace")
+        database.close()
+
+    logger.info("Сгенерировано %d зданий за %.1f с", written, time.perf_counter() - started)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -168,7 +168,13 @@ fi
 
 # 10. Ожидание и проверка
 log_info "Ожидание запуска сервисов..."
-sleep 10
+# Backend поднимается за миллисекунды, ждем ответа /health вместо фиксированной паузы
+for _ in $(seq 1 60); do
+    if curl -f -s "http://localhost:8000/health" > /dev/null 2>&1; then
+        break
+    fi
+    sleep 0.5
+done
 
 # Проверяем работоспособность API
 BACKEND_URL="http://localhost:8000"
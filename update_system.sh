@@ -217,7 +217,13 @@ fi
 
 # 9. Ожидание запуска сервисов
 log_info "Ожидание запуска сервисов..."
-sleep 10
+# Backend поднимается за миллисекунды, ждем ответа /health вместо фиксированной паузы
+for _ in $(seq 1 60); do
+    if curl -f -s "http://localhost:8000/health" > /dev/null 2>&1; then
+        break
+    fi
+    sleep 0.5
+done
 
 # 10. Проверка работоспособности
 log_info "Проверка работоспособности сервисов..."